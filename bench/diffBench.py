@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+#//******************************************************************************
+#//
+#//  diffBench
+#//
+#//  times rickDiff's built-in diff (diffLines) against difflib on generated
+#//  files of several sizes, and checks that the opcodes it returns really do
+#//  turn the first file into the second
+#//
+#//  There are two kinds of file:  source-like ('source'), and rows repeated
+#//  from a handful of distinct ones like a CSV export ('repeated'), where no
+#//  line is rare enough for the histogram diff to anchor on.  The exit status
+#//  is 1 if any result is wrong, or if rickDiff takes more than --slowdown
+#//  times as long as difflib (which, with its default autojunk, is fast on
+#//  repeated lines because it gives up on them).
+#//
+#//  usage:  python bench/diffBench.py [ -x slowdown ] [ megabytes ... ]
+#//
+#//******************************************************************************
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..' ) )
+
+import rickDiff
+
+
+#//******************************************************************************
+#//
+#//  generateFiles
+#//
+#//  returns two lists of lines totalling about 'megabytes' each, where the
+#//  second is the first with scattered insertions, deletions and changes
+#//  (which for 'repeated' files are more of the same rows)
+#//
+#//******************************************************************************
+
+def generateFiles( megabytes, kind='source', seed=1 ):
+    random.seed( seed )
+
+    words = [ 'int', 'return', 'if', 'else', 'for', 'while', 'status', 'count', 'buffer', 'index', '{', '}',
+              '(', ')', ';', '=', '+', '0', '1', 'NULL' ]
+
+    rows = [ str( i ) + ',widget,' + str( i * 7 ) + ',0.00,"in stock"' for i in range( 8 ) ]
+
+    a = [ ]
+    size = 0
+
+    while size < megabytes * 1048576:
+        if kind == 'repeated':
+            line = random.choice( rows )
+        elif random.random( ) < 0.1:
+            line = ''
+        elif random.random( ) < 0.1:
+            line = '    }'
+        else:
+            line = '    ' * random.randint( 0, 3 ) + ' '.join( random.choice( words ) for i in range( random.randint( 2, 10 ) ) )
+
+        a.append( line )
+        size += len( line ) + 2
+
+    b = list( a )
+
+    for edit in range( len( a ) // 200 ):
+        position = random.randrange( len( b ) )
+        choice = random.random( )
+
+        if choice < 0.3:
+            b.insert( position, random.choice( rows ) if kind == 'repeated' else 'inserted line ' + str( edit ) )
+        elif choice < 0.6:
+            del b[ position ]
+        else:
+            b[ position ] = random.choice( rows ) if kind == 'repeated' else 'changed line ' + str( edit )
+
+    return a, b
+
+
+#//******************************************************************************
+#//
+#//  checkOpcodes
+#//
+#//******************************************************************************
+
+def checkOpcodes( a, b, opcodes ):
+    result = [ ]
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        result.extend( a[ i1 : i2 ] if tag == 'equal' else b[ j1 : j2 ] )
+
+    return result == b
+
+
+#//******************************************************************************
+#//
+#//  countChanged
+#//
+#//  returns how many lines the opcodes say were changed, as a measure of how
+#//  good a diff is (fewer is better)
+#//
+#//******************************************************************************
+
+def countChanged( opcodes ):
+    return sum( max( i2 - i1, j2 - j1 ) for tag, i1, i2, j1, j2 in opcodes if tag != 'equal' )
+
+
+#//******************************************************************************
+#//
+#//  timeIt
+#//
+#//******************************************************************************
+
+def timeIt( function ):
+    start = time.perf_counter( )
+    result = function( )
+    return time.perf_counter( ) - start, result
+
+
+#//******************************************************************************
+#//
+#//  main
+#//
+#//******************************************************************************
+
+def main( ):
+    parser = argparse.ArgumentParser( description='benchmarks rickDiff\'s built-in diff against difflib' )
+
+    parser.add_argument( 'sizes', type=float, nargs='*', default=[ 1, 4, 8 ],
+                         help='file sizes to try in MB (default: %(default)s)' )
+    parser.add_argument( '-x', '--slowdown', type=float, default=10,
+                         help='how many times as long as difflib rickDiff may take (default: %(default)s)' )
+
+    args = parser.parse_args( )
+
+    failures = [ ]
+
+    print( '{0:<9} {1:>6}  {2:>9}  {3:>12}  {4:>12}  {5:>8}  {6:>9}  {7:>9}  {8:>8}'.format(
+           'kind', 'MB', 'lines', 'rickDiff (s)', 'difflib (s)', 'speedup', 'changed', 'difflib', 'correct' ) )
+
+    for kind in ( 'source', 'repeated' ):
+        for megabytes in args.sizes:
+            a, b = generateFiles( megabytes, kind )
+
+            ours, opcodes = timeIt( lambda: rickDiff.diffLines( a, b ) )
+            theirs, reference = timeIt( lambda: difflib.SequenceMatcher( None, a, b ).get_opcodes( ) )
+
+            correct = checkOpcodes( a, b, opcodes )
+
+            print( '{0:<9} {1:>6.1f}  {2:>9}  {3:>12.2f}  {4:>12.2f}  {5:>7.1f}x  {6:>9}  {7:>9}  {8:>8}'.format(
+                   kind, megabytes, len( a ), ours, theirs, theirs / max( ours, 1e-9 ), countChanged( opcodes ),
+                   countChanged( reference ), str( correct ) ) )
+
+            if not correct:
+                failures.append( 'the {0} MB {1} diff is wrong'.format( megabytes, kind ) )
+
+            if ours > args.slowdown * theirs:
+                failures.append( 'the {0} MB {1} diff took {2:.1f} times as long as difflib'.format(
+                                 megabytes, kind, ours / max( theirs, 1e-9 ) ) )
+
+    for failure in failures:
+        print( 'FAILED:  ' + failure )
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit( main( ) )
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+
+#//******************************************************************************
+#//
+#//  largeFileBench
+#//
+#//  checks that rickDiff's memory use doesn't grow with the size of the files
+#//  it compares, once they are over --large_file
+#//
+#//  For each size it generates a repository with one file of that size and two
+#//  revisions (see bench/standins), and runs each scenario in a fresh Python
+#//  process so its peak resident set size can be measured on its own.  The
+#//  results are printed as a table, and the exit status is 1 if any scenario's
+#//  peak grows by more than --tolerance megabytes from the smallest size to the
+#//  largest, or if Meld is ever started on a large file.
+#//
+#//  Before that, summarizeLargeDiff is checked directly against a few small
+#//  files whose answer is known, and any that it gets wrong fail the run too.
+#//
+#//  Peak RSS comes from the resource module, so this only works on Unix.
+#//
+#//  usage:  python bench/largeFileBench.py [ options ] [ scenario ... ]
+#//
+#//******************************************************************************
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+benchDir = os.path.dirname( os.path.abspath( __file__ ) )
+
+sys.path.insert( 0, os.path.join( benchDir, 'standins' ) )
+
+import fakeRepository
+from rickDiffBench import countCalls, rickDiff, writeStandins
+
+
+#//******************************************************************************
+#//
+#//  SCENARIOS
+#//
+#//  the rickDiff arguments for each scenario, and whether it starts with an
+#//  empty cache
+#//
+#//******************************************************************************
+
+SCENARIOS = {
+    'checkout'  : ( [ '--no_gui', 'big.dat', '1.1', '1.2' ], True ),
+    'cached'    : ( [ '--no_gui', 'big.dat', '1.1', '1.2' ], False ),
+    'identical' : ( [ '--no_gui', 'big.dat', '1.2', '1.2' ], False ),
+    'viewer'    : ( [ 'big.dat', '1.1' ], False ),
+    'sandbox'   : ( [ '-n', 'big.dat', 'sandbox2' ], False ),
+}
+
+# runs rickDiff.main( ), waits for any viewer it started and writes the process's peak RSS in KB
+# to $RICKDIFF_BENCH_RSS
+DRIVER = '''
+import os, resource, sys
+sys.path.insert( 0, sys.argv.pop( 1 ) )
+import rickDiff
+sys.argv[ 0 ] = 'rickDiff'
+try:
+    rickDiff.main( )
+finally:
+    # so Meld has recorded its call (see countCalls) before this process is gone
+    for process in rickDiff.viewerProcesses:
+        process.wait( )
+
+    with open( os.environ[ 'RICKDIFF_BENCH_RSS' ], 'w' ) as outputFile:
+        outputFile.write( str( resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss ) )
+'''
+
+
+#//******************************************************************************
+#//
+#//  checkSummaries
+#//
+#//  runs summarizeLargeDiff on pairs of files whose one hunk is known, and
+#//  returns a description of each it gets wrong
+#//
+#//  The files are a few CHUNK_SIZEs long, so the common prefix and suffix are
+#//  found across chunk boundaries.
+#//
+#//******************************************************************************
+
+def checkSummaries( workDir ):
+    lines = [ '    line ' + str( i ) + ' of the summary check;\n' for i in range( 20000 ) ]
+    middle = len( lines ) // 2
+    changed = lines[ middle ][ : 10 ] + '#' + lines[ middle ][ 11: ]
+    dosLines = [ line.replace( '\n', '\r\n' ) for line in lines ]
+
+    # name : ( old lines, new lines, expected hunk as ( type, start, old lines, new lines ) or None )
+    cases = {
+        'change in the middle of a line'  : ( lines, lines[ : middle ] + [ changed ] + lines[ middle + 1: ],
+                                              ( 'replace', middle + 1, 1, 1 ) ),
+        'change in an unterminated last line' : ( lines + [ 'the end' ], lines + [ 'the End' ],
+                                                  ( 'replace', len( lines ) + 1, 1, 1 ) ),
+        'newline added to the last line'  : ( lines + [ 'the end' ], lines + [ 'the end\n' ],
+                                              ( 'replace', len( lines ) + 1, 1, 1 ) ),
+        'same prefix and suffix'          : ( lines[ : middle ] + [ 'old\n' ] + lines[ middle: ],
+                                              lines[ : middle ] + [ 'new\n', 'newer\n' ] + lines[ middle: ],
+                                              ( 'replace', middle + 1, 1, 2 ) ),
+        'insertion between repeats'       : ( [ 'same\n' ] * middle, [ 'same\n' ] * ( middle + 1 ),
+                                              ( 'insert', middle + 1, 0, 1 ) ),
+        'identical'                       : ( lines, lines, None ),
+        'CR/LF checkout of an LF file'    : ( dosLines, lines, None ),
+        'change to an LF file'            : ( dosLines, lines[ : middle ] + [ changed ] + lines[ middle + 1: ],
+                                              ( 'replace', middle + 1, 1, 1 ) ),
+    }
+
+    fileNames = [ os.path.join( workDir, 'summaryA' ), os.path.join( workDir, 'summaryB' ) ]
+    failures = [ ]
+
+    for name, ( linesA, linesB, expected ) in cases.items( ):
+        for fileName, fileLines in zip( fileNames, ( linesA, linesB ) ):
+            with open( fileName, 'wb' ) as outputFile:
+                outputFile.write( ''.join( fileLines ).encode( 'ascii' ) )
+
+        stats = rickDiff.summarizeLargeDiff( fileNames[ 0 ], fileNames[ 1 ], 'a', 'b' )
+        hunks = [ ( hunk[ 'type' ], hunk[ 'oldStart' ], hunk[ 'oldLines' ], hunk[ 'newLines' ] )
+                  for hunk in stats[ 'hunks' ] ]
+
+        if hunks != ( [ expected ] if expected else [ ] ) or stats[ 'identical' ] != ( expected is None ):
+            failures.append( 'summarizeLargeDiff got the ' + name + ' case wrong:  expected ' + str( expected ) +
+                             ', got ' + str( stats[ 'hunks' ] ) )
+
+    for fileName in fileNames:
+        os.remove( fileName )
+
+    return failures
+
+
+#//******************************************************************************
+#//
+#//  createRepository
+#//
+#//  writes the repository description for one file of 'size' bytes and checks
+#//  out two sandboxes of it under devRoot, with a change in the middle of the
+#//  first one's copy
+#//
+#//  Everything is written a chunk at a time, so this doesn't need the memory
+#//  it is measuring either.
+#//
+#//******************************************************************************
+
+def createRepository( workDir, size ):
+    path = 'module/src/big.dat'
+
+    repository = { 'root' : '/cvsroot', 'size' : 0, 'files' : { path : 2 }, 'sizes' : { path : size } }
+
+    repositoryFileName = os.path.join( workDir, 'repository.json' )
+
+    with open( repositoryFileName, 'w' ) as outputFile:
+        json.dump( repository, outputFile )
+
+    for sandbox in ( 'sandbox1', 'sandbox2' ):
+        directory = os.path.join( workDir, 'dev', sandbox, 'src' )
+        fileName = os.path.join( directory, 'big.dat' )
+
+        os.makedirs( os.path.join( directory, 'CVS' ), exist_ok=True )
+
+        written = 0
+
+        with open( fileName, 'wb' ) as outputFile:
+            for chunk in fakeRepository.generateContents( repository, path, '1.2' ):
+                if sandbox == 'sandbox1' and written < size // 2 <= written + len( chunk ):
+                    chunk += b'    a local change;\r\n'
+
+                outputFile.write( chunk )
+                written += len( chunk )
+
+        timestamp = 'Result of merge' if sandbox == 'sandbox1' else time.asctime( time.gmtime( os.path.getmtime( fileName ) ) )
+
+        with open( os.path.join( directory, 'CVS', 'Entries' ), 'w' ) as outputFile:
+            outputFile.write( '/big.dat/1.2/' + timestamp + '//\nD\n' )
+
+        with open( os.path.join( directory, 'CVS', 'Repository' ), 'w' ) as outputFile:
+            outputFile.write( 'module/src\n' )
+
+        with open( os.path.join( directory, 'CVS', 'Root' ), 'w' ) as outputFile:
+            outputFile.write( ':pserver:rick@localhost:/cvsroot\n' )
+
+    return repositoryFileName
+
+
+#//******************************************************************************
+#//
+#//  runRickDiff
+#//
+#//  runs rickDiff in a new process with the given arguments, throwing its
+#//  output away, and returns the elapsed time and its peak RSS in MB
+#//
+#//******************************************************************************
+
+def runRickDiff( arguments, rssFileName ):
+    startTime = time.perf_counter( )
+
+    subprocess.call( [ sys.executable, '-c', DRIVER, os.path.join( benchDir, '..' ) ] + arguments,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL )
+
+    elapsed = time.perf_counter( ) - startTime
+
+    with open( rssFileName ) as inputFile:
+        peak = int( inputFile.read( ) )
+
+    os.remove( rssFileName )
+
+    # ru_maxrss is in bytes on macOS and KB everywhere else
+    return elapsed, peak / ( 1 << 20 if sys.platform == 'darwin' else 1 << 10 )
+
+
+#//******************************************************************************
+#//
+#//  main
+#//
+#//******************************************************************************
+
+def main( ):
+    parser = argparse.ArgumentParser( description='checks that rickDiff\'s memory use stays flat for large files' )
+
+    parser.add_argument( 'scenarios', nargs='*', default=list( SCENARIOS ),
+                         help='scenarios to run (default: all of ' + ', '.join( SCENARIOS ) + ')' )
+    parser.add_argument( '-s', '--sizes', type=int, nargs='+', default=[ 16, 64, 256 ],
+                         help='file sizes to try in MB (default: %(default)s)' )
+    parser.add_argument( '-L', '--large_file', type=int, default=8,
+                         help='rickDiff\'s --large_file, which must be below the smallest size (default: %(default)s)' )
+    parser.add_argument( '-t', '--tolerance', type=float, default=16,
+                         help='peak RSS growth in MB allowed from the smallest size to the largest (default: %(default)s)' )
+    parser.add_argument( '-o', '--output', default='', help='also write the results to this JSON file' )
+
+    args = parser.parse_args( )
+
+    unknown = [ scenario for scenario in args.scenarios if scenario not in SCENARIOS ]
+
+    if unknown:
+        parser.error( 'unknown scenarios: ' + ', '.join( unknown ) )
+
+    if min( args.sizes ) <= args.large_file:
+        parser.error( 'the sizes must all be bigger than --large_file' )
+
+    sizes = sorted( args.sizes )
+
+    workDir = tempfile.mkdtemp( prefix='largeFileBench' )
+    savedDir = os.getcwd( )
+    savedEnviron = dict( os.environ )
+
+    results = [ ]
+    failures = [ ]
+
+    try:
+        binDir = os.path.join( workDir, 'bin' )
+        tempDir = os.path.join( workDir, 'temp' )
+        cacheDir = os.path.join( workDir, 'cache' )
+        callsFileName = os.path.join( workDir, 'calls.log' )
+
+        os.makedirs( binDir )
+        os.makedirs( tempDir )
+
+        writeStandins( binDir )
+
+        failures += checkSummaries( workDir )
+
+        print( 'summarizeLargeDiff:  {0} wrong'.format( len( failures ) ) )
+        print( )
+
+        os.environ[ 'PATH' ] = binDir + os.pathsep + os.environ[ 'PATH' ]
+        os.environ[ 'TEMP' ] = tempDir
+        os.environ[ 'RICKDIFF_BENCH_LATENCY' ] = '0'
+        os.environ[ 'RICKDIFF_BENCH_CALLS' ] = callsFileName
+        os.environ[ 'RICKDIFF_BENCH_RSS' ] = os.path.join( workDir, 'rss' )
+
+        options = [ '--root=' + os.path.join( workDir, 'dev' ), '--cache_dir=' + cacheDir,
+                    '--large_file=' + str( args.large_file ) ]
+
+        print( 'sizes {0} MB, --large_file={1}, {2:g} MB tolerance'.format(
+               ', '.join( str( size ) for size in sizes ), args.large_file, args.tolerance ) )
+        print( )
+        print( '{0:<12} {1:>9} {2:>9} {3:>13} {4:>6}'.format( 'scenario', 'size (MB)', 'time (s)', 'peak RSS (MB)',
+                                                              'meld' ) )
+
+        for size in sizes:
+            os.chdir( savedDir )
+            shutil.rmtree( os.path.join( workDir, 'dev' ), ignore_errors=True )
+
+            os.environ[ 'RICKDIFF_BENCH_REPO' ] = createRepository( workDir, size << 20 )
+
+            os.chdir( os.path.join( workDir, 'dev', 'sandbox1', 'src' ) )
+
+            for name in args.scenarios:
+                arguments, emptyCache = SCENARIOS[ name ]
+
+                if emptyCache:
+                    shutil.rmtree( cacheDir, ignore_errors=True )
+
+                countCalls( callsFileName )
+
+                elapsed, peak = runRickDiff( options + arguments, os.environ[ 'RICKDIFF_BENCH_RSS' ] )
+                meld = countCalls( callsFileName )[ 'meld' ]
+
+                results.append( { 'scenario' : name, 'size' : size, 'time' : elapsed, 'peak' : peak, 'meld' : meld } )
+
+                print( '{0:<12} {1:>9} {2:>9.3f} {3:>13.1f} {4:>6}'.format( name, size, elapsed, peak, meld ) )
+
+                if meld:
+                    failures.append( name + ' started Meld on a ' + str( size ) + ' MB file' )
+    finally:
+        os.chdir( savedDir )
+        os.environ.clear( )
+        os.environ.update( savedEnviron )
+        shutil.rmtree( workDir, ignore_errors=True )
+
+    print( )
+
+    for name in args.scenarios:
+        peaks = [ result[ 'peak' ] for result in results if result[ 'scenario' ] == name ]
+        growth = peaks[ -1 ] - peaks[ 0 ]
+
+        print( '{0:<12} peak RSS grew {1:.1f} MB from {2} MB to {3} MB files'.format( name, growth, sizes[ 0 ], sizes[ -1 ] ) )
+
+        if growth > args.tolerance:
+            failures.append( name + '\'s peak RSS grew by {0:.1f} MB'.format( growth ) )
+
+    if args.output:
+        with open( args.output, 'w' ) as outputFile:
+            json.dump( { 'sizes' : sizes, 'largeFile' : args.large_file, 'tolerance' : args.tolerance,
+                         'results' : results }, outputFile, indent=1 )
+
+    for failure in failures:
+        print( 'FAILED:  ' + failure )
+
+    return 1 if failures else 0
+
+
+#//******************************************************************************
+#//
+#//  __main__
+#//
+#//******************************************************************************
+
+if __name__ == '__main__':
+    sys.exit( main( ) )
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+
+#//******************************************************************************
+#//
+#//  rickDiffBench
+#//
+#//  times rickDiff end to end against stand-in cvs, meld and formatter
+#//  executables (see bench/standins), so runs are reproducible and don't need
+#//  a server or a display
+#//
+#//  It generates a repository with the given number of files, revisions per
+#//  file and file size, and a devRoot with two sandboxes of it, then runs each
+#//  scenario through rickDiff.main( ):  once with an empty cache ('cold') and
+#//  then 'iterations' more times with the cache left from the run before
+#//  ('warm').  For each it reports the wall clock time and how many times cvs,
+#//  meld and the formatters were started.  --output saves the results as JSON
+#//  so they can be compared from one change to the next.
+#//
+#//  The 'pserver' scenario runs against the stand-in pserver instead, and
+#//  fails the run (exit status 1) if cvs is ever started or if every command
+#//  needed a connection of its own.  The 'trace' scenario fails it if the
+#//  --trace file isn't written.
+#//
+#//  usage:  python bench/rickDiffBench.py [ options ] [ scenario ... ] [ -- rickDiff options ]
+#//
+#//******************************************************************************
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+benchDir = os.path.dirname( os.path.abspath( __file__ ) )
+
+sys.path.insert( 0, os.path.join( benchDir, '..' ) )
+sys.path.insert( 0, os.path.join( benchDir, 'standins' ) )
+
+import rickDiff
+import fakeRepository
+import pserver
+
+
+#//******************************************************************************
+#//
+#//  SCENARIOS
+#//
+#//  the rickDiff arguments for each scenario ('{files}' is replaced by every
+#//  file in the sandbox, and '{trace}' by a file name in the work directory)
+#//
+#//******************************************************************************
+
+SCENARIOS = {
+    'two-way'   : [ 'file0.c', 'CURRENT-1' ],
+    'three-way' : [ '-3', 'file0.c', 'CURRENT-2', 'CURRENT-1', 'HEAD' ],
+    'current-n' : [ 'file0.c', 'CURRENT-5', 'CURRENT-3' ],
+    'tag'       : [ 'file0.c', 'RELEASE_1' ],
+    'sandbox'   : [ 'file0.c', 'sandbox2' ],
+    'batch'     : [ '-b', '--batch_version=CURRENT-1', '{files}' ],
+    'astyle'    : [ '-a', 'file0.c', 'CURRENT-1' ],
+    'pserver'   : [ '--pserver', '-b', '--batch_version=CURRENT-1', '{files}' ],
+    'trace'     : [ '--trace', '{trace}', '--trace_format', 'json', 'file0.c', 'CURRENT-1' ],
+}
+
+
+#//******************************************************************************
+#//
+#//  writeStandins
+#//
+#//  writes 'cvs', 'meld', 'astyle' and 'uncrustify' commands into binDir that
+#//  run the Python stand-ins
+#//
+#//******************************************************************************
+
+def writeStandins( binDir ):
+    commands = { 'cvs' : [ 'cvs.py' ], 'meld' : [ 'meld.py' ], 'astyle' : [ 'meld.py', 'astyle' ],
+                 'uncrustify' : [ 'meld.py', 'uncrustify' ] }
+
+    for name, ( script, *extra ) in commands.items( ):
+        scriptFileName = os.path.join( benchDir, 'standins', script )
+
+        if os.name == 'nt':
+            with open( os.path.join( binDir, name + '.bat' ), 'w' ) as outputFile:
+                outputFile.write( '@"' + sys.executable + '" "' + scriptFileName + '" ' + ' '.join( extra ) + ' %*\n' )
+        else:
+            fileName = os.path.join( binDir, name )
+
+            with open( fileName, 'w' ) as outputFile:
+                outputFile.write( '#!/bin/sh\nexec "' + sys.executable + '" "' + scriptFileName + '" ' +
+                                  ' '.join( extra ) + ' "$@"\n' )
+
+            os.chmod( fileName, 0o755 )
+
+
+#//******************************************************************************
+#//
+#//  createRepository
+#//
+#//  writes the repository description and checks out two sandboxes of it at
+#//  the head revision under devRoot, with file0.c modified in the first one,
+#//  and 'root' as their CVSROOT
+#//
+#//******************************************************************************
+
+def createRepository( workDir, files, revisions, size, root=':pserver:rick@localhost:/cvsroot' ):
+    repository = { 'root' : '/cvsroot', 'size' : size, 'tags' : { 'RELEASE_1' : max( 1, revisions // 2 ) },
+                   'files' : dict( ( 'module/src/file' + str( i ) + '.c', revisions ) for i in range( files ) ) }
+
+    repositoryFileName = os.path.join( workDir, 'repository.json' )
+
+    with open( repositoryFileName, 'w' ) as outputFile:
+        json.dump( repository, outputFile )
+
+    for sandbox in ( 'sandbox1', 'sandbox2' ):
+        directory = os.path.join( workDir, 'dev', sandbox, 'src' )
+
+        os.makedirs( os.path.join( directory, 'CVS' ) )
+
+        entries = [ ]
+
+        for path in sorted( repository[ 'files' ] ):
+            fileName = os.path.join( directory, os.path.basename( path ) )
+            head = fakeRepository.getRevisions( repository, path )[ 0 ]
+
+            with open( fileName, 'wb' ) as outputFile:
+                outputFile.write( fakeRepository.getContents( repository, path, head ) )
+
+            if sandbox == 'sandbox1' and path.endswith( '/file0.c' ):
+                with open( fileName, 'ab' ) as outputFile:
+                    outputFile.write( b'    a local change;\r\n' )
+
+                timestamp = 'Result of merge'
+            else:
+                timestamp = time.asctime( time.gmtime( os.path.getmtime( fileName ) ) )
+
+            entries.append( '/' + os.path.basename( path ) + '/' + head + '/' + timestamp + '//\n' )
+
+        with open( os.path.join( directory, 'CVS', 'Entries' ), 'w' ) as outputFile:
+            outputFile.write( ''.join( entries ) + 'D\n' )
+
+        with open( os.path.join( directory, 'CVS', 'Repository' ), 'w' ) as outputFile:
+            outputFile.write( 'module/src\n' )
+
+        with open( os.path.join( directory, 'CVS', 'Root' ), 'w' ) as outputFile:
+            outputFile.write( root + '\n' )
+
+    return repositoryFileName, [ os.path.basename( path ) for path in sorted( repository[ 'files' ] ) ]
+
+
+#//******************************************************************************
+#//
+#//  countCalls
+#//
+#//  returns the number of times each stand-in has been run since the calls
+#//  file was last emptied, and empties it
+#//
+#//  The viewers rickDiff starts aren't waited for, so call waitForViewers
+#//  first or they may not have written their calls yet.
+#//
+#//******************************************************************************
+
+def countCalls( callsFileName ):
+    counts = { 'cvs' : 0, 'meld' : 0, 'astyle' : 0, 'uncrustify' : 0 }
+
+    try:
+        with open( callsFileName ) as inputFile:
+            for line in inputFile:
+                program = line.split( ' ', 1 )[ 0 ].strip( )
+                counts[ program ] = counts.get( program, 0 ) + 1
+
+        os.remove( callsFileName )
+    except OSError:
+        pass
+
+    return counts
+
+
+#//******************************************************************************
+#//
+#//  waitForViewers
+#//
+#//  waits for the viewers the last in-process rickDiff run started to exit
+#//
+#//******************************************************************************
+
+def waitForViewers( ):
+    for process in rickDiff.viewerProcesses:
+        process.wait( )
+
+
+#//******************************************************************************
+#//
+#//  runRickDiff
+#//
+#//  runs rickDiff.main( ) once with the given arguments, with a freshly loaded
+#//  module so nothing is remembered from the last run but what is on disk, and
+#//  returns the elapsed time
+#//
+#//  The viewers rickDiff started are waited for (after the clock has
+#//  stopped), so their calls are all recorded before this returns.
+#//
+#//  Everything rickDiff and the programs it runs print is thrown away, at the
+#//  file descriptor level so the child processes' output goes too.
+#//
+#//******************************************************************************
+
+def runRickDiff( arguments ):
+    importlib.reload( rickDiff )
+
+    savedArgv = sys.argv
+    sys.argv = [ 'rickDiff' ] + arguments
+
+    sys.stdout.flush( )
+    sys.stderr.flush( )
+
+    savedDescriptors = [ os.dup( 1 ), os.dup( 2 ) ]
+    devNull = os.open( os.devnull, os.O_WRONLY )
+
+    os.dup2( devNull, 1 )
+    os.dup2( devNull, 2 )
+
+    startTime = time.perf_counter( )
+
+    try:
+        rickDiff.main( )
+    finally:
+        sys.stdout.flush( )
+        sys.stderr.flush( )
+
+        os.dup2( savedDescriptors[ 0 ], 1 )
+        os.dup2( savedDescriptors[ 1 ], 2 )
+
+        for descriptor in savedDescriptors + [ devNull ]:
+            os.close( descriptor )
+
+        sys.argv = savedArgv
+
+    elapsed = time.perf_counter( ) - startTime
+
+    waitForViewers( )
+
+    return elapsed
+
+
+#//******************************************************************************
+#//
+#//  runScenario
+#//
+#//******************************************************************************
+
+def runScenario( name, arguments, cacheDir, callsFileName, iterations ):
+    shutil.rmtree( cacheDir, ignore_errors=True )
+    countCalls( callsFileName )
+
+    cold = runRickDiff( arguments )
+    coldCalls = countCalls( callsFileName )
+
+    warm = [ ]
+    warmCalls = { }
+
+    for iteration in range( iterations ):
+        warm.append( runRickDiff( arguments ) )
+        warmCalls = countCalls( callsFileName )
+
+    return { 'scenario' : name, 'arguments' : arguments, 'cold' : cold, 'coldCalls' : coldCalls,
+             'warm' : statistics.median( warm ) if warm else None, 'warmCalls' : warmCalls }
+
+
+#//******************************************************************************
+#//
+#//  main
+#//
+#//******************************************************************************
+
+def main( ):
+    parser = argparse.ArgumentParser( description='benchmarks rickDiff against stand-in cvs and meld' )
+
+    parser.add_argument( 'scenarios', nargs='*', default=list( SCENARIOS ),
+                         help='scenarios to run (default: all of ' + ', '.join( SCENARIOS ) + ')' )
+    parser.add_argument( '-f', '--files', type=int, default=5, help='files in the repository (default: %(default)s)' )
+    parser.add_argument( '-r', '--revisions', type=int, default=10, help='revisions of each file (default: %(default)s)' )
+    parser.add_argument( '-s', '--size', type=int, default=100, help='size of each file in KB (default: %(default)s)' )
+    parser.add_argument( '-l', '--latency', type=float, default=50,
+                         help='simulated server latency per cvs command in ms (default: %(default)s)' )
+    parser.add_argument( '-i', '--iterations', type=int, default=3, help='warm runs per scenario (default: %(default)s)' )
+    parser.add_argument( '-o', '--output', default='', help='also write the results to this JSON file' )
+    # anything after '--' is passed on to every rickDiff run (e.g. '-- --no_gui')
+    arguments = sys.argv[ 1: ]
+    rickDiffOptions = [ ]
+
+    if '--' in arguments:
+        rickDiffOptions = arguments[ arguments.index( '--' ) + 1: ]
+        arguments = arguments[ : arguments.index( '--' ) ]
+
+    args = parser.parse_args( arguments )
+
+    unknown = [ scenario for scenario in args.scenarios if scenario not in SCENARIOS ]
+
+    if unknown:
+        parser.error( 'unknown scenarios: ' + ', '.join( unknown ) )
+
+    workDir = tempfile.mkdtemp( prefix='rickDiffBench' )
+    savedDir = os.getcwd( )
+    savedEnviron = dict( os.environ )
+
+    server = None
+    results = [ ]
+    failures = [ ]
+
+    try:
+        binDir = os.path.join( workDir, 'bin' )
+        tempDir = os.path.join( workDir, 'temp' )
+        cacheDir = os.path.join( workDir, 'cache' )
+        callsFileName = os.path.join( workDir, 'calls.log' )
+        traceFileName = os.path.join( workDir, 'trace.json' )
+
+        os.makedirs( binDir )
+        os.makedirs( tempDir )
+
+        writeStandins( binDir )
+
+        root = ':pserver:rick@localhost:/cvsroot'
+
+        # the sandboxes need the server's port in their CVS/Root, so it is started before there is anything to serve
+        if 'pserver' in args.scenarios:
+            server = pserver.startServer( { } )
+            root = ':pserver:rick@localhost:' + str( server.server_address[ 1 ] ) + '/cvsroot'
+
+        repositoryFileName, fileNames = createRepository( workDir, args.files, args.revisions, args.size * 1024, root )
+
+        if server is not None:
+            server.repository = fakeRepository.getPServerRepository( fakeRepository.loadRepository( repositoryFileName ) )
+
+        os.environ[ 'PATH' ] = binDir + os.pathsep + os.environ[ 'PATH' ]
+        os.environ[ 'TEMP' ] = tempDir
+        os.environ[ 'RICKDIFF_BENCH_REPO' ] = repositoryFileName
+        os.environ[ 'RICKDIFF_BENCH_LATENCY' ] = str( args.latency )
+        os.environ[ 'RICKDIFF_BENCH_CALLS' ] = callsFileName
+
+        os.chdir( os.path.join( workDir, 'dev', 'sandbox1', 'src' ) )
+
+        options = [ '--root=' + os.path.join( workDir, 'dev' ), '--cache_dir=' + cacheDir ] + rickDiffOptions
+
+        print( '{0} files, {1} revisions, {2} KB, {3:g} ms latency, {4} warm runs'.format(
+               args.files, args.revisions, args.size, args.latency, args.iterations ) )
+        print( )
+        print( '{0:<12} {1:>9} {2:>9} {3:>10} {4:>10} {5:>10}'.format( 'scenario', 'cold (s)', 'warm (s)', 'cvs cold',
+                                                                     'cvs warm', 'meld' ) )
+
+        for name in args.scenarios:
+            arguments = [ ]
+
+            for argument in SCENARIOS[ name ]:
+                if argument == '{files}':
+                    arguments += fileNames
+                else:
+                    arguments.append( traceFileName if argument == '{trace}' else argument )
+
+            if server is not None:
+                server.connections = 0
+                server.commands = 0
+
+            result = runScenario( name, options + arguments, cacheDir, callsFileName, args.iterations )
+            results.append( result )
+
+            if name == 'pserver':
+                result[ 'connections' ] = server.connections
+                result[ 'commands' ] = server.commands
+
+                if result[ 'coldCalls' ][ 'cvs' ] or result[ 'warmCalls' ].get( 'cvs' ):
+                    failures.append( 'pserver started cvs' )
+
+                if result[ 'connections' ] >= result[ 'commands' ]:
+                    failures.append( 'pserver used {0} connections for {1} commands'.format( result[ 'connections' ],
+                                                                                            result[ 'commands' ] ) )
+            elif name == 'trace':
+                try:
+                    with open( traceFileName ) as inputFile:
+                        if not json.load( inputFile ).get( 'phases' ):
+                            failures.append( 'trace wrote no phases to ' + traceFileName )
+                except ( OSError, ValueError ) as error:
+                    failures.append( 'trace didn\'t write ' + traceFileName + ': {0}'.format( error ) )
+
+            print( '{0:<12} {1:>9.3f} {2:>9} {3:>10} {4:>10} {5:>10}'.format(
+                   name, result[ 'cold' ], '-' if result[ 'warm' ] is None else '{0:.3f}'.format( result[ 'warm' ] ),
+                   result[ 'coldCalls' ][ 'cvs' ], result[ 'warmCalls' ].get( 'cvs', '-' ),
+                   result[ 'coldCalls' ][ 'meld' ] ) )
+    finally:
+        if server is not None:
+            server.shutdown( )
+            server.server_close( )
+
+        os.chdir( savedDir )
+        os.environ.clear( )
+        os.environ.update( savedEnviron )
+        shutil.rmtree( workDir, ignore_errors=True )
+
+    for result in results:
+        if 'connections' in result:
+            print( )
+            print( '{0}:  {1} connections for {2} commands'.format( result[ 'scenario' ], result[ 'connections' ],
+                                                                   result[ 'commands' ] ) )
+
+    if args.output:
+        with open( args.output, 'w' ) as outputFile:
+            json.dump( { 'version' : rickDiff.VERSION, 'files' : args.files, 'revisions' : args.revisions,
+                         'size' : args.size, 'latency' : args.latency, 'results' : results }, outputFile, indent=1 )
+
+    for failure in failures:
+        print( 'FAILED:  ' + failure )
+
+    return 1 if failures else 0
+
+
+#//******************************************************************************
+#//
+#//  __main__
+#//
+#//******************************************************************************
+
+if __name__ == '__main__':
+    sys.exit( main( ) )
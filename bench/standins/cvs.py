@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+#//******************************************************************************
+#//
+#//  cvs
+#//
+#//  a stand-in for the cvs command line client that serves a fakeRepository,
+#//  for benchmarking rickDiff without a server
+#//
+#//  It understands just what rickDiff runs:  'cvs log' (on sandbox files and
+#//  directories), 'cvs rlog' and 'cvs co -p'.  It is configured with:
+#//
+#//      RICKDIFF_BENCH_REPO - the repository description (see fakeRepository)
+#//      RICKDIFF_BENCH_LATENCY - milliseconds to wait before answering, like
+#//          connecting to a server
+#//      RICKDIFF_BENCH_CALLS - a file that each stand-in appends its command
+#//          line to, so the harness can count processes
+#//
+#//******************************************************************************
+
+import os
+import sys
+import time
+
+sys.path.insert( 0, os.path.dirname( os.path.abspath( __file__ ) ) )
+
+from fakeRepository import *
+
+
+#//******************************************************************************
+#//
+#//  recordCall
+#//
+#//  appends the command line to $RICKDIFF_BENCH_CALLS and waits for the
+#//  simulated server latency
+#//
+#//******************************************************************************
+
+def recordCall( program ):
+    callsFileName = os.environ.get( 'RICKDIFF_BENCH_CALLS' )
+
+    if callsFileName:
+        with open( callsFileName, 'a' ) as outputFile:
+            outputFile.write( ' '.join( [ program ] + sys.argv[ 1: ] ) + '\n' )
+
+    time.sleep( float( os.environ.get( 'RICKDIFF_BENCH_LATENCY', '0' ) ) / 1000 )
+
+
+#//******************************************************************************
+#//
+#//  getRepositoryPaths
+#//
+#//  returns ( path, workingFile ) for each file a sandbox target refers to
+#//
+#//******************************************************************************
+
+def getRepositoryPaths( repository, target, local ):
+    if os.path.isdir( target ):
+        with open( os.path.join( target, 'CVS', 'Repository' ) ) as inputFile:
+            directory = inputFile.read( ).strip( )
+
+        # like cvs, name the files in '.' without a leading './'
+        return [ ( path, os.path.normpath( os.path.join( target, path[ len( directory ) + 1: ] ) ).replace( '\\', '/' ) )
+                 for path in sorted( repository[ 'files' ] )
+                 if path.startswith( directory + '/' ) and not ( local and '/' in path[ len( directory ) + 1: ] ) ]
+
+    with open( os.path.join( os.path.dirname( target ), 'CVS', 'Repository' ) ) as inputFile:
+        directory = inputFile.read( ).strip( )
+
+    return [ ( directory + '/' + os.path.basename( target ), target.replace( '\\', '/' ) ) ]
+
+
+#//******************************************************************************
+#//
+#//  main
+#//
+#//******************************************************************************
+
+def main( ):
+    recordCall( 'cvs' )
+
+    repository = loadRepository( os.environ[ 'RICKDIFF_BENCH_REPO' ] )
+
+    arguments = sys.argv[ 1: ]
+
+    # global options
+    while arguments and arguments[ 0 ].startswith( '-' ):
+        arguments.pop( 0 )
+
+    command = arguments.pop( 0 )
+
+    if command in ( 'co', 'checkout' ):
+        revision = None
+        paths = [ ]
+
+        while arguments:
+            argument = arguments.pop( 0 )
+
+            if argument == '-r':
+                revision = arguments.pop( 0 )
+            elif argument.startswith( '-r' ):
+                revision = argument[ 2: ]
+            elif not argument.startswith( '-' ):
+                paths.append( argument )
+
+        for path in paths:
+            revision = ( '1.' + str( repository.get( 'tags', { } )[ revision ] )
+                         if revision in repository.get( 'tags', { } ) else revision )
+
+            if path not in repository[ 'files' ] or revision not in getRevisions( repository, path ):
+                sys.stderr.write( 'cvs checkout: no such tag ' + str( revision ) + '\n' )
+                return 1
+
+            sys.stdout.flush( )
+
+            for chunk in generateContents( repository, path, revision ):
+                sys.stdout.buffer.write( chunk )
+
+        return 0
+
+    if command in ( 'log', 'rlog' ):
+        options = [ argument for argument in arguments if argument.startswith( '-' ) ]
+        targets = [ argument for argument in arguments if not argument.startswith( '-' ) ]
+
+        selection = ( [ option[ 2: ] for option in options if option.startswith( '-r' ) ] or [ None ] )[ -1 ]
+
+        for target in targets:
+            if command == 'rlog':
+                paths = [ ( path, None ) for path in sorted( repository[ 'files' ] )
+                          if path == target or path.startswith( target + '/' ) ]
+            else:
+                paths = getRepositoryPaths( repository, target, '-l' in options )
+
+            for path, workingFile in paths:
+                sys.stdout.write( formatLog( repository, path, workingFile, selection, '-h' in options, '-N' in options ) )
+
+        return 0
+
+    sys.stderr.write( 'cvs: unknown command ' + command + '\n' )
+    return 1
+
+
+#//******************************************************************************
+#//
+#//  __main__
+#//
+#//******************************************************************************
+
+if __name__ == '__main__':
+    sys.exit( main( ) )
@@ -0,0 +1,200 @@
+#//******************************************************************************
+#//
+#//  fakeRepository
+#//
+#//  a made-up CVS repository for the benchmark stand-ins, which is described by
+#//  a small JSON file rather than stored:
+#//
+#//      { "root" : "/cvsroot", "size" : 20000,
+#//        "files" : { "module/src/file0.c" : 10, ... },
+#//        "tags" : { "RELEASE_1" : 3 } }
+#//
+#//  Each file has revisions 1.1 through 1.n (n from "files"), and every
+#//  revision's contents are generated from the file name and revision number,
+#//  about "size" bytes of them, so the same description always gives the same
+#//  repository.  Each revision changes a few scattered lines.  Tags name the
+#//  same revision number in every file.  "sizes" can give some files a size of
+#//  their own:
+#//
+#//      "sizes" : { "module/src/big.dat" : 268435456 }
+#//
+#//******************************************************************************
+
+import datetime
+import json
+import os
+
+
+# revision 1.n was committed n days after this
+BASE_DATE = datetime.datetime( 2015, 9, 1, 12 )
+
+
+#//******************************************************************************
+#//
+#//  loadRepository
+#//
+#//******************************************************************************
+
+def loadRepository( fileName ):
+    with open( fileName ) as inputFile:
+        return json.load( inputFile )
+
+
+#//******************************************************************************
+#//
+#//  getRevisions
+#//
+#//  returns the revision numbers of a file, newest first
+#//
+#//******************************************************************************
+
+def getRevisions( repository, path ):
+    return [ '1.' + str( revision ) for revision in range( repository[ 'files' ][ path ], 0, -1 ) ]
+
+
+#//******************************************************************************
+#//
+#//  generateContents
+#//
+#//  yields the contents of one revision of a file (see getContents) in chunks
+#//  of about 64 KB, so even huge files never have to be held in memory
+#//
+#//******************************************************************************
+
+def generateContents( repository, path, revision ):
+    number = int( revision.split( '.' )[ -1 ] )
+    name = os.path.basename( path )
+    total = repository.get( 'sizes', { } ).get( path, repository[ 'size' ] )
+
+    lines = [ ]
+    size = 0
+    chunkSize = 0
+    line = 0
+
+    while size < total:
+        # each line was last changed by the newest revision that touches it
+        changed = 0
+
+        for candidate in range( number, 0, -1 ):
+            if ( line + candidate * 13 ) % 40 == 0:
+                changed = candidate
+                break
+
+        text = '    ' + name + ' line ' + str( line ) + ' changed in revision ' + str( changed ) + ';\r\n'
+
+        lines.append( text )
+        size += len( text )
+        chunkSize += len( text )
+        line += 1
+
+        if chunkSize >= 1 << 16:
+            yield ''.join( lines ).encode( 'ascii' )
+
+            lines = [ ]
+            chunkSize = 0
+
+    if lines:
+        yield ''.join( lines ).encode( 'ascii' )
+
+
+#//******************************************************************************
+#//
+#//  getContents
+#//
+#//  returns the contents of one revision of a file as bytes (with CRLF line
+#//  endings, like the Windows sandboxes rickDiff was written for)
+#//
+#//******************************************************************************
+
+def getContents( repository, path, revision ):
+    return b''.join( generateContents( repository, path, revision ) )
+
+
+#//******************************************************************************
+#//
+#//  getDate
+#//
+#//  returns the date a revision was committed, as 'cvs log' prints it (later
+#//  revisions always have later dates, however many there are)
+#//
+#//******************************************************************************
+
+def getDate( revision ):
+    date = BASE_DATE + datetime.timedelta( days=int( revision.split( '.' )[ -1 ] ) )
+    return date.strftime( '%Y/%m/%d %H:%M:%S' )
+
+
+#//******************************************************************************
+#//
+#//  formatLog
+#//
+#//  returns what 'cvs log' would print for a file, optionally only for the
+#//  revisions selected by a '-r' range, with workingFile as its 'Working file'
+#//  (or none, like 'cvs rlog')
+#//
+#//******************************************************************************
+
+def formatLog( repository, path, workingFile=None, selection=None, headerOnly=False, noTags=False ):
+    revisions = getRevisions( repository, path )
+    selected = revisions
+
+    if selection:
+        start = selection.rstrip( ':' )
+
+        if start in revisions:
+            selected = revisions[ : revisions.index( start ) + ( 0 if selection.endswith( '::' ) else 1 ) ]
+
+    lines = [ '', 'RCS file: ' + repository[ 'root' ] + '/' + path + ',v' ]
+
+    if workingFile is not None:
+        lines.append( 'Working file: ' + workingFile )
+
+    lines += [ 'head: ' + revisions[ 0 ], 'branch:', 'locks: strict', 'access list:' ]
+
+    if not noTags:
+        lines.append( 'symbolic names:' )
+        lines += [ '\t' + tag + ': 1.' + str( number ) for tag, number in sorted( repository.get( 'tags', { } ).items( ) )
+                   if number <= repository[ 'files' ][ path ] ]
+
+    lines += [ 'keyword substitution: kv',
+               'total revisions: ' + str( len( revisions ) ) + ';\tselected revisions: ' + str( len( selected ) ),
+               'description:' ]
+
+    if not headerOnly:
+        for revision in selected:
+            number = int( revision.split( '.' )[ -1 ] )
+
+            lines += [ '----------------------------', 'revision ' + revision,
+                       'date: ' + getDate( revision ) + ';  author: rick;  state: Exp;  lines: +3 -3;',
+                       'change ' + str( number ) ]
+
+    lines.append( '=' * 77 )
+
+    return '\n'.join( lines ) + '\n'
+
+
+#//******************************************************************************
+#//
+#//  getPServerRepository
+#//
+#//  returns the repository in the form the stand-in pserver serves (see
+#//  pserver.py), with every revision's contents generated up front and LF line
+#//  endings, as a server would store them
+#//
+#//******************************************************************************
+
+def getPServerRepository( repository ):
+    result = { }
+
+    for path in repository[ 'files' ]:
+        symbols = dict( ( tag, '1.' + str( number ) ) for tag, number in repository.get( 'tags', { } ).items( )
+                        if number <= repository[ 'files' ][ path ] )
+
+        revisions = [ { 'rev' : revision, 'date' : getDate( revision ), 'author' : 'rick',
+                        'log' : 'change ' + revision.split( '.' )[ -1 ],
+                        'content' : getContents( repository, path, revision ).decode( 'ascii' ).replace( '\r\n', '\n' ) }
+                      for revision in getRevisions( repository, path ) ]
+
+        result[ path ] = { 'symbols' : symbols, 'revisions' : revisions }
+
+    return result
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+#//******************************************************************************
+#//
+#//  meld
+#//
+#//  a stand-in for Meld (and the formatters) for benchmarking:  it records
+#//  that it was run (see cvs.py) and exits straight away
+#//
+#//  Run as 'astyle' or 'uncrustify' (the first argument says which), it
+#//  answers '--version' and leaves the file it is given alone, except that
+#//  uncrustify writes its output to fileName.uncrustify the way the real one
+#//  does.
+#//
+#//******************************************************************************
+
+import os
+import shutil
+import sys
+
+sys.path.insert( 0, os.path.dirname( os.path.abspath( __file__ ) ) )
+
+from cvs import recordCall
+
+
+#//******************************************************************************
+#//
+#//  __main__
+#//
+#//******************************************************************************
+
+if __name__ == '__main__':
+    program = 'meld'
+
+    if len( sys.argv ) > 1 and sys.argv[ 1 ] in ( 'astyle', 'uncrustify' ):
+        program = sys.argv.pop( 1 )
+
+    os.environ[ 'RICKDIFF_BENCH_LATENCY' ] = '0'
+    recordCall( program )
+
+    if program != 'meld':
+        if sys.argv[ 1: ] == [ '--version' ]:
+            print( program + ' 0.0 (benchmark stand-in)' )
+        elif program == 'uncrustify' and len( sys.argv ) > 1:
+            shutil.copyfile( sys.argv[ -1 ], sys.argv[ -1 ] + '.uncrustify' )
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+#//******************************************************************************
+#//
+#//  pserver
+#//
+#//  a stand-in CVS pserver for trying out rickDiff's --pserver client without
+#//  a real server
+#//
+#//  It speaks just enough of the client/server protocol for rickDiff (login,
+#//  'co -p' and 'rlog') and serves revisions out of a JSON file like:
+#//
+#//      { "module/src/foo.c" : { "symbols" : { "RELEASE_1" : "1.2" },
+#//                               "revisions" : [ { "rev" : "1.3", "content" : "...",
+#//                                                 "author" : "rick", "date" : "2015/09/23 12:00:00",
+#//                                                 "log" : "..." }, ... ] } }
+#//
+#//  with the newest revision first.  It counts the connections and commands it
+#//  sees, so a test can tell whether connections are being reused.  Like a
+#//  real server, it refuses a client whose Valid-responses leaves out any of
+#//  the essential responses.
+#//
+#//  usage:  python bench/standins/pserver.py repository.json [ port ]
+#//
+#//  The sandbox's CVS/Root should then be ':pserver:user@localhost:port/cvsroot'
+#//  (any user and password are accepted).
+#//
+#//******************************************************************************
+
+import json
+import socketserver
+import sys
+import threading
+
+
+ROOT = '/cvsroot'
+
+VALID_REQUESTS = 'Root Valid-responses valid-requests Argument Argumentx Directory co checkout rlog'
+
+# the responses a real server insists the client supports (the ones marked essential in CVS's client.c)
+ESSENTIAL_RESPONSES = [ 'ok', 'error', 'Valid-requests', 'Checked-in', 'Updated', 'Merged', 'Removed', 'M', 'E' ]
+
+
+#//******************************************************************************
+#//
+#//  PServerHandler
+#//
+#//******************************************************************************
+
+class PServerHandler( socketserver.StreamRequestHandler ):
+    def handle( self ):
+        server = self.server
+
+        with server.lock:
+            server.connections += 1
+
+        if self.readLine( ) != 'BEGIN AUTH REQUEST':
+            return
+
+        lines = [ self.readLine( ) for i in range( 4 ) ]
+
+        if lines[ 0 ] != ROOT or lines[ 3 ] != 'END AUTH REQUEST':
+            self.write( 'I HATE YOU\n' )
+            return
+
+        self.write( 'I LOVE YOU\n' )
+
+        arguments = [ ]
+        refusal = None
+
+        while True:
+            line = self.rfile.readline( )
+
+            if not line:
+                return
+
+            request, _, text = line.decode( 'utf-8' ).rstrip( '\n' ).partition( ' ' )
+
+            # a real server reports this at the next request it answers, and then gives up
+            if refusal is not None and request not in ( 'Root', 'Argument', 'Argumentx', 'Directory' ):
+                self.write( 'E ' + refusal + '\nerror  \n' )
+                return
+
+            if request == 'Valid-responses':
+                missing = [ name for name in ESSENTIAL_RESPONSES if name not in text.split( ) ]
+
+                if missing:
+                    refusal = 'response "' + missing[ 0 ] + '" not supported by client'
+            elif request in ( 'Root', 'UseUnchanged' ):
+                pass
+            elif request == 'valid-requests':
+                self.write( 'Valid-requests ' + VALID_REQUESTS + '\nok\n' )
+            elif request == 'Argument':
+                arguments.append( text )
+            elif request == 'Argumentx':
+                arguments[ -1 ] += '\n' + text
+            elif request == 'Directory':
+                self.readLine( )
+            elif request in ( 'co', 'checkout', 'rlog' ):
+                with server.lock:
+                    server.commands += 1
+
+                if request == 'rlog':
+                    self.rlog( arguments )
+                else:
+                    self.checkout( arguments )
+
+                arguments = [ ]
+            else:
+                self.write( 'error  unrecognized request \'' + request + '\'\n' )
+
+    def readLine( self ):
+        return self.rfile.readline( ).decode( 'utf-8' ).rstrip( '\n' )
+
+    def write( self, text ):
+        self.wfile.write( text.encode( 'utf-8' ) )
+
+    def findRevision( self, path, version ):
+        entry = self.server.repository.get( path )
+
+        if entry is None:
+            return None
+
+        version = entry.get( 'symbols', { } ).get( version, version )
+
+        if version == 'HEAD':
+            return entry[ 'revisions' ][ 0 ]
+
+        for revision in entry[ 'revisions' ]:
+            if revision[ 'rev' ] == version:
+                return revision
+
+        return None
+
+    def checkout( self, arguments ):
+        version = 'HEAD'
+        paths = [ ]
+
+        while arguments:
+            argument = arguments.pop( 0 )
+
+            if argument == '-r':
+                version = arguments.pop( 0 )
+            elif argument.startswith( '-r' ):
+                version = argument[ 2: ]
+            elif not argument.startswith( '-' ):
+                paths.append( argument )
+
+        for path in paths:
+            revision = self.findRevision( path, version )
+
+            if revision is None:
+                self.write( 'E cvs checkout: Could not check out ' + path + '\nerror  \n' )
+                return
+
+            self.write( 'E ===================================================================\n'
+                        'E Checking out ' + path + '\nE RCS:  ' + ROOT + '/' + path + ',v\nE VERS: ' +
+                        revision[ 'rev' ] + '\nE ***************\n' )
+
+            content = revision[ 'content' ]
+
+            if content.endswith( '\n' ) or content == '':
+                self.write( ''.join( 'M ' + line + '\n' for line in content.split( '\n' )[ : -1 ] ) )
+            else:
+                data = content.encode( 'utf-8' )
+                self.write( 'Mbinary\n' + str( len( data ) ) + '\n' )
+                self.wfile.write( data )
+
+        self.write( 'ok\n' )
+
+    def rlog( self, arguments ):
+        selection = None
+        headerOnly = False
+        noTags = False
+        local = False
+        targets = [ ]
+
+        for argument in arguments:
+            if argument == '-h':
+                headerOnly = True
+            elif argument == '-N':
+                noTags = True
+            elif argument == '-l':
+                local = True
+            elif argument.startswith( '-r' ):
+                selection = argument[ 2: ]
+            elif not argument.startswith( '-' ):
+                targets.append( argument )
+
+        paths = [ ]
+
+        for target in targets:
+            if target in self.server.repository:
+                paths.append( target )
+            else:
+                for path in sorted( self.server.repository ):
+                    if path.startswith( target + '/' ) and not ( local and '/' in path[ len( target ) + 1: ] ):
+                        paths.append( path )
+
+        output = [ ]
+
+        for path in paths:
+            entry = self.server.repository[ path ]
+            revisions = entry[ 'revisions' ]
+            selected = revisions
+
+            if selection:
+                names = [ revision[ 'rev' ] for revision in revisions ]
+                start = selection.rstrip( ':' )
+
+                if start in names:
+                    selected = revisions[ : names.index( start ) + ( 0 if selection.endswith( '::' ) else 1 ) ]
+
+            output += [ '', 'RCS file: ' + ROOT + '/' + path + ',v', 'head: ' + revisions[ 0 ][ 'rev' ], 'branch:',
+                        'locks: strict', 'access list:' ]
+
+            if not noTags:
+                output.append( 'symbolic names:' )
+                output += [ '\t' + name + ': ' + version for name, version in entry.get( 'symbols', { } ).items( ) ]
+
+            output += [ 'keyword substitution: kv',
+                        'total revisions: ' + str( len( revisions ) ) + ';\tselected revisions: ' + str( len( selected ) ),
+                        'description:' ]
+
+            if not headerOnly:
+                for revision in selected:
+                    output += [ '----------------------------', 'revision ' + revision[ 'rev' ],
+                                'date: ' + revision.get( 'date', '2015/09/23 12:00:00' ) + ';  author: ' +
+                                revision.get( 'author', 'rick' ) + ';  state: Exp;  lines: +1 -1;',
+                                revision.get( 'log', 'change' ) ]
+
+            output.append( '=' * 77 )
+
+        self.write( ''.join( 'M ' + line + '\n' for line in output ) + 'ok\n' )
+
+
+#//******************************************************************************
+#//
+#//  PServer
+#//
+#//******************************************************************************
+
+class PServer( socketserver.ThreadingTCPServer ):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__( self, repository, port=0 ):
+        socketserver.ThreadingTCPServer.__init__( self, ( 'localhost', port ), PServerHandler )
+        self.repository = repository
+        self.lock = threading.Lock( )
+        self.connections = 0
+        self.commands = 0
+
+
+#//******************************************************************************
+#//
+#//  startServer
+#//
+#//  starts a stand-in pserver on a background thread and returns it; port 0
+#//  picks a free port, which is server.server_address[ 1 ]
+#//
+#//******************************************************************************
+
+def startServer( repository, port=0 ):
+    server = PServer( repository, port )
+
+    thread = threading.Thread( target=server.serve_forever )
+    thread.daemon = True
+    thread.start( )
+
+    return server
+
+
+#//******************************************************************************
+#//
+#//  __main__
+#//
+#//******************************************************************************
+
+if __name__ == '__main__':
+    if len( sys.argv ) < 2:
+        print( 'usage:  python pserver.py repository.json [ port ]' )
+        sys.exit( 1 )
+
+    with open( sys.argv[ 1 ] ) as inputFile:
+        repository = json.load( inputFile )
+
+    server = PServer( repository, int( sys.argv[ 2 ] ) if len( sys.argv ) > 2 else 2401 )
+
+    print( 'serving ' + sys.argv[ 1 ] + ' on port ' + str( server.server_address[ 1 ] ) )
+
+    try:
+        server.serve_forever( )
+    except KeyboardInterrupt:
+        print( str( server.connections ) + ' connections, ' + str( server.commands ) + ' commands' )
@@ -2,12 +2,27 @@
 
 import argparse
 from argparse import RawTextHelpFormatter
+import bisect
+import calendar
 import codecs
+import collections
+import concurrent.futures
+import contextlib
 import fnmatch
+import hashlib
+import itertools
+import json
+import mmap
+import multiprocessing.connection
 import os
+import posixpath
+import re
+import shlex
+import socket
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 
 
@@ -30,6 +45,225 @@ CLEAR_LINE = '\r                             \r'
 
 DEFAULT_DEV_ROOT = 'c:\\dev'
 
+DEFAULT_CACHE_DIR = os.environ.get( 'RICKDIFF_CACHE', os.path.join( os.path.expanduser( '~' ), '.rickDiff' ) )
+
+DEFAULT_CACHE_SIZE = 1024     # megabytes
+
+INDEX_FORMAT = 3
+INDEX_MAX_AGE = 600     # seconds before HEAD is re-checked against the server
+
+MAX_COMMAND_LENGTH = 30000      # Windows allows 32767 characters on a command line
+
+DEFAULT_JOBS = 4
+
+CHUNK_SIZE = 1 << 16
+
+GIT_ABBREV = 10         # length of the commit ids rickDiff shows for git
+
+PSERVER_PORT = 2401
+PSERVER_TIMEOUT = 60    # seconds
+
+# the responses rickDiff understands (or is content to ignore) from a pserver; 'Checked-in', 'Updated',
+# 'Merged' and 'Removed' never come back from 'co -p' or 'rlog', but they are essential to CVS, and a
+# server refuses a client that doesn't claim to support them
+PSERVER_RESPONSES = [ 'ok', 'error', 'Valid-requests', 'Checked-in', 'Updated', 'Merged', 'Removed', 'M', 'Mbinary',
+                      'E', 'F', 'MT' ]
+
+TREE_SKIP_DIRS = { 'CVS', '.git' }
+TREE_POOL_THRESHOLD = 256   # fewer files than this to hash aren't worth starting processes for
+TREE_RACY_SECONDS = 2       # files modified this recently might change again without their mtime changing
+
+MEMORY_CACHE_SIZE = 64 << 20   # bytes of revisions the daemon keeps in memory
+
+CACHE_EVICT_TARGET = 0.9    # a full cache is trimmed to this fraction of --cache_size, so it isn't trimmed on every add
+
+DAEMON_KEY_FILE = 'daemon.key'
+
+# the environment variables a client passes on to the daemon, which are all a command run by the daemon sees
+DAEMON_ENVIRONMENT = [ 'TEMP', 'CVSROOT', 'CVS_RSH', 'CVS_PASSFILE', 'PATH', 'DISPLAY', 'WAYLAND_DISPLAY',
+                       'ARTISTIC_STYLE_OPTIONS', 'UNCRUSTIFY_CONFIG', 'HOME', 'USERPROFILE', 'RICKDIFF_CACHE',
+                       'USER', 'USERNAME', 'SYSTEMROOT' ]
+
+CHANGESET_WINDOW = 300  # seconds between the files of one CVS commit (as in cvsps)
+CHANGESET_LIST_SIZE = 25
+
+DEFAULT_VIEWER = 'meld'
+DEFAULT_TABS = 10       # comparisons shown in one viewer at a time
+DEFAULT_LARGE_FILE_SIZE = 64    # megabytes; larger files are summarized rather than compared line by line
+
+# viewers that can show several comparisons as tabs, and the option that starts each one
+VIEWER_TAB_OPTIONS = { 'meld' : '--diff' }
+
+PREFETCH_JOBS = 2       # revisions fetched in the background at the same time (see Prefetcher)
+
+MAX_DIFF_CHAIN = 64     # lines occurring more often than this are never used to anchor a diff
+MAX_DIFF_COST = 256     # differences bisectRegion looks for from each end before settling for a good split
+
+# revision indexes already loaded in this process, keyed by ( root, repository path )
+revisionIndexes = { }
+
+# the CVSROOT of each sandbox directory looked at so far (see getRepositoryRoot)
+repositoryRoots = { }
+
+# the shared progress line for files being retrieved concurrently
+statusLock = threading.Lock( )
+statusLine = { }
+statusWidth = 0
+
+# CVS/Entries files already read in this process, keyed by directory
+entriesLock = threading.Lock( )
+entriesIndexes = { }
+
+# the pooled pserver connections, if rickDiff is talking to the server itself (--pserver)
+pserverPool = None
+
+# the phases timed so far (see timePhase), or None if nothing is being timed
+timingLock = threading.Lock( )
+timingEvents = None
+timingOrigin = None
+
+# formatter versions, which only need to be asked for once
+formatterLock = threading.Lock( )
+formatterVersions = { }
+
+# the background fetches started by --prefetch, if there have been any
+prefetcher = None
+
+# the sandboxes under each devRoot, keyed by devRoot
+devDirsCache = { }
+
+# the viewers started by launchViewer that were still running when it was last called, so
+# whoever runs rickDiff in-process (the benchmarks) can wait for them
+viewerProcesses = [ ]
+
+# the size of the blobs in each cache directory, kept up to date as blobs are added so the
+# directory only has to be scanned once a run (see evictFromCache)
+cacheSizeLock = threading.Lock( )
+cacheSizes = { }
+
+# whether this process is the daemon, and the revisions it has in memory (see getMemoryBlob)
+daemonRunning = False
+memoryLock = threading.Lock( )
+memoryBlobs = None
+memoryBlobsSize = 0
+
+
+#//******************************************************************************
+#//
+#//  startTiming
+#//
+#//  turns on the recording of phases (see timePhase), which is off unless
+#//  --timings or --trace is given
+#//
+#//******************************************************************************
+
+def startTiming( ):
+    global timingEvents, timingOrigin
+
+    timingEvents = [ ]
+    timingOrigin = ( time.time( ), time.perf_counter( ) )
+
+
+#//******************************************************************************
+#//
+#//  timePhase
+#//
+#//  a context manager that records how long the code inside it takes, under
+#//  the name of the phase (e.g. 'cvs log' or 'checkout') and a detail like the
+#//  file name
+#//
+#//  Phases can nest, and can be timed on any thread.  Nothing is recorded
+#//  unless startTiming has been called.
+#//
+#//******************************************************************************
+
+@contextlib.contextmanager
+def timePhase( name, detail='' ):
+    if timingEvents is None:
+        yield
+        return
+
+    startTime = time.perf_counter( )
+
+    try:
+        yield
+    finally:
+        endTime = time.perf_counter( )
+
+        with timingLock:
+            timingEvents.append( ( name, detail, startTime, endTime, threading.get_ident( ) ) )
+
+
+#//******************************************************************************
+#//
+#//  showTimings
+#//
+#//  prints the number of times each phase ran, how long they took altogether
+#//  and the longest single one, in the order the phases first started
+#//
+#//  Because phases nest and run in parallel, the totals can add up to more
+#//  than the whole run.
+#//
+#//******************************************************************************
+
+def showTimings( ):
+    phases = { }
+
+    for name, detail, startTime, endTime, thread in sorted( timingEvents, key=lambda event: event[ 2 ] ):
+        count, total, longest = phases.get( name, ( 0, 0.0, 0.0 ) )
+        phases[ name ] = ( count + 1, total + endTime - startTime, max( longest, endTime - startTime ) )
+
+    print( )
+    print( '{0:<24} {1:>6} {2:>10} {3:>10}'.format( 'phase', 'count', 'total (s)', 'max (s)' ) )
+
+    for name, ( count, total, longest ) in phases.items( ):
+        print( '{0:<24} {1:>6} {2:>10.3f} {3:>10.3f}'.format( name, count, total, longest ) )
+
+
+#//******************************************************************************
+#//
+#//  writeTrace
+#//
+#//  writes the recorded phases to fileName, either as plain JSON ('json') or in
+#//  the Chrome trace event format ('chrome', which chrome://tracing and
+#//  Perfetto can load)
+#//
+#//  Both record when and where rickDiff ran and with what arguments, so traces
+#//  from different people and machines can be collected and compared.
+#//
+#//******************************************************************************
+
+def writeTrace( fileName, traceFormat ):
+    startTime, startCounter = timingOrigin
+
+    info = { 'program' : PROGRAM_NAME, 'version' : VERSION, 'start' : startTime, 'arguments' : sys.argv[ 1: ],
+             'host' : socket.gethostname( ), 'user' : os.environ.get( 'USER', os.environ.get( 'USERNAME', '' ) ),
+             'cwd' : os.getcwd( ) }
+
+    threads = { }
+
+    for event in timingEvents:
+        threads.setdefault( event[ 4 ], len( threads ) )
+
+    events = sorted( timingEvents, key=lambda event: event[ 2 ] )
+
+    if traceFormat == 'chrome':
+        trace = { 'traceEvents' : [ { 'name' : name, 'cat' : PROGRAM_NAME, 'ph' : 'X', 'pid' : os.getpid( ),
+                                      'tid' : threads[ thread ], 'ts' : ( begin - startCounter ) * 1e6,
+                                      'dur' : ( end - begin ) * 1e6, 'args' : { 'detail' : detail } }
+                                    for name, detail, begin, end, thread in events ],
+                  'displayTimeUnit' : 'ms', 'otherData' : info }
+    else:
+        trace = dict( info, phases=[ { 'name' : name, 'detail' : detail, 'start' : begin - startCounter,
+                                       'duration' : end - begin, 'thread' : threads[ thread ] }
+                                     for name, detail, begin, end, thread in events ] )
+
+    try:
+        with open( fileName, 'w' ) as outputFile:
+            json.dump( trace, outputFile, indent=1 )
+    except OSError as error:
+        print( PROGRAM_NAME + ": cannot write trace: {0}".format( error ) )
+
 
 #//******************************************************************************
 #//
@@ -75,279 +309,4858 @@ def incrementVersionSimple( version, increment ):
 
 #//******************************************************************************
 #//
-#//  incrementVersion
+#//  parseCVSLog
 #//
-#//  increment the version number forwards or backwards based on cvs log
+#//  parses the output of 'cvs log' (or 'cvs rlog') line by line and yields a
+#//  record for each file it describes:
+#//
+#//      rcsFile - the RCS file name on the server
+#//      workingFile - the file name relative to the sandbox (cvs log only)
+#//      head - the head version
+#//      symbols - dictionary of symbolic names (tags and branches) to versions
+#//      revisions - list of revisions in the order cvs log reports them (newest
+#//                  to oldest)
+#//      details - dictionary of revision to its 'date', 'author', 'state',
+#//                'lines' and log 'message' (see parseRevisionDetails)
+#//
+#//******************************************************************************
+
+def parseCVSLog( lines ):
+    record = None
+    inSymbols = False
+    atRevision = False
+    lastRevision = None
+    messageRevision = None
+    messageLines = [ ]
+
+    for line in lines:
+        line = line.rstrip( '\r\n' )
+
+        # everything up to the next separator is the log message
+        if messageRevision is not None:
+            if line != '-' * 28 and not line.startswith( '=' * 20 ):
+                if messageLines or not line.startswith( 'branches: ' ):
+                    messageLines.append( line )
+
+                continue
+
+            record[ 'details' ][ messageRevision ][ 'message' ] = '\n'.join( messageLines ).strip( )
+            messageRevision = None
+            messageLines = [ ]
+
+        if line.startswith( 'RCS file: ' ):
+            record = { 'rcsFile' : line[ 10: ], 'workingFile' : '', 'head' : '', 'symbols' : { }, 'revisions' : [ ],
+                       'details' : { } }
+            inSymbols = False
+            atRevision = False
+            lastRevision = None
+            continue
+
+        if record is None:
+            continue
+
+        if inSymbols:
+            if line.startswith( '\t' ):
+                name, separator, version = line.strip( ).partition( ': ' )
+                record[ 'symbols' ][ name ] = version
+                continue
+
+            inSymbols = False
+
+        if line.startswith( '=' * 20 ):
+            yield record
+            record = None
+        elif line == '-' * 28:
+            atRevision = True
+        elif atRevision:
+            if line.startswith( 'revision ' ):
+                lastRevision = line.split( )[ 1 ]
+                record[ 'revisions' ].append( lastRevision )
+
+            atRevision = False
+        elif lastRevision is not None:
+            if line.startswith( 'date: ' ):
+                record[ 'details' ][ lastRevision ] = parseRevisionDetails( line )
+                messageRevision = lastRevision
+
+            lastRevision = None
+        elif line.startswith( 'Working file: ' ):
+            record[ 'workingFile' ] = line[ 14: ]
+        elif line.startswith( 'head: ' ):
+            record[ 'head' ] = line[ 6: ]
+        elif line.startswith( 'symbolic names:' ):
+            inSymbols = True
+
+    if record is not None:
+        if messageRevision is not None:
+            record[ 'details' ][ messageRevision ][ 'message' ] = '\n'.join( messageLines ).strip( )
+
+        yield record
+
+
+#//******************************************************************************
+#//
+#//  parseRevisionDetails
+#//
+#//  parses the 'date: ...;  author: ...;  state: ...;  lines: +a -b' line that
+#//  follows each revision in 'cvs log'
+#//
+#//  Dates come back as 'yyyy-mm-dd hh:mm:ss' (CVS writes either '/' or '-'
+#//  between the date fields, depending on its version), so they sort as strings.
+#//
+#//******************************************************************************
+
+def parseRevisionDetails( line ):
+    details = { }
+
+    for field in line.split( ';' ):
+        name, separator, value = field.strip( ).partition( ': ' )
+
+        if separator:
+            details[ name ] = value.strip( )
+
+    return { 'date' : details.get( 'date', '' ).replace( '/', '-' )[ : 19 ], 'author' : details.get( 'author', '' ),
+             'state' : details.get( 'state', '' ), 'lines' : details.get( 'lines', '' ), 'message' : '' }
+
+
+#//******************************************************************************
+#//
+#//  scramblePassword
+#//
+#//  CVS 'scrambles' pserver passwords (in ~/.cvspass and on the wire) with a
+#//  fixed substitution of the printable characters, marked by a leading 'A'
+#//
+#//******************************************************************************
+
+PSERVER_SHIFTS = [
+    114, 120,  53,  79,  96, 109,  72, 108,  70,  64,  76,  67, 116,  74,  68,  87,
+    111,  52,  75, 119,  49,  34,  82,  81,  95,  65, 112,  86, 118, 110, 122, 105,
+     41,  57,  83,  43,  46, 102,  40,  89,  38, 103,  45,  50,  42, 123,  91,  35,
+    125,  55,  54,  66, 124, 126,  59,  47,  92,  71, 115,  78,  88, 107, 106,  56,
+     36, 121, 117, 104, 101, 100,  69,  73,  99,  63,  94,  93,  39,  37,  61,  48,
+     58, 113,  32,  90,  44,  98,  60,  51,  33,  97,  62,  77,  84,  80,  85 ]
+
+def scramblePassword( password ):
+    return 'A' + ''.join( chr( PSERVER_SHIFTS[ ord( char ) - 32 ] ) if 32 <= ord( char ) < 127 else char
+                          for char in password )
+
+
+#//******************************************************************************
+#//
+#//  parseCVSRoot
+#//
+#//  parses ':pserver:[user[:password]@]host[:[port]]/path' into a dictionary,
+#//  or returns None if root isn't a pserver root
+#//
+#//******************************************************************************
+
+def parseCVSRoot( root ):
+    match = re.match( r'^:pserver:(?:([^@:]*)(?::([^@]*))?@)?([^:/]+):?([0-9]*)(/.*)$', root.strip( ) )
+
+    if match is None:
+        return None
+
+    user, password, host, port, path = match.groups( )
+
+    return { 'user' : user or os.environ.get( 'USER', os.environ.get( 'USERNAME', '' ) ), 'password' : password,
+             'host' : host, 'port' : int( port or PSERVER_PORT ), 'path' : path.rstrip( '/' ) }
+
+
+#//******************************************************************************
+#//
+#//  readCVSRoot
+#//
+#//  returns the parsed pserver root for the sandbox (CVS/Root, or $CVSROOT if
+#//  there isn't one) with its scrambled password filled in from ~/.cvspass
+#//
+#//******************************************************************************
+
+def readCVSRoot( ):
+    try:
+        with open( os.path.join( 'CVS', 'Root' ) ) as inputFile:
+            rootString = inputFile.read( ).strip( )
+    except OSError:
+        rootString = os.environ.get( 'CVSROOT', '' )
+
+    root = parseCVSRoot( rootString )
+
+    if root is None:
+        raise Exception( "--pserver needs a :pserver: CVSROOT, not '" + rootString + "'" )
+
+    if root[ 'password' ] is not None:
+        root[ 'password' ] = scramblePassword( root[ 'password' ] )
+        return root
+
+    root[ 'password' ] = 'A'    # an empty password
+
+    passFileName = os.environ.get( 'CVS_PASSFILE', os.path.join( os.path.expanduser( '~' ), '.cvspass' ) )
+
+    try:
+        with open( passFileName ) as inputFile:
+            for line in inputFile:
+                # newer lines look like '/1 <root> <password>', older ones like '<root> <password>'
+                if line.startswith( '/1 ' ):
+                    line = line[ 3: ]
+
+                name, _, password = line.rstrip( '\n' ).partition( ' ' )
+                entry = parseCVSRoot( name )
+
+                if entry is not None and all( entry[ key ] == root[ key ] for key in ( 'user', 'host', 'port', 'path' ) ):
+                    root[ 'password' ] = password
+    except OSError:
+        pass
+
+    return root
+
+
+#//******************************************************************************
+#//
+#//  getRepositoryDirectory
+#//
+#//  returns the repository directory (relative to the CVSROOT) of a sandbox
+#//  directory, from its CVS/Repository
+#//
+#//******************************************************************************
+
+def getRepositoryDirectory( directory, rootPath ):
+    try:
+        with open( os.path.join( directory or '.', 'CVS', 'Repository' ) ) as inputFile:
+            repository = inputFile.read( ).strip( )
+    except OSError:
+        raise Exception( "cannot find CVS/Repository in '" + ( directory or '.' ) + "'" )
+
+    if repository.startswith( rootPath + '/' ):
+        repository = repository[ len( rootPath ) + 1: ]
+
+    return repository
+
+
+#//******************************************************************************
+#//
+#//  getRepositoryRoot
+#//
+#//  returns the CVSROOT of a sandbox directory (from its CVS/Root, or the
+#//  current directory's, or $CVSROOT), without any password in it
+#//
+#//  It goes into the cache keys along with the repository path, since the
+#//  same path on two servers is two different files.
+#//
+#//******************************************************************************
+
+def getRepositoryRoot( directory ):
+    # the daemon runs in many sandboxes, so they are remembered by absolute path
+    directory = os.path.abspath( directory or '.' )
+    root = repositoryRoots.get( directory )
+
+    if root is None:
+        root = os.environ.get( 'CVSROOT', '' )
+
+        for rootDirectory in ( directory, '.' ):
+            try:
+                with open( os.path.join( rootDirectory, 'CVS', 'Root' ) ) as inputFile:
+                    root = inputFile.read( ).strip( )
+                    break
+            except OSError:
+                pass
+
+        root = re.sub( r'^(:\w+:[^:@/]*):[^@]*@', r'\1@', root )
+        repositoryRoots[ directory ] = root
+
+    return root
+
+
+#//******************************************************************************
+#//
+#//  PServerConnection
+#//
+#//  one authenticated connection to a CVS pserver, which speaks the CVS
+#//  client/server protocol directly instead of running cvs
+#//
+#//  After the handshake, any number of commands can be sent over the same
+#//  connection, one at a time.  request( ) sends one and is a generator of its
+#//  output (the 'M' and 'Mbinary' responses, i.e. what cvs would have written
+#//  to stdout), and raises an exception with the server's messages if the
+#//  command ends in 'error' rather than 'ok'.  The connection is 'busy' until
+#//  one of them has been read, so one that was abandoned part way through is
+#//  known to be out of step and can't be reused.
+#//
+#//******************************************************************************
+
+class PServerConnection( object ):
+    def __init__( self, root ):
+        self.root = root
+        self.busy = False
+        self.socket = socket.create_connection( ( root[ 'host' ], root[ 'port' ] ), PSERVER_TIMEOUT )
+        self.input = self.socket.makefile( 'rb' )
+
+        try:
+            self.send( 'BEGIN AUTH REQUEST\n' + root[ 'path' ] + '\n' + root[ 'user' ] + '\n' + root[ 'password' ] +
+                       '\nEND AUTH REQUEST\n' )
+
+            if self.input.readline( ) != b'I LOVE YOU\n':
+                raise Exception( 'pserver login failed for ' + root[ 'user' ] + '@' + root[ 'host' ] + ':' +
+                                 root[ 'path' ] + ' (run \'cvs login\' first?)' )
+
+            self.send( 'Root ' + root[ 'path' ] + '\nValid-responses ' + ' '.join( PSERVER_RESPONSES ) +
+                       '\nvalid-requests\n' )
+
+            for data in self.readResponses( ):
+                pass
+        except:
+            self.close( )
+            raise
+
+    def send( self, text ):
+        self.socket.sendall( text.encode( 'utf-8' ) )
+
+    def readResponses( self ):
+        messages = [ ]
+
+        while True:
+            line = self.input.readline( )
+
+            if not line.endswith( b'\n' ):
+                raise ConnectionError( 'the pserver closed the connection' )
+
+            name, _, text = line[ : -1 ].partition( b' ' )
+
+            if name == b'ok':
+                self.busy = False
+                return
+            elif name == b'error':
+                self.busy = False
+
+                # 'error' is followed by an optional errno and a message, but the real explanation is
+                # usually in the 'E' lines before it
+                messages.append( text.decode( 'utf-8', 'replace' ).strip( ) )
+
+                raise Exception( 'the pserver reported an error: ' +
+                                 ( '\n'.join( message for message in messages if message ) or 'no details' ) )
+            elif name == b'E':
+                messages.append( text.decode( 'utf-8', 'replace' ) )
+            elif name == b'M':
+                yield text + b'\n'
+            elif name == b'Mbinary':
+                remaining = int( self.input.readline( ) )
+
+                while remaining > 0:
+                    chunk = self.input.read( min( remaining, CHUNK_SIZE ) )
+
+                    if not chunk:
+                        raise ConnectionError( 'the pserver closed the connection' )
+
+                    remaining -= len( chunk )
+
+                    yield chunk
+
+            # everything else (MT, Valid-requests, ...) is diagnostics we don't need
+
+    def request( self, arguments, command ):
+        self.busy = True
+
+        self.send( ''.join( 'Argument ' + argument + '\n' for argument in arguments ) +
+                   'Directory .\n' + self.root[ 'path' ] + '\n' + command + '\n' )
+
+        yield from self.readResponses( )
+
+    def close( self ):
+        try:
+            self.input.close( )
+            self.socket.close( )
+        except OSError:
+            pass
+
+
+#//******************************************************************************
+#//
+#//  PServerPool
+#//
+#//  Up to 'size' pserver connections that are opened as they are needed,
+#//  authenticated once and then reused for every checkout and log of the run,
+#//  so concurrent retrievals each get their own connection without paying for
+#//  a new login every time.
+#//
+#//  A connection the server has dropped while it was idle is replaced and the
+#//  request retried once, as long as none of its output has been seen yet.
+#//
+#//******************************************************************************
+
+class PServerPool( object ):
+    def __init__( self, root, size ):
+        self.root = root
+        self.slots = threading.BoundedSemaphore( max( size, 1 ) )
+        self.lock = threading.Lock( )
+        self.idle = [ ]
+
+    def acquire( self ):
+        self.slots.acquire( )
+
+        with self.lock:
+            if self.idle:
+                return self.idle.pop( )
+
+        try:
+            with timePhase( 'pserver login', self.root[ 'host' ] ):
+                connection = PServerConnection( self.root )
+        except:
+            self.slots.release( )
+            raise
+
+        return connection
+
+    def release( self, connection ):
+        if connection is not None:
+            if connection.busy:
+                connection.close( )
+            else:
+                with self.lock:
+                    self.idle.append( connection )
+
+        self.slots.release( )
+
+    def request( self, arguments, command ):
+        for attempt in range( 2 ):
+            connection = self.acquire( )
+            started = False
+
+            try:
+                for data in connection.request( arguments, command ):
+                    started = True
+                    yield data
+
+                return
+            except OSError:
+                connection.busy = True
+
+                if started or attempt > 0:
+                    raise
+            finally:
+                self.release( connection )
+
+    def checkout( self, linuxPath, version ):
+        # text comes back a line at a time, which is a lot of tiny writes for a big file
+        return joinChunks( self.request( [ '-p', '-r', version, linuxPath ], 'co' ) )
+
+    def log( self, targets, options ):
+        # 'rlog' works on repository paths, so there is nothing to send about the sandbox, but
+        # its output has no 'Working file' lines, so they are put back to look like 'cvs log'
+        base = getRepositoryDirectory( '.', self.root[ 'path' ] )
+
+        paths = [ ]
+
+        for target in targets:
+            if os.path.isdir( target ):
+                paths.append( getRepositoryDirectory( target, self.root[ 'path' ] ) )
+            else:
+                paths.append( getRepositoryDirectory( os.path.dirname( target ), self.root[ 'path' ] ) + '/' +
+                              os.path.basename( target ) )
+
+        for data in self.request( options + paths, 'rlog' ):
+            line = data.decode( 'utf-8', 'replace' )
+
+            yield line
+
+            if line.startswith( 'RCS file: ' ):
+                linuxPath = line[ 10: ].strip( )
+
+                if linuxPath.startswith( self.root[ 'path' ] + '/' ):
+                    linuxPath = linuxPath[ len( self.root[ 'path' ] ) + 1: ]
+
+                if linuxPath.endswith( ',v' ):
+                    linuxPath = linuxPath[ : -2 ]
+
+                directory, name = posixpath.split( linuxPath )
+
+                if posixpath.basename( directory ) == 'Attic':
+                    linuxPath = posixpath.join( posixpath.dirname( directory ), name )
+
+                yield 'Working file: ' + posixpath.relpath( linuxPath, base ) + '\n'
+
+    def close( self ):
+        with self.lock:
+            for connection in self.idle:
+                connection.close( )
+
+            self.idle = [ ]
+
+
+#//******************************************************************************
+#//
+#//  runCVSLog
+#//
+#//  a generator of the output of 'cvs log' with the given options and targets,
+#//  which goes through the pserver connections if there are any
+#//
+#//******************************************************************************
+
+def runCVSLog( targets, options ):
+    with timePhase( 'cvs log', ' '.join( options + targets[ : 1 ] ) + ( ' ...' if len( targets ) > 1 else '' ) ):
+        if pserverPool is not None:
+            yield from pserverPool.log( targets, options )
+            return
+
+        process = subprocess.Popen( [ 'cvs', 'log' ] + options + targets, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True )
+
+        try:
+            yield from process.stdout
+        finally:
+            process.stdout.close( )
+            process.wait( )
+
+
+#//******************************************************************************
+#//
+#//  readCVSLog
+#//
+#//  runs 'cvs log' with the given options for a single file and returns the
+#//  parsed record, or None if cvs didn't tell us anything
+#//
+#//******************************************************************************
+
+def readCVSLog( targetFile, options ):
+    print( '\rParsing CVS log...\r', end='' )
+
+    record = None
+
+    for record in parseCVSLog( runCVSLog( [ targetFile ], options ) ):
+        pass
+
+    print( CLEAR_LINE, end='' )
+
+    return record
+
+
+#//******************************************************************************
+#//
+#//  getEntriesTime
+#//
+#//  returns the modification time of the CVS/Entries file that describes
+#//  targetFile, or 0 if there isn't one
+#//
+#//******************************************************************************
+
+def getEntriesTime( targetFile ):
+    try:
+        return os.path.getmtime( os.path.join( os.path.dirname( targetFile ), 'CVS', 'Entries' ) )
+    except OSError:
+        return 0
+
+
+#//******************************************************************************
+#//
+#//  getRevisionIndexFileName
+#//
+#//******************************************************************************
+
+def getRevisionIndexFileName( cacheDir, root, linuxPath ):
+    key = hashlib.sha1( ( root + '\0' + linuxPath ).encode( 'utf-8' ) ).hexdigest( )
+    return os.path.join( cacheDir, 'index', key + '.json' )
+
+
+#//******************************************************************************
+#//
+#//  loadRevisionIndex
+#//
+#//  returns the revision index stored on disk for linuxPath in the repository
+#//  at root, or None if there isn't a usable one
+#//
+#//******************************************************************************
+
+def loadRevisionIndex( cacheDir, root, linuxPath ):
+    try:
+        with open( getRevisionIndexFileName( cacheDir, root, linuxPath ) ) as inputFile:
+            index = json.load( inputFile )
+    except ( OSError, ValueError ):
+        return None
+
+    if index.get( 'format' ) != INDEX_FORMAT or index.get( 'root' ) != root or index.get( 'linuxPath' ) != linuxPath:
+        return None
+
+    return index
+
+
+#//******************************************************************************
+#//
+#//  saveRevisionIndex
+#//
+#//  The index is written to a temporary file first and then renamed, so a
+#//  concurrent rickDiff never sees a half-written index.
+#//
+#//******************************************************************************
+
+def saveRevisionIndex( cacheDir, index ):
+    indexFileName = getRevisionIndexFileName( cacheDir, index[ 'root' ], index[ 'linuxPath' ] )
+
+    try:
+        os.makedirs( os.path.dirname( indexFileName ), exist_ok=True )
+
+        with tempfile.NamedTemporaryFile( 'w', dir=os.path.dirname( indexFileName ), delete=False ) as outputFile:
+            json.dump( index, outputFile )
+
+        os.replace( outputFile.name, indexFileName )
+    except OSError as error:
+        print( PROGRAM_NAME + ": cannot save revision index: {0}".format( error ) )
+
+
+#//******************************************************************************
+#//
+#//  invalidateRevisionIndex
+#//
+#//******************************************************************************
+
+def invalidateRevisionIndex( cacheDir, root, linuxPath ):
+    revisionIndexes.pop( ( root, linuxPath ), None )
+
+    try:
+        os.remove( getRevisionIndexFileName( cacheDir, root, linuxPath ) )
+    except OSError:
+        pass
+
+
+#//******************************************************************************
+#//
+#//  buildRevisionIndex
+#//
+#//  builds a new revision index from a full 'cvs log'
+#//
+#//******************************************************************************
+
+def buildRevisionIndex( targetFile, linuxPath ):
+    record = readCVSLog( targetFile, [ ] )
+
+    if record is None:
+        return None
+
+    return indexFromLogRecord( record, getRepositoryRoot( os.path.dirname( targetFile ) ), linuxPath,
+                               getEntriesTime( targetFile ) )
+
+
+#//******************************************************************************
+#//
+#//  refreshRevisionIndex
+#//
+#//  brings an existing index up to date by asking cvs only for the revisions
+#//  committed since the newest one we already know about
+#//
+#//  That has to go by date rather than by revision ('-r1.7:' only covers the
+#//  branch 1.7 is on), so that commits on every branch are picked up.  Each
+#//  new revision goes in front of the newest one on its branch, where a full
+#//  'cvs log' would have put it; the first revision on a new branch has no
+#//  such place, so that needs a full 'cvs log' after all.
+#//
+#//******************************************************************************
+
+def refreshRevisionIndex( targetFile, index ):
+    lastDate = max( ( details.get( 'date', '' ) for details in index[ 'details' ].values( ) ), default='' )
+
+    if not index[ 'revisions' ] or not lastDate:
+        return buildRevisionIndex( targetFile, index[ 'linuxPath' ] ) or index
+
+    # CVS takes dates without a time zone as local time, and '>=' catches commits in the same second
+    record = readCVSLog( targetFile, [ '-d>=' + lastDate + ' +0000' ] )
+
+    if record is None:
+        return index
+
+    revisions = list( index[ 'revisions' ] )
+    known = set( revisions )
+
+    # oldest first, so each one ends up in front of the one before it
+    for version in reversed( [ version for version in record[ 'revisions' ] if version not in known ] ):
+        branch = version.rpartition( '.' )[ 0 ]
+        position = next( ( position for position, revision in enumerate( revisions )
+                           if revision.rpartition( '.' )[ 0 ] == branch ), None )
+
+        if position is None:
+            return buildRevisionIndex( targetFile, index[ 'linuxPath' ] ) or index
+
+        revisions.insert( position, version )
+
+    index[ 'revisions' ] = revisions
+    index[ 'head' ] = record[ 'head' ]
+    index[ 'symbols' ] = record[ 'symbols' ]
+    index[ 'details' ].update( record[ 'details' ] )
+
+    return index
+
+
+#//******************************************************************************
+#//
+#//  getRevisionIndex
+#//
+#//  returns the revision index for a file, keyed by its repository path
+#//
+#//  The index is kept in memory for the rest of the run and on disk under
+#//  cacheDir for later runs.  It is refreshed incrementally when the file's
+#//  CVS/Entries has changed since the index was saved (i.e., after an update or
+#//  a commit), when refresh is True, or when it is older than maxAge seconds.
+#//
+#//******************************************************************************
+
+def getRevisionIndex( targetFile, linuxPath, cacheDir, refresh=False, maxAge=None ):
+    entriesTime = getEntriesTime( targetFile )
+    root = getRepositoryRoot( os.path.dirname( targetFile ) )
+
+    index = revisionIndexes.get( ( root, linuxPath ) )
+
+    if index is None:
+        index = loadRevisionIndex( cacheDir, root, linuxPath )
+
+    if maxAge is not None and index is not None and time.time( ) - index[ 'checked' ] > maxAge:
+        refresh = True
+
+    if index is None:
+        index = buildRevisionIndex( targetFile, linuxPath )
+
+        if index is None:
+            raise Exception( "cvs log returned nothing for '" + targetFile + "', not under version control?" )
+    elif refresh or index[ 'entriesTime' ] != entriesTime:
+        index = refreshRevisionIndex( targetFile, index )
+    else:
+        revisionIndexes[ ( root, linuxPath ) ] = index
+        return index
+
+    index[ 'entriesTime' ] = entriesTime
+    index[ 'checked' ] = time.time( )
+
+    saveRevisionIndex( cacheDir, index )
+
+    revisionIndexes[ ( root, linuxPath ) ] = index
+
+    return index
+
+
+#//******************************************************************************
+#//
+#//  indexFromLogRecord
+#//
+#//******************************************************************************
+
+def indexFromLogRecord( record, root, linuxPath, entriesTime ):
+    return { 'format' : INDEX_FORMAT, 'root' : root, 'linuxPath' : linuxPath, 'head' : record[ 'head' ],
+             'symbols' : record[ 'symbols' ], 'revisions' : record[ 'revisions' ], 'details' : record[ 'details' ],
+             'entriesTime' : entriesTime, 'checked' : time.time( ) }
+
+
+#//******************************************************************************
+#//
+#//  runBulkLog
+#//
+#//  runs one 'cvs log' over all of targets (files or directories) and stores a
+#//  revision index for every file in the combined output
+#//
+#//  Returns the number of files indexed.
+#//
+#//******************************************************************************
+
+def runBulkLog( targets, options, linuxRoot, cacheDir ):
+    count = 0
+
+    for record in parseCVSLog( runCVSLog( targets, options ) ):
+        workingFile = record[ 'workingFile' ].replace( '\\', '/' )
+
+        if workingFile == '':
+            continue
+
+        linuxPath = linuxRoot + '/' + workingFile
+
+        root = getRepositoryRoot( os.path.dirname( workingFile ) )
+        index = indexFromLogRecord( record, root, linuxPath, getEntriesTime( workingFile ) )
+
+        saveRevisionIndex( cacheDir, index )
+        revisionIndexes[ ( root, linuxPath ) ] = index
+
+        count += 1
+
+    return count
+
+
+#//******************************************************************************
+#//
+#//  loadRevisionIndexes
+#//
+#//  makes sure there is an up-to-date revision index for every file in
+#//  fileList, running as few 'cvs log' processes as possible (normally one)
+#//  for the ones that aren't already indexed, or whose index is older than
+#//  INDEX_MAX_AGE
+#//
+#//  A directory whose files all need indexing is logged as a whole ('cvs log
+#//  -l directory') rather than file by file.  Files are passed on the command
+#//  line, so the list is split up if it gets longer than the command line can
+#//  hold.
+#//
+#//******************************************************************************
+
+def loadRevisionIndexes( fileList, linuxRoot, cacheDir ):
+    stale = { }
+
+    for fileName in fileList:
+        linuxPath = linuxRoot + '/' + fileName.replace( '\\', '/' )
+
+        root = getRepositoryRoot( os.path.dirname( fileName ) )
+        index = revisionIndexes.get( ( root, linuxPath ) ) or loadRevisionIndex( cacheDir, root, linuxPath )
+
+        if index is not None and index[ 'entriesTime' ] == getEntriesTime( fileName ) and \
+           time.time( ) - index[ 'checked' ] <= INDEX_MAX_AGE:
+            revisionIndexes[ ( root, linuxPath ) ] = index
+        else:
+            stale.setdefault( os.path.dirname( fileName ), [ ] ).append( fileName )
+
+    if not stale:
+        return
+
+    print( '\rParsing CVS log for ' + str( sum( len( fileNames ) for fileNames in stale.values( ) ) ) + ' files...\r',
+           end='' )
+
+    targets = [ ]
+
+    for directory, fileNames in sorted( stale.items( ) ):
+        entries = readEntries( directory or '.' )
+
+        if len( fileNames ) > 1 and entries is not None and len( set( fileNames ) ) == len( entries[ 0 ] ):
+            targets.append( directory or '.' )
+        else:
+            targets += fileNames
+
+    chunk = [ ]
+    length = 0
+
+    for target in targets:
+        if chunk and length + len( target ) + 1 > MAX_COMMAND_LENGTH:
+            runBulkLog( chunk, [ '-l' ], linuxRoot, cacheDir )
+            chunk = [ ]
+            length = 0
+
+        chunk.append( target )
+        length += len( target ) + 1
+
+    runBulkLog( chunk, [ '-l' ], linuxRoot, cacheDir )
+
+    print( CLEAR_LINE, end='' )
+
+
+#//******************************************************************************
+#//
+#//  incrementVersion
+#//
+#//  increment the version number forwards or backwards based on cvs log
+#//
+#//  targetFile - file whose version number we are incrementing
+#//  linuxPath - repository path of targetFile
+#//  version - version string
+#//  increment - integer value of how much to increment the version
+#//              (positive or negative)
+#//  cacheDir - where the revision index is kept
+#//
+#//  If the increment goes higher then the current version, then it will call
+#//  incrementVersionSimple.  This may or may not be a valid version number.
+#//
+#//  If the increment goes lower than 1.1, then it will return '1.1'
+#//
+#//******************************************************************************
+
+def incrementVersion( targetFile, linuxPath, version, increment, cacheDir=DEFAULT_CACHE_DIR ):
+    index = getRevisionIndex( targetFile, linuxPath, cacheDir )
+
+    # a version we've never heard of means somebody has committed since we last looked (the
+    # refresh rebuilds the index if there's a new branch, so it finds anything there is to find)
+    if version not in index[ 'revisions' ]:
+        index = getRevisionIndex( targetFile, linuxPath, cacheDir, refresh=True )
+
+    if version not in index[ 'revisions' ]:
+        raise Exception( "'" + version + "' is not in the revision history of '" + targetFile + "'\nAborting..." )
+
+    # remember versions in order from newest to oldest
+    versions = index[ 'revisions' ]
+
+    newIndex = versions.index( version ) - increment
+
+    if newIndex >= len( versions ):
+        return '1.1'
+    elif newIndex < 0:
+        return incrementVersionSimple( version, increment )
+    else:
+        return versions[ newIndex ]
+
+
+#//******************************************************************************
+#//
+#//  selectRevisionRange
+#//
+#//  returns the revisions from firstVersion to lastVersion (inclusive, and in
+#//  that order) out of versions, which is newest first like the revision index
+#//
+#//  CVS revisions are followed along their branches (see getRevisionLine), so
+#//  the range doesn't wander onto side branches, and a range between two
+#//  branches goes back from firstVersion to where they meet and then forward
+#//  to lastVersion (e.g. 1.2.2.2, 1.2.2.1, 1.2, 1.3 from 1.2.2.2 to 1.3).
+#//  Anything else (git commits) is taken as one line of history.
+#//
+#//******************************************************************************
+
+def selectRevisionRange( versions, firstVersion, lastVersion ):
+    for version in ( firstVersion, lastVersion ):
+        if version not in versions:
+            raise Exception( "'" + version + "' is not in the revision history" )
+
+    if isRevisionNumber( firstVersion ) and isRevisionNumber( lastVersion ):
+        firstLine, lastLine = [ getRevisionLine( versions, version.rpartition( '.' )[ 0 ] if version.count( '.' ) > 1
+                                                           else '' ) for version in ( firstVersion, lastVersion ) ]
+
+        firstLine = firstLine[ : firstLine.index( firstVersion ) + 1 ]
+        lastLine = lastLine[ : lastLine.index( lastVersion ) + 1 ]
+
+        # both lines start from 1.1, so they share everything up to the last revision they have in common
+        shared = 0
+
+        while shared < min( len( firstLine ), len( lastLine ) ) and firstLine[ shared ] == lastLine[ shared ]:
+            shared += 1
+
+        if shared == 0:
+            raise Exception( "'" + firstVersion + "' and '" + lastVersion + "' have no revision in common" )
+
+        return firstLine[ shared - 1 : ][ : : -1 ] + lastLine[ shared : ]
+
+    firstIndex, lastIndex = versions.index( firstVersion ), versions.index( lastVersion )
+
+    if firstIndex >= lastIndex:
+        return versions[ lastIndex : firstIndex + 1 ][ : : -1 ]
+    else:
+        return versions[ firstIndex : lastIndex + 1 ]
+
+
+#//******************************************************************************
+#//
+#//  parseVersionDate
+#//
+#//  turns the date in a version like '@2015-09-23' (or '@2015/09/23',
+#//  '@2015-09-23T12:00' or '@2015-09-23T12:00:30') into the 'yyyy-mm-dd
+#//  hh:mm:ss' form kept in the revision index; a date by itself means
+#//  midnight at the start of that day, just like 'cvs co -D'
+#//
+#//******************************************************************************
+
+def parseVersionDate( text ):
+    match = re.match( r'^(\d{4})[-/](\d{2})[-/](\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2}))?)?$', text )
+
+    if match is None:
+        raise Exception( "'" + text + "' is not a date (use yyyy-mm-dd or yyyy-mm-ddThh:mm[:ss])" )
+
+    year, month, day, hour, minute, second = match.groups( )
+
+    return '{0}-{1}-{2} {3}:{4}:{5}'.format( year, month, day, hour or '00', minute or '00', second or '00' )
+
+
+#//******************************************************************************
+#//
+#//  getRevisionKey
+#//
+#//  sorts revision numbers numerically (so 1.10 comes after 1.9)
+#//
+#//******************************************************************************
+
+def getRevisionKey( version ):
+    return tuple( int( token ) for token in version.split( '.' ) )
+
+
+#//******************************************************************************
+#//
+#//  getRevisionLine
+#//
+#//  returns the revisions that make up a branch, oldest first:  the trunk if
+#//  branch is '', otherwise the revisions on the branch (e.g. '1.2.4')
+#//  preceded by the line it branched from, up to the branch point ('1.2')
+#//
+#//******************************************************************************
+
+def getRevisionLine( versions, branch ):
+    if branch == '':
+        return sorted( ( version for version in versions if version.count( '.' ) == 1 ), key=getRevisionKey )
+
+    branchPoint = branch.rpartition( '.' )[ 0 ]
+    parent = branchPoint.rpartition( '.' )[ 0 ] if branchPoint.count( '.' ) > 1 else ''
+
+    line = [ version for version in getRevisionLine( versions, parent )
+             if getRevisionKey( version ) <= getRevisionKey( branchPoint ) ]
+
+    return line + sorted( ( version for version in versions if version.rpartition( '.' )[ 0 ] == branch ),
+                          key=getRevisionKey )
+
+
+#//******************************************************************************
+#//
+#//  getBranchNumber
+#//
+#//  returns the branch a version (a revision, tag, branch tag or branch number)
+#//  is on, e.g. '1.2.4' for the branch tag on '1.2.0.4' or for revision
+#//  '1.2.4.1', and '' for the trunk, or None if it isn't a version at all
+#//
+#//******************************************************************************
+
+def getBranchNumber( index, version ):
+    tokens = index[ 'symbols' ].get( version, version ).split( '.' )
+
+    if not all( token.isdigit( ) for token in tokens ) or len( tokens ) < 2:
+        return None
+
+    # a branch tag is attached to a 'magic' branch number, where 1.2.0.4 means branch 1.2.4
+    if len( tokens ) > 2 and tokens[ -2 ] == '0':
+        tokens = tokens[ : -2 ] + tokens[ -1: ]
+    elif len( tokens ) % 2 == 0:
+        tokens = tokens[ : -1 ] if len( tokens ) > 2 else [ ]
+
+    return '.'.join( tokens )
+
+
+#//******************************************************************************
+#//
+#//  lookupVersion
+#//
+#//  resolves a version argument to a revision number using nothing but the
+#//  revision index, so a mistyped tag is caught before anything is checked out
+#//  and the result can come from the revision cache:
+#//
+#//      a revision number ('1.4') - itself, if the file has that revision
+#//      a tag ('RELEASE_1') - the revision it is attached to
+#//      a branch tag or branch number ('RELEASE_1_BRANCH', '1.2.4') - the
+#//          newest revision on the branch, or the branch point if nothing has
+#//          been committed on it yet
+#//      '@date' or 'branch@date' - the newest revision on the trunk (or the
+#//          branch) no later than date, found by a binary search of the dates
+#//          from 'cvs log' (which are UTC)
+#//
+#//  Returns None if the version isn't known.
+#//
+#//******************************************************************************
+
+def lookupVersion( index, version ):
+    versions = index[ 'revisions' ]
+
+    name, separator, date = version.partition( '@' )
+
+    if separator:
+        date = parseVersionDate( date )
+        branch = ''
+
+        if name:
+            branch = getBranchNumber( index, name )
+
+            if branch is None:
+                return None
+
+        line = getRevisionLine( versions, branch )
+        dates = [ index[ 'details' ].get( revision, { } ).get( 'date', '' ) for revision in line ]
+
+        position = bisect.bisect_right( dates, date )
+
+        if position == 0:
+            raise Exception( "There is no revision {0}on or before {1}".format( 'of ' + name + ' ' if name else '',
+                                                                                  date ) )
+
+        return line[ position - 1 ]
+
+    branch = getBranchNumber( index, version )
+
+    if branch is None:
+        return None
+
+    version = index[ 'symbols' ].get( version, version )
+
+    if isRevisionNumber( version ):
+        return version if version in versions else None
+
+    onBranch = [ revision for revision in versions if revision.rpartition( '.' )[ 0 ] == branch ]
+
+    if onBranch:
+        return max( onBranch, key=getRevisionKey )
+
+    # only a branch tag says that an empty branch exists at all
+    branchPoint = branch.rpartition( '.' )[ 0 ]
+
+    return branchPoint if branchPoint in versions and name in index[ 'symbols' ] else None
+
+
+#//******************************************************************************
+#//
+#//  getHeadVersion
+#//
+#//  get the head version number from the revision index
+#//
+#//******************************************************************************
+
+def getHeadVersion( targetFile, linuxPath, cacheDir=DEFAULT_CACHE_DIR ):
+    index = getRevisionIndex( targetFile, linuxPath, cacheDir, maxAge=INDEX_MAX_AGE )
+
+    if index[ 'head' ] == '':
+        return 'ERROR'
+
+    return index[ 'head' ]
+
+
+#//******************************************************************************
+#//
+#//  isRevisionNumber
+#//
+#//  returns True if version is a real revision number (like '1.4' or
+#//  '1.3.2.1'), as opposed to a tag, a branch name or a branch number, since
+#//  only those are guaranteed to refer to the same contents forever
+#//
+#//******************************************************************************
+
+def isRevisionNumber( version ):
+    tokens = version.split( '.' )
+
+    if len( tokens ) < 2 or len( tokens ) % 2 != 0:
+        return False
+
+    return all( token.isdigit( ) and token != '0' for token in tokens )
+
+
+#//******************************************************************************
+#//
+#//  getCacheKey
+#//
+#//******************************************************************************
+
+def getCacheKey( *fields ):
+    return hashlib.sha1( '\0'.join( fields ).encode( 'utf-8' ) ).hexdigest( )
+
+
+#//******************************************************************************
+#//
+#//  hashFile
+#//
+#//******************************************************************************
+
+def hashFile( fileName ):
+    digest = hashlib.sha1( )
+
+    with open( fileName, 'rb' ) as inputFile:
+        for chunk in readChunks( inputFile ):
+            digest.update( chunk )
+
+    return digest.hexdigest( )
+
+
+#//******************************************************************************
+#//
+#//  readChunks
+#//
+#//  yields the contents of a binary file object a chunk at a time
+#//
+#//******************************************************************************
+
+def readChunks( inputFile ):
+    return iter( lambda: inputFile.read( CHUNK_SIZE ), b'' )
+
+
+#//******************************************************************************
+#//
+#//  joinChunks
+#//
+#//  gathers a generator's small chunks of bytes (like the lines of a pserver
+#//  checkout) into chunks of at least CHUNK_SIZE bytes, closing the generator
+#//  when it is closed itself
+#//
+#//******************************************************************************
+
+def joinChunks( chunks ):
+    buffer = [ ]
+    size = 0
+
+    with contextlib.closing( chunks ):
+        for chunk in chunks:
+            buffer.append( chunk )
+            size += len( chunk )
+
+            if size >= CHUNK_SIZE:
+                yield b''.join( buffer )
+
+                buffer = [ ]
+                size = 0
+
+    if buffer:
+        yield b''.join( buffer )
+
+
+#//******************************************************************************
+#//
+#//  normalizeLineEndings
+#//
+#//  does the same job as running dos2unix followed by unix2dos, in a single
+#//  streaming pass over chunks of bytes:  every line ends up ending in CR/LF.
+#//
+#//  Like dos2unix, files that look binary (a NUL in the first chunk) are left
+#//  alone.  A CR at the end of a chunk is held back in case the next chunk
+#//  starts with its LF.
+#//
+#//******************************************************************************
+
+def normalizeLineEndings( chunks ):
+    pending = b''
+    binary = None
+
+    for chunk in chunks:
+        if binary is None:
+            binary = b'\0' in chunk
+
+        if binary:
+            yield chunk
+            continue
+
+        chunk = pending + chunk
+
+        if chunk.endswith( b'\r' ):
+            pending = b'\r'
+            chunk = chunk[ : -1 ]
+        else:
+            pending = b''
+
+        yield chunk.replace( b'\r\n', b'\n' ).replace( b'\n', b'\r\n' )
+
+    if pending:
+        yield pending
+
+
+#//******************************************************************************
+#//
+#//  writeChunks
+#//
+#//  writes chunks of bytes to fileName, normalizing the line endings on the
+#//  way if normalize is True, and returns the number of bytes written
+#//
+#//******************************************************************************
+
+def writeChunks( chunks, fileName, normalize ):
+    if normalize:
+        chunks = normalizeLineEndings( chunks )
+
+    size = 0
+
+    with open( fileName, 'wb' ) as outputFile:
+        for chunk in chunks:
+            outputFile.write( chunk )
+            size += len( chunk )
+
+    return size
+
+
+#//******************************************************************************
+#//
+#//  getMemoryBlob
+#//
+#//  The daemon (see runDaemon) also keeps recently used cache blobs in memory,
+#//  up to MEMORY_CACHE_SIZE bytes, so it doesn't even have to read and verify
+#//  them again.  Returns the contents for contentHash, or None.
+#//
+#//******************************************************************************
+
+def getMemoryBlob( contentHash ):
+    if memoryBlobs is None:
+        return None
+
+    with memoryLock:
+        data = memoryBlobs.get( contentHash )
+
+        if data is not None:
+            memoryBlobs.move_to_end( contentHash )
+
+        return data
+
+
+#//******************************************************************************
+#//
+#//  rememberBlob
+#//
+#//  adds a verified blob to the memory cache (if there is one), dropping the
+#//  least recently used blobs to make room
+#//
+#//******************************************************************************
+
+def rememberBlob( contentHash, blobFileName ):
+    global memoryBlobsSize
+
+    if memoryBlobs is None or os.path.getsize( blobFileName ) > MEMORY_CACHE_SIZE // 4:
+        return
+
+    with open( blobFileName, 'rb' ) as inputFile:
+        data = inputFile.read( )
+
+    with memoryLock:
+        if contentHash in memoryBlobs:
+            return
+
+        memoryBlobs[ contentHash ] = data
+        memoryBlobsSize += len( data )
+
+        while memoryBlobsSize > MEMORY_CACHE_SIZE:
+            oldHash, oldData = memoryBlobs.popitem( last=False )
+            memoryBlobsSize -= len( oldData )
+
+
+#//******************************************************************************
+#//
+#//  fetchFromCache
+#//
+#//  The cache is content-addressed:  file contents live in 'blobs', named by
+#//  their SHA-1 hash, and each cache (e.g. 'revisions') has its own directory
+#//  of key files that hold the hash of the contents for that key.  The blob's
+#//  hash is verified before it is used, and its modification time is bumped so
+#//  that eviction is least-recently-used.
+#//
+#//  Returns True and copies the cached contents to fileName (normalizing the
+#//  line endings if normalize is True) if key is in the named cache, otherwise
+#//  returns False.
+#//
+#//******************************************************************************
+
+def fetchFromCache( cacheDir, cacheName, key, fileName, normalize=False ):
+    keyFileName = os.path.join( cacheDir, cacheName, key )
+
+    try:
+        with open( keyFileName ) as keyFile:
+            contentHash = keyFile.read( ).strip( )
+
+        data = getMemoryBlob( contentHash )
+
+        if data is not None:
+            writeChunks( [ data ], fileName, normalize )
+            return True
+
+        blobFileName = os.path.join( cacheDir, 'blobs', contentHash )
+
+        if hashFile( blobFileName ) != contentHash:
+            os.remove( blobFileName )
+            return False
+
+        os.utime( blobFileName )
+
+        with open( blobFileName, 'rb' ) as inputFile:
+            writeChunks( readChunks( inputFile ), fileName, normalize )
+
+        rememberBlob( contentHash, blobFileName )
+    except OSError:
+        return False
+
+    return True
+
+
+#//******************************************************************************
+#//
+#//  openCacheBlob
+#//
+#//  returns a temporary file in the blob store to write new contents into
+#//  before they are added to a cache with commitCacheBlob
+#//
+#//******************************************************************************
+
+def openCacheBlob( cacheDir ):
+    blobDir = os.path.join( cacheDir, 'blobs' )
+
+    os.makedirs( blobDir, exist_ok=True )
+
+    return tempfile.NamedTemporaryFile( dir=blobDir, delete=False )
+
+
+#//******************************************************************************
+#//
+#//  commitCacheBlob
+#//
+#//  adds a closed blob from openCacheBlob whose contents hash to contentHash
+#//  to the named cache under key, and then evicts the least-recently-used
+#//  blobs until the cache fits in maxBytes
+#//
+#//******************************************************************************
+
+def commitCacheBlob( cacheDir, cacheName, key, blobFileName, contentHash, maxBytes ):
+    try:
+        finalFileName = os.path.join( cacheDir, 'blobs', contentHash )
+        added = 0
+
+        if os.path.isfile( finalFileName ):
+            os.remove( blobFileName )
+            os.utime( finalFileName )
+        else:
+            os.replace( blobFileName, finalFileName )
+            added = os.path.getsize( finalFileName )
+
+        os.makedirs( os.path.join( cacheDir, cacheName ), exist_ok=True )
+
+        with tempfile.NamedTemporaryFile( 'w', dir=os.path.join( cacheDir, cacheName ), delete=False ) as keyFile:
+            keyFile.write( contentHash )
+
+        os.replace( keyFile.name, os.path.join( cacheDir, cacheName, key ) )
+    except OSError as error:
+        print( PROGRAM_NAME + ": cannot add to the {0} cache: {1}".format( cacheName, error ) )
+        return
+
+    evictFromCache( cacheDir, maxBytes, added )
+
+
+#//******************************************************************************
+#//
+#//  storeInCache
+#//
+#//  adds the contents of fileName to the named cache under key
+#//
+#//******************************************************************************
+
+def storeInCache( cacheDir, cacheName, key, fileName, maxBytes ):
+    digest = hashlib.sha1( )
+
+    try:
+        with openCacheBlob( cacheDir ) as blobFile, open( fileName, 'rb' ) as inputFile:
+            for chunk in readChunks( inputFile ):
+                blobFile.write( chunk )
+                digest.update( chunk )
+    except OSError as error:
+        print( PROGRAM_NAME + ": cannot cache '" + fileName + "': {0}".format( error ) )
+        return
+
+    commitCacheBlob( cacheDir, cacheName, key, blobFile.name, digest.hexdigest( ), maxBytes )
+
+
+#//******************************************************************************
+#//
+#//  evictFromCache
+#//
+#//  deletes the least-recently-used blobs once the total size of the cache is
+#//  more than maxBytes, until it is no more than CACHE_EVICT_TARGET of that
+#//
+#//  Key files whose blobs have been evicted are left alone; they simply become
+#//  cache misses.
+#//
+#//  The blob directory is only scanned the first time in a run, or when the
+#//  running total (cacheSizes, plus the added bytes of each new blob) goes
+#//  over maxBytes, so adding a blob doesn't cost a stat of every other one.
+#//  Other processes sharing the cache aren't counted until the next scan.
+#//
+#//******************************************************************************
+
+def evictFromCache( cacheDir, maxBytes, added=0 ):
+    with cacheSizeLock:
+        if cacheDir in cacheSizes:
+            cacheSizes[ cacheDir ] += added
+
+            if cacheSizes[ cacheDir ] <= maxBytes:
+                return
+
+    blobDir = os.path.join( cacheDir, 'blobs' )
+
+    blobs = [ ]
+    totalSize = 0
+
+    for entry in os.scandir( blobDir ):
+        try:
+            stat = entry.stat( )
+        except OSError:
+            continue
+
+        blobs.append( ( stat.st_mtime, stat.st_size, entry.path ) )
+        totalSize += stat.st_size
+
+    if totalSize > maxBytes:
+        blobs.sort( )
+
+        for mtime, size, blobFileName in blobs:
+            try:
+                os.remove( blobFileName )
+            except OSError:
+                continue
+
+            totalSize -= size
+
+            if totalSize <= maxBytes * CACHE_EVICT_TARGET:
+                break
+
+    with cacheSizeLock:
+        cacheSizes[ cacheDir ] = totalSize
+
+
+#//******************************************************************************
+#//
+#//  readEntries
+#//
+#//  reads CVS/Entries (and CVS/Entries.Log, which CVS appends to before it
+#//  gets around to rewriting Entries) for a directory, and returns a tuple of:
+#//
+#//      files - dictionary of file name to ( version, timestamp )
+#//      directories - list of subdirectories under version control
+#//
+#//  Each directory is only read once per run (or again if Entries changes).
+#//  Returns None if the directory isn't a CVS sandbox.
+#//
+#//******************************************************************************
+
+def readEntries( directory ):
+    entriesFileName = os.path.join( directory, 'CVS', 'Entries' )
+
+    try:
+        entriesTime = os.path.getmtime( entriesFileName )
+    except OSError:
+        return None
+
+    key = os.path.abspath( directory )
+
+    with entriesLock:
+        cached = entriesIndexes.get( key )
+
+    if cached is not None and cached[ 0 ] == entriesTime:
+        return cached[ 1 ]
+
+    files = { }
+    directories = [ ]
+
+    def addLine( line, remove=False ):
+        fields = line.rstrip( '\r\n' ).split( '/' )
+
+        if len( fields ) < 3:
+            return
+
+        if fields[ 0 ] == 'D':
+            if remove:
+                if fields[ 1 ] in directories:
+                    directories.remove( fields[ 1 ] )
+            else:
+                directories.append( fields[ 1 ] )
+        elif remove:
+            files.pop( fields[ 1 ], None )
+        else:
+            files[ fields[ 1 ] ] = ( fields[ 2 ], fields[ 3 ] if len( fields ) > 3 else '' )
+
+    for line in codecs.open( entriesFileName, 'r', 'ascii', 'replace' ):
+        addLine( line )
+
+    try:
+        for line in codecs.open( entriesFileName + '.Log', 'r', 'ascii', 'replace' ):
+            if line.startswith( 'A ' ):
+                addLine( line[ 2: ] )
+            elif line.startswith( 'R ' ):
+                addLine( line[ 2: ], remove=True )
+    except OSError:
+        pass
+
+    with entriesLock:
+        entriesIndexes[ key ] = ( entriesTime, ( files, directories ) )
+
+    return files, directories
+
+
+#//******************************************************************************
+#//
+#//  parseVersionFromEntries
+#//
+#//  parses the current version of the file from the CVS/Entries file
+#//
+#//******************************************************************************
+
+def parseVersionFromEntries( targetFile ):
+    pathList = targetFile.split( os.sep )
+
+    fileName = pathList.pop( )
+
+    entries = readEntries( os.sep.join( pathList ) or '.' )
+
+    if entries is not None and fileName in entries[ 0 ]:
+        return entries[ 0 ][ fileName ][ 0 ]
+
+    raise Exception( "'" + targetFile + "' not found in CVS/Entries, not under version control?" )
+
+
+#//******************************************************************************
+#//
+#//  getFileStatus
+#//
+#//  works out the status of a file from its CVS/Entries line, the way 'cvs
+#//  update' would, but without asking the server:
+#//
+#//      'M' - modified (the timestamp in CVS/Entries doesn't match the file)
+#//      'A' - added but not committed
+#//      'R' - removed but not committed
+#//      'C' - has merge conflicts
+#//      '!' - missing from the sandbox
+#//      ''  - unchanged
+#//
+#//******************************************************************************
+
+def getFileStatus( fileName, version, timestamp ):
+    if version == '0':
+        return 'A'
+
+    if version.startswith( '-' ):
+        return 'R'
+
+    try:
+        mtime = os.path.getmtime( fileName )
+    except OSError:
+        return '!'
+
+    if '+' in timestamp:
+        return 'C'
+
+    if time.asctime( time.gmtime( mtime ) ) == timestamp:
+        return ''
+
+    return 'M'
+
+
+#//******************************************************************************
+#//
+#//  scanDirectory
+#//
+#//  returns the status of every changed file in one directory, as a list of
+#//  ( status, fileName ), and the subdirectories to scan next
+#//
+#//******************************************************************************
+
+def scanDirectory( directory ):
+    entries = readEntries( directory )
+
+    if entries is None:
+        return [ ], [ ]
+
+    files, directories = entries
+
+    changes = [ ]
+
+    for name, ( version, timestamp ) in files.items( ):
+        fileName = os.path.normpath( os.path.join( directory, name ) )
+
+        status = getFileStatus( fileName, version, timestamp )
+
+        if status != '':
+            changes.append( ( status, fileName ) )
+
+    return changes, [ os.path.join( directory, name ) for name in directories ]
+
+
+#//******************************************************************************
+#//
+#//  listEntries
+#//
+#//  returns ( fileName, version, timestamp ) for every file in CVS/Entries under
+#//  directory
+#//
+#//******************************************************************************
+
+def listEntries( directory ):
+    entries = readEntries( directory )
+
+    if entries is None:
+        return [ ]
+
+    files, directories = entries
+
+    result = [ ( os.path.normpath( os.path.join( directory, name ) ), version, timestamp )
+               for name, ( version, timestamp ) in sorted( files.items( ) ) ]
+
+    for name in directories:
+        result.extend( listEntries( os.path.join( directory, name ) ) )
+
+    return result
+
+
+#//******************************************************************************
+#//
+#//  scanSandbox
+#//
+#//  finds locally modified, added and removed files under each of directories
+#//  using only CVS/Entries and the files' modification times, so the server is
+#//  never contacted
+#//
+#//  Directories are scanned in parallel (jobs at a time), each one being
+#//  handed to the pool as soon as its parent has been read.
+#//
+#//  Returns a sorted list of ( status, fileName ) and the number of
+#//  directories scanned.
+#//
+#//******************************************************************************
+
+def scanSandbox( directories, jobs ):
+    changes = [ ]
+    scanned = 0
+
+    with timePhase( 'scan sandbox' ), concurrent.futures.ThreadPoolExecutor( max_workers=max( 1, jobs ) ) as executor:
+        pending = { executor.submit( scanDirectory, directory ) for directory in directories }
+
+        while pending:
+            done, pending = concurrent.futures.wait( pending, return_when=concurrent.futures.FIRST_COMPLETED )
+
+            for future in done:
+                directoryChanges, subdirectories = future.result( )
+
+                changes.extend( directoryChanges )
+                scanned += 1
+
+                pending.update( executor.submit( scanDirectory, subdirectory ) for subdirectory in subdirectories )
+
+    changes.sort( key=lambda change: change[ 1 ] )
+
+    return changes, scanned
+
+
+#//******************************************************************************
+#//
+#//  showSandboxStatus
+#//
+#//******************************************************************************
+
+def showSandboxStatus( directories, jobs, backend=None ):
+    startTime = time.time( )
+
+    if backend is None:
+        changes, scanned = scanSandbox( directories, jobs )
+    else:
+        changes, scanned = backend.getLocalChanges( directories, jobs )
+
+    for status, fileName in changes:
+        print( status + ' ' + fileName )
+
+    print( )
+    print( '{0} changed files in {1} directories ({2:.0f} ms)'.format( len( changes ), scanned,
+                                                                       ( time.time( ) - startTime ) * 1000 ) )
+
+
+#//******************************************************************************
+#//
+#//  CVSBackend
+#//
+#//  Everything rickDiff needs from version control goes through a backend, so
+#//  the rest of rickDiff doesn't care whether the sandbox is CVS or git.  A
+#//  backend provides:
+#//
+#//      getRepositoryPath( fileName ) - the file's path in the repository
+#//      getCurrentVersion( targetFile, linuxPath ) - 'CURRENT'
+#//      getHeadVersion( targetFile, linuxPath ) - 'HEAD'
+#//      incrementVersion( targetFile, linuxPath, version, increment ) - '-n'
+#//          and '+n', following incrementVersion's rules
+#//      resolveVersion( targetFile, linuxPath, version ) - any other version
+#//          name (a tag, branch, date, etc.) as a version checkout understands,
+#//          raising an exception if there's no such version
+#//      getRevisionRange( targetFile, linuxPath, firstVersion, lastVersion ) -
+#//          every revision from firstVersion to lastVersion, in that order
+#//      getRevisionDetails( targetFile, linuxPath, version ) - a dictionary
+#//          with the 'author' and 'date' of a revision (empty if unknown)
+#//      loadHistory( fileList ) - get ready to resolve versions for many files
+#//      invalidate( fileList ) - forget whatever history is cached
+#//      isCacheable( version ) - whether version always means the same contents
+#//      checkout( linuxPath, version, fileName, normalize, cacheKey, cacheSize )
+#//          - write the contents to fileName, returning None if not found
+#//      describeCheckout( linuxPath, version, fileName ) - the shell equivalent
+#//      getLocalChanges( directories, jobs ) - like scanSandbox
+#//      getVersionDifferences( directory, version, jobs ) - the files under
+#//          directory that differ from version, as listed by treeCompare
+#//      close( )
+#//
+#//  The CVS backend is the original rickDiff:  the revision index for history,
+#//  CVS/Entries for CURRENT and 'cvs co -p' for contents.  With pserver True,
+#//  rickDiff talks to the pserver itself over a pool of up to 'jobs'
+#//  connections instead of running cvs for every checkout and log.
+#//
+#//******************************************************************************
+
+class CVSBackend( object ):
+    name = 'cvs'
+
+    def __init__( self, cacheDir, pserver=False, jobs=DEFAULT_JOBS ):
+        global pserverPool
+
+        self.cacheDir = cacheDir
+
+        try:
+            with open( os.path.join( 'CVS', 'Repository' ) ) as inputFile:
+                self.linuxRoot = inputFile.read( ).strip( )
+        except OSError:
+            raise Exception( 'cannot find CVS/Repository (not in the sandbox?)' )
+
+        if pserver:
+            pserverPool = PServerPool( readCVSRoot( ), jobs )
+
+    def getRepositoryPath( self, fileName ):
+        return self.linuxRoot + '/' + fileName.replace( '\\', '/' )
+
+    def getCurrentVersion( self, targetFile, linuxPath ):
+        return parseVersionFromEntries( targetFile )
+
+    def getHeadVersion( self, targetFile, linuxPath ):
+        return getHeadVersion( targetFile, linuxPath, self.cacheDir )
+
+    def incrementVersion( self, targetFile, linuxPath, version, increment ):
+        return incrementVersion( targetFile, linuxPath, version, increment, self.cacheDir )
+
+    def resolveVersion( self, targetFile, linuxPath, version ):
+        startTime = time.time( )
+
+        index = getRevisionIndex( targetFile, linuxPath, self.cacheDir, maxAge=INDEX_MAX_AGE )
+        revision = lookupVersion( index, version )
+
+        # it may have been committed or tagged since we last looked (unless we just did), and as the
+        # refresh picks up every symbolic name, anything it doesn't find is simply unknown
+        if revision is None and index[ 'checked' ] < startTime:
+            index = getRevisionIndex( targetFile, linuxPath, self.cacheDir, refresh=True )
+            revision = lookupVersion( index, version )
+
+        if revision is None:
+            raise Exception( "'" + version + "' is not a revision, tag or branch of '" + targetFile + "'\nAborting..." )
+
+        return revision
+
+    def getRevisionRange( self, targetFile, linuxPath, firstVersion, lastVersion ):
+        return selectRevisionRange( getRevisionIndex( targetFile, linuxPath, self.cacheDir )[ 'revisions' ],
+                                    self.resolveVersion( targetFile, linuxPath, firstVersion ),
+                                    self.resolveVersion( targetFile, linuxPath, lastVersion ) )
+
+    def getRevisionDetails( self, targetFile, linuxPath, version ):
+        return getRevisionIndex( targetFile, linuxPath, self.cacheDir )[ 'details' ].get( version, { } )
+
+    def loadHistory( self, fileList ):
+        loadRevisionIndexes( fileList, self.linuxRoot, self.cacheDir )
+
+    def invalidate( self, fileList ):
+        for fileName in fileList:
+            invalidateRevisionIndex( self.cacheDir, getRepositoryRoot( os.path.dirname( fileName ) ),
+                                     self.getRepositoryPath( fileName ) )
+
+    def isCacheable( self, version ):
+        return isRevisionNumber( version )
+
+    def checkout( self, linuxPath, version, fileName, normalize, cacheKey, cacheSize ):
+        return checkoutFile( linuxPath, version, fileName, normalize, cacheKey, self.cacheDir, cacheSize ) or None
+
+    def describeCheckout( self, linuxPath, version, fileName ):
+        return 'cvs co -p -r ' + version + ' ' + linuxPath + ' > ' + fileName + ERR_DEV_NULL
+
+    def getLocalChanges( self, directories, jobs ):
+        return scanSandbox( directories, jobs )
+
+    def getVersionDifferences( self, directory, version, jobs ):
+        # the revision index says which revision each file has in version, so only files that
+        # are at a different revision or have been modified locally can differ
+        entries = listEntries( directory )
+
+        self.loadHistory( [ fileName for fileName, current, timestamp in entries ] )
+
+        changes = [ ]
+
+        for fileName, current, timestamp in entries:
+            index = revisionIndexes.get( ( getRepositoryRoot( os.path.dirname( fileName ) ),
+                                           self.getRepositoryPath( fileName ) ) )
+            status = getFileStatus( fileName, current, timestamp )
+
+            if index is None:
+                target = None
+            elif version == 'HEAD':
+                target = index[ 'head' ]
+            elif version == 'CURRENT':
+                target = current
+            else:
+                target = lookupVersion( index, version )
+
+            if target is None:
+                if status != 'R':
+                    changes.append( ( '>', fileName ) )
+            elif status in ( 'R', '!' ):
+                changes.append( ( '<', fileName ) )
+            elif target != current or status != '':
+                changes.append( ( 'M', fileName ) )
+
+        return changes
+
+    def close( self ):
+        global pserverPool
+
+        if pserverPool is not None:
+            pserverPool.close( )
+            pserverPool = None
+
+
+#//******************************************************************************
+#//
+#//  GitBackend
+#//
+#//  Versions are abbreviated commit ids.  'CURRENT' is the checked out commit
+#//  and 'HEAD' is the newest commit that changed the file, which have the same
+#//  contents; '-n' and '+n' step through the commits that changed the file,
+#//  which come from a single 'git rev-list' walk per file (or one 'git log' for
+#//  a whole batch).  Anything else is handed to git as a revision, so branch
+#//  names, tags and commit ids all work.
+#//
+#//  Contents are streamed through a single 'git cat-file --batch' process
+#//  that stays open for the whole run, rather than one process per file.  Git
+#//  already has everything locally, so the revision cache isn't used.
+#//
+#//******************************************************************************
+
+class GitBackend( object ):
+    name = 'git'
+
+    def __init__( self, cacheDir ):
+        self.cacheDir = cacheDir
+        self.histories = { }
+        self.details = { }
+        self.resolved = { }
+        self.lock = threading.Lock( )
+        self.catFile = None
+
+        try:
+            output = self.runGit( [ 'rev-parse', '--show-toplevel', '--show-prefix', '--short=' + str( GIT_ABBREV ),
+                                    'HEAD' ], check=True )
+        except ( OSError, subprocess.CalledProcessError ):
+            raise Exception( 'not in a git working tree' )
+
+        self.topLevel, self.prefix, self.headCommit = output.split( '\n' )[ : 3 ]
+
+    def runGit( self, arguments, check=False ):
+        with timePhase( 'git ' + arguments[ 0 ] ):
+            return subprocess.run( [ 'git' ] + arguments, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   universal_newlines=True, check=check ).stdout
+
+    def getRepositoryPath( self, fileName ):
+        return posixpath.normpath( self.prefix + fileName.replace( '\\', '/' ) )
+
+    def getHistory( self, linuxPath ):
+        with self.lock:
+            history = self.histories.get( linuxPath )
+
+        if history is None:
+            output = self.runGit( [ 'log', '--format=%h%x00%an%x00%ad', '--date=iso', '--abbrev=' + str( GIT_ABBREV ),
+                                    'HEAD', '--', ':(top)' + linuxPath ] )
+
+            history = [ ]
+
+            for line in output.splitlines( ):
+                commit, author, date = ( line.split( '\0' ) + [ '', '' ] )[ : 3 ]
+                history.append( commit )
+
+                with self.lock:
+                    self.details[ commit ] = { 'author' : author, 'date' : date[ : 19 ] }
+
+            with self.lock:
+                self.histories[ linuxPath ] = history
+
+        if not history:
+            raise Exception( "'" + linuxPath + "' has no history in git, not under version control?" )
+
+        return history
+
+    def getCurrentVersion( self, targetFile, linuxPath ):
+        return self.headCommit
+
+    def getHeadVersion( self, targetFile, linuxPath ):
+        return self.getHistory( linuxPath )[ 0 ]
+
+    def incrementVersion( self, targetFile, linuxPath, version, increment ):
+        history = self.getHistory( linuxPath )
+
+        # the checked out commit has the same contents as the newest one that changed the file
+        if version == self.headCommit and version not in history:
+            version = history[ 0 ]
+
+        if version not in history:
+            raise Exception( "'" + version + "' is not in the history of '" + linuxPath + "'" )
+
+        newIndex = min( max( history.index( version ) - increment, 0 ), len( history ) - 1 )
+
+        return history[ newIndex ]
+
+    def resolveVersion( self, targetFile, linuxPath, version ):
+        with self.lock:
+            if version in self.resolved:
+                return self.resolved[ version ]
+
+        name, separator, date = version.partition( '@' )
+
+        # git has everything locally, so it can just be asked
+        if separator:
+            output = self.runGit( [ 'rev-list', '-1', '--abbrev-commit', '--abbrev=' + str( GIT_ABBREV ),
+                                    '--before=' + parseVersionDate( date ) + ' +0000', name or 'HEAD', '--',
+                                    ':(top)' + linuxPath ] )
+        else:
+            output = self.runGit( [ 'rev-parse', '--verify', '--quiet', '--short=' + str( GIT_ABBREV ),
+                                    version + '^{commit}' ] )
+
+        if not output.strip( ):
+            raise Exception( "'" + version + "' is not a commit, tag or branch of '" + targetFile + "'\nAborting..." )
+
+        return output.strip( )
+
+    def getRevisionRange( self, targetFile, linuxPath, firstVersion, lastVersion ):
+        history = self.getHistory( linuxPath )
+
+        for version in ( firstVersion, lastVersion ):
+            if version not in history and version != self.headCommit:
+                raise Exception( "'" + version + "' is not in the history of '" + linuxPath + "'" )
+
+        revisions = selectRevisionRange( history, firstVersion if firstVersion in history else history[ 0 ],
+                                         lastVersion if lastVersion in history else history[ 0 ] )
+
+        # every revision in the range gets resolved, so check them all with one 'git cat-file' rather
+        # than a 'git rev-parse' each
+        with timePhase( 'git cat-file', str( len( revisions ) ) + ' commits' ):
+            output = subprocess.run( [ 'git', 'cat-file', '--batch-check=%(objecttype)' ],
+                                     input=''.join( revision + '\n' for revision in revisions ), stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, universal_newlines=True, cwd=self.topLevel ).stdout
+
+        # there's a line for each one, either its type or '<name> missing'
+        with self.lock:
+            for revision, line in zip( revisions, output.splitlines( ) ):
+                if line == 'commit':
+                    self.resolved[ revision ] = revision
+
+        return revisions
+
+    def getRevisionDetails( self, targetFile, linuxPath, version ):
+        self.getHistory( linuxPath )
+
+        with self.lock:
+            return self.details.get( version, { } )
+
+    def loadHistory( self, fileList ):
+        linuxPaths = [ self.getRepositoryPath( fileName ) for fileName in fileList ]
+        histories = dict( ( linuxPath, [ ] ) for linuxPath in linuxPaths )
+
+        with timePhase( 'git log', str( len( linuxPaths ) ) + ' files' ):
+            process = subprocess.Popen( [ 'git', 'log', '--format=%x00%h%x00%an%x00%ad', '--date=iso',
+                                          '--abbrev=' + str( GIT_ABBREV ),
+                                          '--name-only', 'HEAD', '--' ] + [ ':(top)' + linuxPath for linuxPath in linuxPaths ],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True )
+
+            commit = ''
+            details = { }
+
+            for line in process.stdout:
+                line = line.rstrip( '\n' )
+
+                if line.startswith( '\0' ):
+                    commit, author, date = ( line[ 1: ].split( '\0' ) + [ '', '' ] )[ : 3 ]
+                    details[ commit ] = { 'author' : author, 'date' : date[ : 19 ] }
+                elif line in histories:
+                    histories[ line ].append( commit )
+
+            process.wait( )
+
+        with self.lock:
+            self.histories.update( histories )
+            self.details.update( details )
+
+    def invalidate( self, fileList ):
+        with self.lock:
+            for fileName in fileList:
+                self.histories.pop( self.getRepositoryPath( fileName ), None )
+
+    def isCacheable( self, version ):
+        return False
+
+    def checkout( self, linuxPath, version, fileName, normalize, cacheKey, cacheSize ):
+        with self.lock:
+            if self.catFile is None:
+                self.catFile = subprocess.Popen( [ 'git', 'cat-file', '--batch' ], stdin=subprocess.PIPE,
+                                                 stdout=subprocess.PIPE, cwd=self.topLevel )
+
+            self.catFile.stdin.write( ( version + ':' + linuxPath + '\n' ).encode( 'utf-8' ) )
+            self.catFile.stdin.flush( )
+
+            # the reply is '<object> <type> <size>' and the contents, or '<name> missing' (or ambiguous),
+            # where the name is what we asked for and so may have spaces in it
+            header = self.catFile.stdout.readline( ).decode( 'utf-8', 'replace' ).rstrip( '\n' ).split( ' ' )
+
+            if header[ -1 ] in ( 'missing', 'ambiguous' ) or len( header ) != 3:
+                return None
+
+            remaining = int( header[ 2 ] )
+
+            def readBlob( ):
+                nonlocal remaining
+
+                while remaining > 0:
+                    chunk = self.catFile.stdout.read( min( remaining, CHUNK_SIZE ) )
+
+                    if not chunk:
+                        raise Exception( "'git cat-file' ended unexpectedly" )
+
+                    remaining -= len( chunk )
+
+                    yield chunk
+
+            try:
+                if header[ 1 ] != 'blob':
+                    for chunk in readBlob( ):
+                        pass
+
+                    return None
+
+                writeChunks( readBlob( ), fileName, normalize )
+            finally:
+                # keep the pipe in step even if something went wrong
+                for chunk in readBlob( ):
+                    pass
+
+                self.catFile.stdout.read( 1 )
+
+            return int( header[ 2 ] )
+
+    def describeCheckout( self, linuxPath, version, fileName ):
+        return 'git cat-file blob ' + version + ':' + linuxPath + ' > ' + fileName
+
+    def getLocalChanges( self, directories, jobs ):
+        output = self.runGit( [ 'status', '--porcelain', '--' ] + directories )
+
+        changes = [ ]
+
+        for line in output.splitlines( ):
+            code, path = line[ : 2 ], line[ 3: ].split( ' -> ' )[ -1 ]
+
+            if code == '??':
+                continue
+            elif 'U' in code or code in ( 'AA', 'DD' ):
+                status = 'C'
+            elif code[ 0 ] == 'A':
+                status = 'A'
+            elif code[ 0 ] == 'D':
+                status = 'R'
+            elif code[ 1 ] == 'D':
+                status = '!'
+            else:
+                status = 'M'
+
+            changes.append( ( status, os.path.relpath( os.path.join( self.topLevel, path ) ) ) )
+
+        changes.sort( key=lambda change: change[ 1 ] )
+
+        return changes, len( set( os.path.dirname( fileName ) for status, fileName in changes ) )
+
+    def getVersionDifferences( self, directory, version, jobs ):
+        output = self.runGit( [ 'diff', '--name-status', '--no-renames', version, '--', directory ] )
+
+        changes = [ ]
+
+        for line in output.splitlines( ):
+            code, _, path = line.partition( '\t' )
+
+            # 'A' is added since version, i.e., only in the sandbox
+            status = { 'A' : '>', 'D' : '<' }.get( code[ : 1 ], 'M' )
+
+            changes.append( ( status, os.path.relpath( os.path.join( self.topLevel, path ) ) ) )
+
+        return sorted( changes, key=lambda change: change[ 1 ] )
+
+    def close( self ):
+        if self.catFile is not None:
+            self.catFile.stdin.close( )
+            self.catFile.wait( )
+            self.catFile = None
+
+
+#//******************************************************************************
+#//
+#//  openBackend
+#//
+#//  returns the backend for vcs ('cvs', 'git' or 'auto', which picks CVS if
+#//  there is a CVS/Repository and git otherwise)
+#//
+#//******************************************************************************
+
+def openBackend( vcs, cacheDir, pserver=False, jobs=DEFAULT_JOBS ):
+    if vcs == 'auto':
+        vcs = 'cvs' if os.path.isfile( os.path.join( 'CVS', 'Repository' ) ) else 'git'
+
+    if vcs == 'git':
+        return GitBackend( cacheDir )
+    else:
+        return CVSBackend( cacheDir, pserver, jobs )
+
+
+#//******************************************************************************
+#//
+#//  buildDevFileName
+#//
+#//******************************************************************************
+
+def buildDevFileName( devRoot, sourceFileName, dirName ):
+    source = os.path.abspath( sourceFileName )
+
+    sourceList = os.path.relpath( source, devRoot ).split( os.sep )
+    sourceList.pop( 0 )
+
+    sourceList.insert( 0, dirName )
+
+    devRootList = devRoot.split( os.sep )
+    devRootList.reverse( )
+
+    for i in devRootList:
+        sourceList.insert( 0, i )
+
+    return os.sep.join( sourceList )
+
+
+#//******************************************************************************
+#//
+#//  describeCommand
+#//
+#//  returns the shell equivalent of a retrieval command, for --test
+#//
+#//******************************************************************************
+
+def describeCommand( command, fileName, backend ):
+    if command[ 0 ] == 'checkout':
+        return backend.describeCheckout( command[ 1 ], command[ 2 ], fileName )
+    else:
+        return 'copy ' + command[ 1 ] + ' ' + fileName + TO_DEV_NULL
+
+
+#//******************************************************************************
+#//
+#//  createFileCommand
+#//
+#//  This function interprets the version argument in one of several ways.
+#//
+#//  First, if it's 'HEAD', rickDiff will check out the trunk version.
+#//
+#//  If it's 'CURRENT', rickDiff will check out whatever version is checked out
+#//  in the source directory according to CVS/Entries.  'CURRENT' can also have
+#//  '+n' or '-n' appended to it and rickDiff will instead get n versions before
+#//  or after the version 'CURRENT' refers to, if it exists.
+#//
+#//  If the argument is of the form '+n' then rickDiff will get n versions newer
+#//  than the version of the previous argument.  '-n' is not supported as a
+#//  stand-alone argument because argParser tries to interpret it as a
+#//  non-existent option, and it's not really useful anyway.
+#//
+#//  Next, if the argument corresponds to a directory name under devRoot, then
+#//  rickDiff will use the corresponding file in that directory tree.
+#//
+#//  And finally, if nothing else matches, the argument is a version number,
+#//  branch name, tag name or date ('@yyyy-mm-dd'), which the backend resolves
+#//  (see lookupVersion) and validates before anything is checked out.
+#//
+#//  All of the version control work is done by backend (CVS if it isn't given).
+#//
+#//  On errors, the fileName returned will be empty.
+#//
+#//  The command returned is None if there is nothing to retrieve, otherwise
+#//  it is either ( 'checkout', linuxPath, version ) or ( 'copy', source ).
+#//
+#//  The cache key returned is None unless the command checks out a real
+#//  revision number, which can be satisfied from the revision cache.
+#//
+#//******************************************************************************
+
+def createFileCommand( devRoot, sourceFileName, versionArg, linuxPath, devDirs, localFlag, oldVersion='',
+                       backend=None ):
+    if backend is None:
+        backend = CVSBackend( DEFAULT_CACHE_DIR )
+
+    command = None
+    fileName = ''
+    version = ''
+    cacheKey = None
+
+    tempDir = os.environ[ 'TEMP' ]
+
+    base, ext = os.path.splitext( os.path.basename( sourceFileName ) )
+
+    if versionArg == '':
+        if localFlag:
+            fileName = os.path.join( os.getcwd( ), sourceFileName )
+        else:
+            command = ( 'copy', sourceFileName )
+            fileName = os.path.join( tempDir, base + ext )
+    elif versionArg == 'HEAD':
+        version = backend.getHeadVersion( sourceFileName, linuxPath )
+        fileName = os.path.join( tempDir, base + '.' + version + ext )
+        command = ( 'checkout', linuxPath, version )
+    elif versionArg.startswith( 'CURRENT' ):
+        increment = parseIncrement( versionArg[ 7: ] )
+
+        version = backend.getCurrentVersion( sourceFileName, linuxPath )
+
+        if increment != 0:
+            version = backend.incrementVersion( sourceFileName, linuxPath, version, increment )
+
+        fileName = os.path.join( tempDir, base + '.' + version + ext )
+        command = ( 'checkout', linuxPath, version )
+    elif versionArg[ 0 ] == '+':
+        version = backend.incrementVersion( sourceFileName, linuxPath, oldVersion, int( versionArg[ 1: ] ) )
+
+        fileName = os.path.join( tempDir, base + '.' + version + ext )
+        command = ( 'checkout', linuxPath, version )
+    elif versionArg in devDirs:
+        source = buildDevFileName( devRoot, sourceFileName, versionArg )
+
+        if not os.path.isfile( source ):
+            raise Exception( "File '" + source + "' does not appear to exist.\nAborting..." )
+
+        version = versionArg
+
+        if localFlag:
+            fileName = buildDevFileName( devRoot, sourceFileName, version )
+        else:
+            fileName = os.path.join( tempDir, base + '.' + version + ext )
+            command = ( 'copy', source )
+    else:
+        version = backend.resolveVersion( sourceFileName, linuxPath, versionArg )
+        fileName = os.path.join( tempDir, base + '.' + version + ext )
+        command = ( 'checkout', linuxPath, version )
+
+    if command is not None and command[ 0 ] == 'checkout' and backend.isCacheable( version ):
+        cacheKey = getCacheKey( getRepositoryRoot( os.path.dirname( sourceFileName ) ), linuxPath, version )
+
+    return command, fileName, version, cacheKey
+
+
+#//******************************************************************************
+#//
+#//  showStatus
+#//
+#//  Several files can be retrieved at once, so rather than each one writing
+#//  its own progress message over the others, they all share a single status
+#//  line, e.g.:
+#//
+#//      first: retrieving   second: formatting   third: done
+#//
+#//  A status of None removes that file from the line.
+#//
+#//******************************************************************************
+
+def showStatus( ordinal, status ):
+    global statusWidth
+
+    with statusLock:
+        if status is None:
+            statusLine.pop( ordinal, None )
+        else:
+            statusLine[ ordinal ] = status
+
+        text = '   '.join( key + ': ' + value for key, value in statusLine.items( ) )
+
+        print( '\r' + text.ljust( statusWidth ) + '\r', end='', flush=True )
+
+        statusWidth = len( text )
+
+
+#//******************************************************************************
+#//
+#//  clearStatus
+#//
+#//******************************************************************************
+
+def clearStatus( ):
+    global statusWidth
+
+    with statusLock:
+        statusLine.clear( )
+
+        print( '\r' + ' ' * statusWidth + '\r', end='' )
+
+        statusWidth = 0
+
+
+#//******************************************************************************
+#//
+#//  checkoutFile
+#//
+#//  runs 'cvs co -p' (or asks the pserver directly) and streams its output
+#//  straight into fileName (and into the revision cache if cacheKey is given),
+#//  normalizing the line endings on the way if normalize is True
+#//
+#//  cvs is run in directory with environment, if they are given.  Nothing is
+#//  cached unless cvs succeeds, so a checkout that fails partway through can't
+#//  leave a truncated revision in the cache.
+#//
+#//  Returns the number of bytes written to fileName.
+#//
+#//******************************************************************************
+
+def checkoutFile( linuxPath, version, fileName, normalize, cacheKey, cacheDir, cacheSize, directory=None,
+                  environment=None ):
+    if pserverPool is not None:
+        process = None
+        source = pserverPool.checkout( linuxPath, version )
+    else:
+        process = subprocess.Popen( [ 'cvs', 'co', '-p', '-r', version, linuxPath ], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, cwd=directory, env=environment )
+        source = readChunks( process.stdout )
+
+    blobFile = openCacheBlob( cacheDir ) if cacheKey is not None else None
+    digest = hashlib.sha1( )
+
+    def teeChunks( ):
+        for chunk in source:
+            if blobFile is not None:
+                blobFile.write( chunk )
+                digest.update( chunk )
+
+            yield chunk
+
+    try:
+        size = writeChunks( teeChunks( ), fileName, normalize )
+    except BaseException:
+        # don't leave a partial blob behind
+        if blobFile is not None:
+            blobFile.close( )
+            os.remove( blobFile.name )
+            blobFile = None
+
+        raise
+    finally:
+        if process is not None:
+            process.stdout.close( )
+            process.wait( )
+        else:
+            source.close( )
+
+        if blobFile is not None:
+            blobFile.close( )
+
+    failed = process is not None and process.returncode != 0
+
+    if blobFile is not None:
+        if size > 0 and not failed:
+            commitCacheBlob( cacheDir, 'revisions', cacheKey, blobFile.name, digest.hexdigest( ), cacheSize << 20 )
+        else:
+            os.remove( blobFile.name )
+
+    if failed and size > 0:
+        raise Exception( "'cvs co -p -r " + version + ' ' + linuxPath + "' failed (exit status " +
+                         str( process.returncode ) + ")\nAborting..." )
+
+    return size
+
+
+#//******************************************************************************
+#//
+#//  Prefetcher
+#//
+#//  checks out revisions into the revision cache in the background (see
+#//  prefetchRevisions), at most 'jobs' at a time so it doesn't hog the server
+#//
+#//  A fetch that is already under way when the same revision is wanted for
+#//  real is waited for (wait) rather than started again, finish waits for all
+#//  of them, and cancel drops the fetches that haven't started yet.  Errors are ignored, since a prefetch is
+#//  only a guess.
+#//
+#//  Each fetch runs 'cvs' in the directory and environment it was asked for
+#//  in, because the daemon may have moved on to another request by then.
+#//
+#//******************************************************************************
+
+class Prefetcher( object ):
+    def __init__( self, jobs ):
+        self.executor = concurrent.futures.ThreadPoolExecutor( max_workers=jobs )
+        self.lock = threading.Lock( )
+        self.pending = { }
+
+    def submit( self, linuxPath, version, cacheKey, cacheDir, cacheSize ):
+        with self.lock:
+            if cacheKey in self.pending or os.path.isfile( os.path.join( cacheDir, 'revisions', cacheKey ) ):
+                return
+
+            self.pending[ cacheKey ] = self.executor.submit( self.fetch, linuxPath, version, cacheKey, cacheDir, cacheSize,
+                                                             os.getcwd( ), dict( os.environ ) )
+
+    def fetch( self, linuxPath, version, cacheKey, cacheDir, cacheSize, directory, environment ):
+        try:
+            with timePhase( 'prefetch', linuxPath + ' ' + version ):
+                checkoutFile( linuxPath, version, os.devnull, False, cacheKey, cacheDir, cacheSize, directory, environment )
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                self.pending.pop( cacheKey, None )
+
+    def wait( self, cacheKey ):
+        with self.lock:
+            future = self.pending.get( cacheKey )
+
+        if future is not None:
+            concurrent.futures.wait( [ future ] )
+
+    def isBusy( self ):
+        with self.lock:
+            return bool( self.pending )
+
+    def finish( self ):
+        with self.lock:
+            futures = list( self.pending.values( ) )
+
+        concurrent.futures.wait( futures )
+
+    def cancel( self ):
+        with self.lock:
+            for cacheKey, future in list( self.pending.items( ) ):
+                if future.cancel( ):
+                    del self.pending[ cacheKey ]
+
+    def close( self ):
+        self.executor.shutdown( wait=True )
+
+
+#//******************************************************************************
+#//
+#//  prefetchRevisions
+#//
+#//  With --prefetch, once a comparison is up, the revisions the next one is
+#//  most likely to want (CURRENT-1, CURRENT-2 and HEAD) are fetched into the
+#//  revision cache in the background, so it can start without waiting for the
+#//  server.  Only cacheable revisions are prefetched (so nothing is for git,
+#//  which has everything locally anyway).
+#//
+#//  The prefetch carries on in the daemon after the command is done (until the
+#//  next command cancels what's left of it); otherwise rickDiff finishes it
+#//  before exiting.
+#//
+#//******************************************************************************
+
+def prefetchRevisions( sourceFileName, linuxPath, args ):
+    global prefetcher
+
+    backend = args.backend
+
+    try:
+        current = backend.getCurrentVersion( sourceFileName, linuxPath )
+
+        versions = [ backend.incrementVersion( sourceFileName, linuxPath, current, -1 ),
+                     backend.incrementVersion( sourceFileName, linuxPath, current, -2 ),
+                     backend.getHeadVersion( sourceFileName, linuxPath ) ]
+    except Exception:
+        return
+
+    if prefetcher is None:
+        prefetcher = Prefetcher( max( 1, min( args.jobs, PREFETCH_JOBS ) ) )
+
+    root = getRepositoryRoot( os.path.dirname( sourceFileName ) )
+
+    for version in versions:
+        if version != current and backend.isCacheable( version ):
+            prefetcher.submit( linuxPath, version, getCacheKey( root, linuxPath, version ), args.cache_dir,
+                               args.cache_size )
+
+
+#//******************************************************************************
+#//
+#//  getFormatterVersion
+#//
+#//  returns the version string reported by a formatter ('astyle' or
+#//  'uncrustify'), which is only asked once per run, or '' if it can't be run
+#//
+#//******************************************************************************
+
+def getFormatterVersion( formatter ):
+    with formatterLock:
+        if formatter not in formatterVersions:
+            try:
+                with timePhase( formatter + ' --version' ):
+                    output = subprocess.run( [ formatter, '--version' ], stdout=subprocess.PIPE,
+                                             stderr=subprocess.STDOUT, universal_newlines=True ).stdout
+            except OSError:
+                output = ''
+
+            formatterVersions[ formatter ] = output.strip( )
+
+        return formatterVersions[ formatter ]
+
+
+#//******************************************************************************
+#//
+#//  getFormatterConfigFileName
+#//
+#//  returns the options file the formatter will pick up on its own, or '' if
+#//  there isn't one
+#//
+#//******************************************************************************
+
+def getFormatterConfigFileName( formatter ):
+    home = os.path.expanduser( '~' )
+
+    if formatter == 'astyle':
+        candidates = [ os.environ.get( 'ARTISTIC_STYLE_OPTIONS', '' ), os.path.join( home, '.astylerc' ),
+                       os.path.join( home, 'astylerc' ) ]
+    else:
+        candidates = [ os.environ.get( 'UNCRUSTIFY_CONFIG', '' ), os.path.join( home, '.uncrustify.cfg' ) ]
+
+    for candidate in candidates:
+        if candidate != '' and os.path.isfile( candidate ):
+            return candidate
+
+    return ''
+
+
+#//******************************************************************************
+#//
+#//  formatFile
+#//
+#//  runs astyle or uncrustify on fileName, unless the same contents have been
+#//  formatted before by the same version of the formatter with the same
+#//  options file, in which case the result comes from the formatter cache
+#//
+#//******************************************************************************
+
+def formatFile( fileName, formatter, cacheDir, cacheSize ):
+    formatterVersion = getFormatterVersion( formatter )
+
+    if formatterVersion == '':
+        raise Exception( "cannot run '" + formatter + "'" )
+
+    configFileName = getFormatterConfigFileName( formatter )
+
+    cacheKey = getCacheKey( hashFile( fileName ), formatter, formatterVersion,
+                            hashFile( configFileName ) if configFileName else '' )
+
+    if fetchFromCache( cacheDir, 'formatted', cacheKey, fileName ):
+        return
+
+    with timePhase( formatter, fileName ):
+        subprocess.call( [ formatter, fileName ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL )
+
+    if formatter == 'uncrustify':
+        if not os.path.isfile( fileName + '.uncrustify' ):
+            return
+
+        os.replace( fileName + '.uncrustify', fileName )
+
+    storeInCache( cacheDir, 'formatted', cacheKey, fileName, cacheSize << 20 )
+
+
+#//******************************************************************************
+#//
+#//  retrieveFile
+#//
+#//  Checkouts are satisfied from the revision cache if cacheKey is given, and
+#//  added to it otherwise.
+#//
+#//  Unless astyle, uncrustify or skip_dos2unix is set, line endings are
+#//  normalized as the file is written rather than by running dos2unix and
+#//  unix2dos afterwards.  Formatter output is cached too (see formatFile).
+#//
+#//******************************************************************************
+
+def retrieveFile( command, ordinal, version, fileName, sourceFileName, astyle, uncrustify, skip_dos2unix,
+                  cacheKey=None, cacheDir=DEFAULT_CACHE_DIR, cacheSize=DEFAULT_CACHE_SIZE, backend=None ):
+    if backend is None:
+        backend = CVSBackend( cacheDir )
+
+    showStatus( ordinal, 'retrieving' )
+
+    normalize = not ( astyle or uncrustify or skip_dos2unix )
+
+    if command[ 0 ] == 'copy':
+        with timePhase( 'copy', command[ 1 ] ), open( command[ 1 ], 'rb' ) as inputFile:
+            writeChunks( readChunks( inputFile ), fileName, normalize )
+    else:
+        # a background prefetch of the same revision is already on its way into the cache
+        if prefetcher is not None and cacheKey is not None:
+            with timePhase( 'prefetch wait', command[ 1 ] + ' ' + command[ 2 ] ):
+                prefetcher.wait( cacheKey )
+
+        with timePhase( 'revision cache', command[ 1 ] + ' ' + command[ 2 ] ):
+            cached = cacheKey is not None and fetchFromCache( cacheDir, 'revisions', cacheKey, fileName, normalize )
+
+        if not cached:
+            with timePhase( 'checkout', command[ 1 ] + ' ' + command[ 2 ] ):
+                size = backend.checkout( command[ 1 ], command[ 2 ], fileName, normalize, cacheKey, cacheSize )
+
+            if size is None:
+                showStatus( ordinal, None )
+                raise Exception( "Version '" + version + "' not found for file '" + sourceFileName + "'\nAborting..." )
+
+    if astyle or uncrustify:
+        showStatus( ordinal, 'formatting' )
+
+    if astyle:
+        formatFile( fileName, 'astyle', cacheDir, cacheSize )
+    elif uncrustify:
+        formatFile( fileName, 'uncrustify', cacheDir, cacheSize )
+
+    showStatus( ordinal, 'done' )
+
+
+#//******************************************************************************
+#//
+#//  printFileVersion
+#//
+#//******************************************************************************
+
+def printFileVersion( ordinal, version ):
+    print( ordinal + " file version:  ", end='' )
+
+    if version == '':
+        print( 'local file (in $TEMP)' )
+    else:
+        print( version )
+
+
+#//******************************************************************************
+#//
+#//  resolveArgument
+#//
+#//  works out which version and file name a version argument refers to, without
+#//  retrieving anything
+#//
+#//  Returns a tuple of ( ordinal, command, version, fileName, cacheKey ), or
+#//  None on errors.
+#//
+#//******************************************************************************
+
+def resolveArgument( devRoot, ordinal, sourceFileName, linuxPath, devDirs, versionArg, args, oldVersion='' ):
+    try:
+        command, fileName, version, cacheKey = \
+               createFileCommand( devRoot, sourceFileName, versionArg, linuxPath, devDirs, not args.non_local, oldVersion,
+                                  args.backend )
+    except Exception as error:
+        print( PROGRAM_NAME + ": {0}".format( error ) )
+        return None
+
+    return ordinal, command, version, fileName, cacheKey
+
+
+#//******************************************************************************
+#//
+#//  retrieveFiles
+#//
+#//  retrieves the files for several resolved arguments at the same time, using
+#//  at most args.jobs threads, and then reports their versions in order
+#//  (unless showVersions is False)
+#//
+#//  Arguments that resolve to the same file are only retrieved once.
+#//
+#//  Returns False if anything failed.
+#//
+#//******************************************************************************
+
+def retrieveFiles( sourceFileName, resolved, args, showVersions=True ):
+    pending = [ item for item in resolved if item[ 1 ] is not None ]
+
+    if args.test:
+        for ordinal, command, version, fileName, cacheKey in pending:
+            print( describeCommand( command, fileName, args.backend ) )
+
+        return True
+
+    futures = { }
+
+    with concurrent.futures.ThreadPoolExecutor( max_workers=max( 1, args.jobs ) ) as executor:
+        for ordinal, command, version, fileName, cacheKey in pending:
+            if fileName not in futures:
+                futures[ fileName ] = executor.submit( retrieveFile, command, ordinal, version, fileName, sourceFileName,
+                                                       args.astyle, args.uncrustify, args.skip_dos2unix, cacheKey,
+                                                       args.cache_dir, args.cache_size, args.backend )
+
+    clearStatus( )
+
+    for ordinal, command, version, fileName, cacheKey in pending:
+        error = futures[ fileName ].exception( )
+
+        if error is not None:
+            print( PROGRAM_NAME + ": {0}".format( error ) )
+            return False
+
+    if showVersions:
+        for ordinal, command, version, fileName, cacheKey in pending:
+            printFileVersion( ordinal, version )
+
+    return True
+
+
+#//******************************************************************************
+#//
+#//  filesIdentical
+#//
+#//  a quick check for whether two files have exactly the same contents:  the
+#//  sizes are compared first, and then the contents (memory-mapped, so even
+#//  huge files aren't read into memory) a chunk at a time, stopping at the
+#//  first difference
+#//
+#//  If normalize is True, the files only have to be the same once their line
+#//  endings have been normalized (see normalizeLineEndings), since that's what
+#//  retrieveFile does to a checkout but not to the local file, which in a
+#//  POSIX sandbox has LF line endings.
+#//
+#//******************************************************************************
+
+def filesIdentical( fileName1, fileName2, normalize=False ):
+    try:
+        if os.path.getsize( fileName1 ) == os.path.getsize( fileName2 ):
+            with mapFiles( fileName1, fileName2 ) as ( file1, file2 ):
+                if findCommonPrefix( file1, file2 ) == len( file1 ):
+                    return True
+
+        if not normalize:
+            return False
+
+        with open( fileName1, 'rb' ) as file1, open( fileName2, 'rb' ) as file2:
+            return chunksEqual( normalizeLineEndings( readChunks( file1 ) ),
+                                normalizeLineEndings( readChunks( file2 ) ) )
+    except OSError:
+        return False
+
+
+#//******************************************************************************
+#//
+#//  chunksEqual
+#//
+#//  returns True if two streams of chunks of bytes add up to the same thing,
+#//  however they happen to be split up
+#//
+#//******************************************************************************
+
+def chunksEqual( chunks1, chunks2 ):
+    chunks1, chunks2 = iter( chunks1 ), iter( chunks2 )
+    buffer1 = buffer2 = b''
+
+    while True:
+        while not buffer1:
+            buffer1 = next( chunks1, None )
+
+            if buffer1 is None:
+                break
+
+        while not buffer2:
+            buffer2 = next( chunks2, None )
+
+            if buffer2 is None:
+                break
+
+        if buffer1 is None or buffer2 is None:
+            return buffer1 is None and buffer2 is None
+
+        length = min( len( buffer1 ), len( buffer2 ) )
+
+        if buffer1[ : length ] != buffer2[ : length ]:
+            return False
+
+        buffer1, buffer2 = buffer1[ length: ], buffer2[ length: ]
+
+
+#//******************************************************************************
+#//
+#//  retrieveBatchFiles
+#//
+#//  retrieves everything one file in a batch comparison needs, and returns the
+#//  time at which it was ready, whether the two files are identical and how
+#//  long it took to find that out
+#//
+#//******************************************************************************
+
+def retrieveBatchFiles( sourceFileName, resolved, args ):
+    for ordinal, command, version, fileName, cacheKey in resolved:
+        if command is not None:
+            retrieveFile( command, sourceFileName, version, fileName, sourceFileName, args.astyle,
+                          args.uncrustify, args.skip_dos2unix, cacheKey, args.cache_dir, args.cache_size, args.backend )
+
+    showStatus( sourceFileName, None )
+
+    startTime = time.time( )
+
+    with timePhase( 'identical check', sourceFileName ):
+        identical = not args.show_identical and \
+                    filesIdentical( resolved[ 0 ][ 3 ], resolved[ 1 ][ 3 ], not args.skip_dos2unix )
+
+    return time.time( ), identical, time.time( ) - startTime
+
+
+#//******************************************************************************
+#//
+#//  getViewerCommands
+#//
+#//  returns the command lines (as lists, for subprocess) that show each of
+#//  comparisons, a list of tuples of file names, in viewer (e.g. 'meld', or a
+#//  command with options of its own)
+#//
+#//  A viewer that can take several comparisons at once (see VIEWER_TAB_OPTIONS)
+#//  gets them all in one command line, one tab each; any other viewer gets a
+#//  command line per comparison.
+#//
+#//******************************************************************************
+
+def getViewerCommands( viewer, comparisons ):
+    program = shlex.split( viewer, posix=( os.name != 'nt' ) )
+    tabOption = VIEWER_TAB_OPTIONS.get( os.path.splitext( os.path.basename( program[ 0 ] ) )[ 0 ].lower( ) )
+
+    if tabOption is None or len( comparisons ) == 1:
+        return [ program + list( fileNames ) for fileNames in comparisons ]
+
+    return [ program + [ argument for fileNames in comparisons for argument in [ tabOption ] + list( fileNames ) ] ]
+
+
+#//******************************************************************************
+#//
+#//  launchViewer
+#//
+#//  starts args.viewer on comparisons (see getViewerCommands), waiting for it
+#//  to be closed if wait is True, or just prints the commands with --test
+#//
+#//  The viewer is run directly rather than through the shell, with its output
+#//  thrown away.
+#//
+#//  Comparisons involving a file bigger than --large_file are summarized on
+#//  stdout instead (see summarizeLargeDiff), since a viewer would have to
+#//  read the whole thing into memory and diff it line by line.
+#//
+#//******************************************************************************
+
+def launchViewer( comparisons, args, wait=False ):
+    large = [ fileNames for fileNames in comparisons if any( isLargeFile( fileName, args ) for fileName in fileNames ) ]
+
+    for fileNames in large:
+        for left in range( len( fileNames ) - 1 ):
+            showLargeDiff( fileNames[ left ], fileNames[ left + 1 ], fileNames[ left ], fileNames[ left + 1 ], args )
+
+    comparisons = [ fileNames for fileNames in comparisons if fileNames not in large ]
+
+    if not comparisons:
+        return
+
+    for command in getViewerCommands( args.viewer, comparisons ):
+        if args.test:
+            print( ' '.join( command ) )
+            continue
+
+        try:
+            with timePhase( 'viewer', str( len( comparisons ) ) + ' comparisons' ):
+                process = subprocess.Popen( command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL )
+        except OSError as error:
+            print( PROGRAM_NAME + ": cannot run '" + command[ 0 ] + "': {0}".format( error ) )
+            return
+
+        viewerProcesses[ : ] = [ viewer for viewer in viewerProcesses if viewer.poll( ) is None ] + [ process ]
+
+        if wait:
+            process.wait( )
+
+
+#//******************************************************************************
+#//
+#//  launchInTabs
+#//
+#//  shows comparisons args.tabs at a time, waiting for each viewer to be closed
+#//  before starting the next one
+#//
+#//******************************************************************************
+
+def launchInTabs( comparisons, args ):
+    tabs = max( 1, args.tabs )
+
+    for start in range( 0, len( comparisons ), tabs ):
+        launchViewer( comparisons[ start : start + tabs ], args, wait=( start + tabs < len( comparisons ) ) )
+
+
+#//******************************************************************************
+#//
+#//  batchCompare
+#//
+#//  compares args.batch_version (normally CURRENT) of each file in fileList with
+#//  the local file, or firstVersion with secondVersion if they are given (and
+#//  either can be one of devDirs)
+#//
+#//  If that version needs the files' history, it is loaded for the whole batch
+#//  up front (e.g. with a single 'cvs log').
+#//
+#//  All the files are retrieved and formatted in the background (at most
+#//  args.jobs at a time) and handed to the viewer in order, args.tabs at a time
+#//  as tabs in one window, so the first comparisons don't wait for the whole
+#//  batch.  Files that are identical to the version they are compared with are
+#//  skipped.
+#//
+#//******************************************************************************
+
+def batchCompare( fileList, devRoot, args, output=None, devDirs=[ ], firstVersion=None, secondVersion='' ):
+    if firstVersion is None:
+        firstVersion = args.batch_version
+
+    if any( version not in devDirs + [ '', 'CURRENT' ] for version in ( firstVersion, secondVersion ) ):
+        args.backend.loadHistory( fileList )
+
+    batch = [ ]
+
+    for fileName in fileList:
+        # parse the arguments
+        linuxPath = args.backend.getRepositoryPath( fileName )
+
+        sourceFileName = os.path.normpath( fileName )
+
+        first = resolveArgument( devRoot, 'first', sourceFileName, linuxPath, devDirs, firstVersion, args )
+        second = resolveArgument( devRoot, 'second', sourceFileName, linuxPath, devDirs, secondVersion, args )
+
+        if first is not None and second is not None:
+            batch.append( ( sourceFileName, [ first, second ] ) )
+
+    reviewBatch( batch, args, output )
+
+
+#//******************************************************************************
+#//
+#//  reviewBatch
+#//
+#//  does the work for batchCompare (and changesetCompare) once every file's
+#//  pair of versions has been resolved
+#//
+#//  batch is a list of ( sourceFileName, [ first, second ] ), where first and
+#//  second are from resolveArgument.
+#//
+#//******************************************************************************
+
+def reviewBatch( batch, args, output=None ):
+    if args.test:
+        for sourceFileName, resolved in batch:
+            retrieveFiles( sourceFileName, resolved, args )
+
+        launchInTabs( [ ( resolved[ 0 ][ 3 ], resolved[ 1 ][ 3 ] ) for sourceFileName, resolved in batch ], args )
+        return
+
+    startTime = time.time( )
+    readyTime = startTime
+    retrieved = 0
+    skipped = [ ]
+    prefilterTime = 0.0
+    comparisons = [ ]
+
+    with concurrent.futures.ThreadPoolExecutor( max_workers=max( 1, args.jobs ) ) as executor:
+        futures = [ executor.submit( retrieveBatchFiles, sourceFileName, resolved, args )
+                    for sourceFileName, resolved in batch ]
+
+        for ( sourceFileName, resolved ), future in zip( batch, futures ):
+            try:
+                fileReadyTime, identical, filePrefilterTime = future.result( )
+            except Exception as error:
+                clearStatus( )
+                print( PROGRAM_NAME + ": {0}".format( error ) )
+                continue
+
+            readyTime = max( readyTime, fileReadyTime )
+            prefilterTime += filePrefilterTime
+            retrieved += 1
+
+            clearStatus( )
+
+            if identical:
+                print( sourceFileName + ':  identical to ' + resolved[ 0 ][ 2 ] + ', skipped' )
+                skipped.append( sourceFileName )
+                continue
+
+            for ordinal, command, version, fileName, cacheKey in resolved:
+                if command is not None:
+                    printFileVersion( ordinal, version )
+
+            if args.no_gui:
+                with timePhase( 'diff', sourceFileName ):
+                    showDiff( [ ( item[ 3 ], sourceFileName + ' (' + ( item[ 2 ] or 'local' ) + ')' ) for item in resolved ],
+                              args, output )
+                continue
+
+            comparisons.append( ( resolved[ 0 ][ 3 ], resolved[ 1 ][ 3 ] ) )
+
+            # the rest of the batch carries on being retrieved while these are looked at
+            if len( comparisons ) >= max( 1, args.tabs ):
+                print( 'Launching the viewer...\r', end='' )
+                launchViewer( comparisons, args, wait=True )
+                print( CLEAR_LINE, end='' )
+
+                comparisons = [ ]
+
+    if comparisons:
+        launchViewer( comparisons, args )
+
+    elapsed = max( readyTime - startTime, 0.001 )
+
+    print( 'Retrieved {0} of {1} files in {2:.2f} seconds ({3:.1f} files/sec)'.format(
+           retrieved, len( batch ), elapsed, retrieved / elapsed ) )
+
+    if not args.show_identical:
+        print( 'Skipped {0} identical files (prefilter took {1:.3f} seconds)'.format( len( skipped ), prefilterTime ) )
+
+
+#//******************************************************************************
+#//
+#//  getTreeIndexFileName
+#//
+#//******************************************************************************
+
+def getTreeIndexFileName( cacheDir, directory ):
+    key = hashlib.sha1( os.path.abspath( directory ).encode( 'utf-8' ) ).hexdigest( )
+    return os.path.join( cacheDir, 'trees', key + '.json' )
+
+
+#//******************************************************************************
+#//
+#//  scanTree
+#//
+#//  returns a dictionary of every file under directory (relative to it, with
+#//  '/' separators) to its ( size, mtime ), leaving out the CVS and .git
+#//  administrative directories
+#//
+#//******************************************************************************
+
+def scanTree( directory ):
+    files = { }
+    pending = [ '' ]
+
+    while pending:
+        relativeDir = pending.pop( )
+
+        try:
+            entries = list( os.scandir( os.path.join( directory, relativeDir ) ) )
+        except OSError:
+            continue
+
+        for entry in entries:
+            name = relativeDir + '/' + entry.name if relativeDir else entry.name
+
+            try:
+                if entry.is_dir( follow_symlinks=False ):
+                    if entry.name not in TREE_SKIP_DIRS:
+                        pending.append( name )
+                elif entry.is_file( ):
+                    stat = entry.stat( )
+                    files[ name ] = ( stat.st_size, stat.st_mtime_ns )
+            except OSError:
+                pass
+
+    return files
+
+
+#//******************************************************************************
+#//
+#//  hashTreeFile
+#//
+#//  hashFile for the process pool, which returns None if the file has gone
+#//
+#//******************************************************************************
+
+def hashTreeFile( fileName ):
+    try:
+        return hashFile( fileName )
+    except OSError:
+        return None
+
+
+#//******************************************************************************
+#//
+#//  indexTree
+#//
+#//  returns a dictionary of every file under directory (as scanTree) to the
+#//  hash of its contents
+#//
+#//  The ( size, mtime, hash ) of each file is kept in a tree index under
+#//  cacheDir, so only the files whose size or modification time has changed
+#//  since the last run are hashed again, in a pool of 'jobs' processes if
+#//  there are enough of them to be worth it.  Files modified within the last
+#//  couple of seconds could change again without their mtime moving, so their
+#//  hashes aren't trusted next time.
+#//
+#//  Returns the hashes and the number of files that had to be hashed.
+#//
+#//******************************************************************************
+
+def indexTree( directory, cacheDir, jobs ):
+    indexFileName = getTreeIndexFileName( cacheDir, directory )
+
+    try:
+        with open( indexFileName ) as inputFile:
+            index = json.load( inputFile )
+
+        if index.get( 'format' ) != INDEX_FORMAT:
+            index = { }
+    except ( OSError, ValueError ):
+        index = { }
+
+    oldFiles = index.get( 'files', { } )
+
+    scanTime = time.time_ns( )
+    stats = scanTree( directory )
+
+    hashes = { }
+    stale = [ ]
+
+    for name, ( size, mtime ) in stats.items( ):
+        old = oldFiles.get( name )
+
+        if old is not None and old[ 0 ] == size and old[ 1 ] == mtime and old[ 2 ] is not None:
+            hashes[ name ] = old[ 2 ]
+        else:
+            stale.append( name )
+
+    paths = [ os.path.join( directory, name ) for name in stale ]
+
+    if len( stale ) >= TREE_POOL_THRESHOLD and jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor( max_workers=jobs ) as executor:
+            results = list( executor.map( hashTreeFile, paths, chunksize=64 ) )
+    else:
+        results = [ hashTreeFile( path ) for path in paths ]
+
+    for name, result in zip( stale, results ):
+        if result is not None:
+            hashes[ name ] = result
+
+    racyTime = scanTime - TREE_RACY_SECONDS * 1000000000
+
+    files = dict( ( name, [ size, mtime, hashes.get( name ) if mtime < racyTime else None ] )
+                  for name, ( size, mtime ) in stats.items( ) )
+
+    try:
+        os.makedirs( os.path.dirname( indexFileName ), exist_ok=True )
+
+        with tempfile.NamedTemporaryFile( 'w', dir=os.path.dirname( indexFileName ), delete=False ) as outputFile:
+            json.dump( { 'format' : INDEX_FORMAT, 'directory' : os.path.abspath( directory ), 'files' : files },
+                       outputFile )
+
+        os.replace( outputFile.name, indexFileName )
+    except OSError as error:
+        print( PROGRAM_NAME + ": cannot save tree index: {0}".format( error ) )
+
+    return hashes, len( stale )
+
+
+#//******************************************************************************
+#//
+#//  treeCompare
+#//
+#//  compares a whole directory tree in two places, each of which is one of:
+#//
+#//      ''      - the directory itself, in the current sandbox
+#//      a directory under devRoot - the same directory in another sandbox
+#//      anything else - a version (tag, branch, etc.) from version control
+#//
+#//  Two sandboxes are compared by hashing their files (see indexTree), and a
+#//  sandbox and a version by asking the backend which files differ.  The
+#//  differences are listed with:
+#//
+#//      'M' - different in the two places
+#//      '<' - only in the first place
+#//      '>' - only in the second place
+#//
+#//  and the files that are in both are then compared in Meld (or by showDiff
+#//  with --no_gui) just like a batch comparison.
+#//
+#//******************************************************************************
+
+def treeCompare( directory, firstVersion, secondVersion, devRoot, devDirs, args, output=None ):
+    sandboxes = devDirs + [ '' ]
+
+    if firstVersion == secondVersion:
+        print( PROGRAM_NAME + ':  Please specify a sandbox or version to compare the tree with.' )
+        return
+
+    if secondVersion != '' and not ( firstVersion in sandboxes and secondVersion in sandboxes ):
+        print( PROGRAM_NAME + ':  A version can only be compared with the tree in the current sandbox.' )
+        return
+
+    startTime = time.time( )
+
+    if firstVersion in sandboxes:
+        firstDir = buildDevFileName( devRoot, directory, firstVersion )
+        secondDir = buildDevFileName( devRoot, directory, secondVersion ) if secondVersion else directory
+
+        print( '\rHashing ' + firstDir + '...\r', end='' )
+        with timePhase( 'index tree', firstDir ):
+            firstHashes, firstHashed = indexTree( firstDir, args.cache_dir, args.jobs )
+
+        print( CLEAR_LINE + '\rHashing ' + secondDir + '...\r', end='' )
+        with timePhase( 'index tree', secondDir ):
+            secondHashes, secondHashed = indexTree( secondDir, args.cache_dir, args.jobs )
+
+        print( CLEAR_LINE, end='' )
+
+        changes = [ ]
+
+        for name in sorted( set( firstHashes ) | set( secondHashes ) ):
+            if name not in secondHashes:
+                changes.append( ( '<', name ) )
+            elif name not in firstHashes:
+                changes.append( ( '>', name ) )
+            elif firstHashes[ name ] != secondHashes[ name ]:
+                changes.append( ( 'M', name ) )
+
+        changes = [ ( status, os.path.normpath( os.path.join( directory, name ) ) ) for status, name in changes ]
+
+        summary = 'Compared {0} and {1} files in {2:.2f} seconds ({3} hashed)'.format(
+                  len( firstHashes ), len( secondHashes ), time.time( ) - startTime, firstHashed + secondHashed )
+    else:
+        # a version is compared with the current sandbox by the backend
+        with timePhase( 'version differences', firstVersion ):
+            changes = args.backend.getVersionDifferences( directory, firstVersion, args.jobs )
+
+        summary = 'Compared {0} with {1} in {2:.2f} seconds'.format( directory, firstVersion, time.time( ) - startTime )
+
+    for status, fileName in changes:
+        print( status + ' ' + fileName )
+
+    print( )
+    print( summary + ', {0} differences'.format( len( changes ) ) )
+
+    differing = [ fileName for status, fileName in changes if status == 'M' ]
+
+    if differing:
+        print( )
+        batchCompare( differing, devRoot, args, output, devDirs, firstVersion, secondVersion )
+
+
+#//******************************************************************************
+#//
+#//  rangeCompare
+#//
+#//  shows every change to a file between two versions, one revision at a time:
+#//  the history is read once (one 'cvs log' at most), every revision in the
+#//  range is retrieved in parallel (each only once, and from the revision cache
+#//  if it's there), and then each adjacent pair is shown in order, oldest first
+#//  (or newest first if firstVersion is the newer one).
+#//
+#//  With --no_gui, each pair gets a line with the revision, its author and date
+#//  and the number of lines added and removed, followed by the differences.
+#//
+#//******************************************************************************
+
+def rangeCompare( sourceFileName, linuxPath, firstVersion, lastVersion, devRoot, args, output=None ):
+    first = resolveArgument( devRoot, 'first', sourceFileName, linuxPath, [ ], firstVersion or 'CURRENT', args )
+
+    if first is None:
+        return
+
+    last = resolveArgument( devRoot, 'last', sourceFileName, linuxPath, [ ], lastVersion or 'HEAD', args, first[ 2 ] )
+
+    if last is None:
+        return
+
+    if first[ 1 ] is None or last[ 1 ] is None or first[ 1 ][ 0 ] != 'checkout' or last[ 1 ][ 0 ] != 'checkout':
+        print( PROGRAM_NAME + ':  A range has to be between two versions from version control.' )
+        return
+
+    try:
+        with timePhase( 'revision range', first[ 2 ] + ':' + last[ 2 ] ):
+            revisions = args.backend.getRevisionRange( sourceFileName, linuxPath, first[ 2 ], last[ 2 ] )
+    except Exception as error:
+        print( PROGRAM_NAME + ": {0}".format( error ) )
+        return
+
+    if len( revisions ) < 2:
+        print( 'There is only one revision in the range.' )
+        return
+
+    resolved = [ resolveArgument( devRoot, revision, sourceFileName, linuxPath, [ ], revision, args )
+                 for revision in revisions ]
+
+    if None in resolved or not retrieveFiles( sourceFileName, resolved, args, showVersions=False ):
+        return
+
+    print( 'Revisions {0} to {1} ({2} revisions)'.format( revisions[ 0 ], revisions[ -1 ], len( revisions ) ) )
+
+    files = [ ( item[ 3 ], sourceFileName + ' (' + item[ 2 ] + ')' ) for item in resolved ]
+    details = [ args.backend.getRevisionDetails( sourceFileName, linuxPath, revision ) for revision in revisions ]
+
+    if args.no_gui:
+        if not args.test:
+            with timePhase( 'diff', sourceFileName ):
+                showRevisionChanges( files, details, args, output )
+
+        return
+
+    if not args.test:
+        for left in range( len( files ) - 1 ):
+            detail = details[ left + 1 ]
+
+            print( '{0} -> {1}  {2}  {3}'.format( revisions[ left ], revisions[ left + 1 ], detail.get( 'date', '' ),
+                                                 detail.get( 'author', '' ) ) )
+
+    launchInTabs( [ ( files[ left ][ 0 ], files[ left + 1 ][ 0 ] ) for left in range( len( files ) - 1 ) ], args )
+
+
+#//******************************************************************************
+#//
+#//  getChangesetIndexFileName
+#//
+#//******************************************************************************
+
+def getChangesetIndexFileName( cacheDir, root, repositoryDir ):
+    key = hashlib.sha1( ( root + '\0' + repositoryDir ).encode( 'utf-8' ) ).hexdigest( )
+    return os.path.join( cacheDir, 'changesets', key + '.json' )
+
+
+#//******************************************************************************
+#//
+#//  updateChangesetIndex
+#//
+#//  brings the changeset index for a sandbox directory up to date and returns
+#//  its revisions, a list of [ date, author, message, linuxPath, revision,
+#//  state ] sorted by date
+#//
+#//  The index is built from a single 'cvs log' of the whole directory, and
+#//  after that only revisions since the newest one already indexed are asked
+#//  for (with '-d'), so updating it is cheap.  The newest date is asked for
+#//  again, in case a commit was still going on the last time.
+#//
+#//******************************************************************************
+
+def updateChangesetIndex( directory, backend, cacheDir ):
+    repositoryDir = posixpath.normpath( backend.getRepositoryPath( directory ) )
+    indexFileName = getChangesetIndexFileName( cacheDir, getRepositoryRoot( directory ), repositoryDir )
+
+    try:
+        with open( indexFileName ) as inputFile:
+            index = json.load( inputFile )
+    except ( OSError, ValueError ):
+        index = None
+
+    if index is None or index.get( 'format' ) != INDEX_FORMAT or index.get( 'directory' ) != repositoryDir:
+        index = { 'format' : INDEX_FORMAT, 'directory' : repositoryDir, 'lastDate' : '', 'revisions' : [ ] }
+
+    # CVS takes dates without a time zone as local time
+    options = [ '-d>=' + index[ 'lastDate' ] + ' +0000' ] if index[ 'lastDate' ] else [ ]
+
+    known = set( ( linuxPath, revision ) for date, author, message, linuxPath, revision, state in index[ 'revisions' ] )
+    added = 0
+
+    print( 'Parsing CVS log...\r', end='' )
+
+    for record in parseCVSLog( runCVSLog( [ directory ], options ) ):
+        linuxPath = posixpath.normpath( backend.getRepositoryPath( record[ 'workingFile' ] ) )
+
+        for revision, details in record[ 'details' ].items( ):
+            if ( linuxPath, revision ) not in known and details[ 'date' ]:
+                index[ 'revisions' ].append( [ details[ 'date' ], details[ 'author' ], details[ 'message' ], linuxPath,
+                                               revision, details[ 'state' ] ] )
+                added += 1
+
+    print( CLEAR_LINE, end='' )
+
+    if added or not index[ 'lastDate' ]:
+        index[ 'revisions' ].sort( )
+        index[ 'lastDate' ] = index[ 'revisions' ][ -1 ][ 0 ] if index[ 'revisions' ] else ''
+
+        try:
+            os.makedirs( os.path.dirname( indexFileName ), exist_ok=True )
+
+            with tempfile.NamedTemporaryFile( 'w', dir=os.path.dirname( indexFileName ), delete=False ) as outputFile:
+                json.dump( index, outputFile )
+
+            os.replace( outputFile.name, indexFileName )
+        except OSError as error:
+            print( PROGRAM_NAME + ": cannot save changeset index: {0}".format( error ) )
+
+    return index[ 'revisions' ]
+
+
+#//******************************************************************************
+#//
+#//  groupChangesets
+#//
+#//  CVS commits each file separately, so like cvsps, rickDiff reconstructs
+#//  commits ('changesets') by grouping revisions with the same author and log
+#//  message that were committed no more than CHANGESET_WINDOW seconds apart
+#//  (and that don't include the same file twice).
+#//
+#//  Returns a list of changesets in date order, each a dictionary of 'date',
+#//  'author', 'message' and 'files', a list of ( linuxPath, revision, state ).
+#//  A changeset's id is its position in the list, counting from 1.
+#//
+#//******************************************************************************
+
+def groupChangesets( revisions ):
+    changesets = [ ]
+    current = None
+
+    for date, author, message, linuxPath, revision, state in sorted( revisions, key=lambda item: ( item[ 1 ], item[ 2 ],
+                                                                                                   item[ 0 ] ) ):
+        seconds = calendar.timegm( time.strptime( date, '%Y-%m-%d %H:%M:%S' ) )
+
+        if current is None or ( author, message ) != ( current[ 'author' ], current[ 'message' ] ) or \
+           seconds - current[ 'last' ] > CHANGESET_WINDOW or linuxPath in current[ 'paths' ]:
+            current = { 'date' : date, 'author' : author, 'message' : message, 'files' : [ ], 'last' : seconds,
+                        'paths' : set( ) }
+            changesets.append( current )
+
+        current[ 'files' ].append( ( linuxPath, revision, state ) )
+        current[ 'paths' ].add( linuxPath )
+        current[ 'last' ] = seconds
+
+    changesets.sort( key=lambda changeset: ( changeset[ 'date' ], changeset[ 'author' ], changeset[ 'message' ] ) )
+
+    return changesets
+
+
+#//******************************************************************************
+#//
+#//  getPreviousRevision
+#//
+#//  returns the revision before revision (the one it was committed on top of),
+#//  given all of the file's known revisions, or None if revision added the file
+#//
+#//******************************************************************************
+
+def getPreviousRevision( revision, versions ):
+    tokens = revision.split( '.' )
+
+    if tokens[ -1 ] != '1':
+        return '.'.join( tokens[ : -1 ] + [ str( int( tokens[ -1 ] ) - 1 ) ] )
+
+    # the first revision on a branch follows the branch point
+    if len( tokens ) > 2:
+        return '.'.join( tokens[ : -2 ] )
+
+    # and 2.1 follows the last of the 1.x revisions
+    earlier = [ version for version in versions
+                if version.count( '.' ) == 1 and getRevisionKey( version ) < getRevisionKey( revision ) ]
+
+    return max( earlier, key=getRevisionKey ) if earlier else None
+
+
+#//******************************************************************************
+#//
+#//  resolveChangesetRevision
+#//
+#//  like resolveArgument, but for a revision that is already known to exist
+#//  (or None, for the side of a changeset where the file doesn't exist, which
+#//  is shown as an empty file)
+#//
+#//  The files go under directory, in the same layout as in the repository,
+#//  since a changeset can have files with the same name in different places.
+#//
+#//******************************************************************************
+
+def resolveChangesetRevision( ordinal, sourceFileName, linuxPath, version, directory ):
+    base, ext = os.path.splitext( os.path.basename( sourceFileName ) )
+
+    fileName = os.path.join( directory, os.path.dirname( sourceFileName ), base + '.' + ( version or 'none' ) + ext )
+
+    os.makedirs( os.path.dirname( fileName ), exist_ok=True )
+
+    if version is None:
+        open( fileName, 'wb' ).close( )
+        return ordinal, None, 'none', fileName, None
+
+    return ordinal, ( 'checkout', linuxPath, version ), version, fileName, \
+           getCacheKey( getRepositoryRoot( os.path.dirname( sourceFileName ) ), linuxPath, version )
+
+
+#//******************************************************************************
+#//
+#//  changesetCompare
+#//
+#//  lists the changesets (see groupChangesets) under directory, or with a
+#//  changeset id, shows every file it changed, before and after, like a batch
+#//  comparison:  all of the revisions are retrieved in parallel (and from the
+#//  revision cache if they are there), without any more 'cvs log'
+#//
+#//  Files the changeset added or removed are compared with an empty file.
+#//
+#//******************************************************************************
+
+def changesetCompare( directory, changesetId, args, output=None ):
+    if args.backend.name != 'cvs':
+        print( PROGRAM_NAME + ':  Changesets are only needed with CVS (use a commit id with git).' )
+        return
+
+    with timePhase( 'changeset index', directory ):
+        revisions = updateChangesetIndex( directory, args.backend, args.cache_dir )
+
+    changesets = groupChangesets( revisions )
+
+    if changesetId == '':
+        for number, changeset in list( enumerate( changesets, 1 ) )[ -CHANGESET_LIST_SIZE : ]:
+            print( '{0:>6}  {1}  {2:<12}  {3:>4} files  {4}'.format( number, changeset[ 'date' ], changeset[ 'author' ],
+                                                                    len( changeset[ 'files' ] ),
+                                                                    changeset[ 'message' ].split( '\n' )[ 0 ] ) )
+
+        print( )
+        print( '{0} changesets under {1}'.format( len( changesets ), directory ) )
+        return
+
+    if not changesetId.isdigit( ) or not 1 <= int( changesetId ) <= len( changesets ):
+        print( PROGRAM_NAME + ":  There is no changeset '" + changesetId + "' under '" + directory + "'." )
+        return
+
+    changeset = changesets[ int( changesetId ) - 1 ]
+
+    print( 'Changeset {0}:  {1}  {2}'.format( changesetId, changeset[ 'date' ], changeset[ 'author' ] ) )
+
+    for line in changeset[ 'message' ].split( '\n' ):
+        print( '    ' + line )
+
+    print( )
+
+    # everything we know about each file's history
+    versions = { }
+    dead = set( )
+
+    for date, author, message, linuxPath, revision, state in revisions:
+        versions.setdefault( linuxPath, [ ] ).append( revision )
+
+        if state == 'dead':
+            dead.add( ( linuxPath, revision ) )
+
+    tempDir = os.path.join( os.environ[ 'TEMP' ], PROGRAM_NAME + '-changeset-' + changesetId )
+    linuxRoot = posixpath.normpath( args.backend.getRepositoryPath( '.' ) )
+
+    batch = [ ]
+
+    for linuxPath, revision, state in sorted( changeset[ 'files' ] ):
+        sourceFileName = posixpath.relpath( linuxPath, linuxRoot ).replace( '/', os.sep )
+
+        previous = getPreviousRevision( revision, versions[ linuxPath ] )
+
+        if ( linuxPath, previous ) in dead:
+            previous = None
+
+        batch.append( ( sourceFileName,
+                        [ resolveChangesetRevision( 'before', sourceFileName, linuxPath, previous, tempDir ),
+                          resolveChangesetRevision( 'after', sourceFileName, linuxPath,
+                                                    None if state == 'dead' else revision, tempDir ) ] ) )
+
+    reviewBatch( batch, args, output )
+
+
+#//******************************************************************************
+#//
+#//  bisectRegion
+#//
+#//  finds the middle of a shortest edit script between a[ a0 : a1 ] and
+#//  b[ b0 : b1 ] the way Myers' linear space diff does, by following the
+#//  furthest reaching paths from both ends at once until they meet
+#//
+#//  That takes O( ( N + M ) D ) time for D differences and O( N + M ) space,
+#//  however repetitive the lines are.  The region should already have had its
+#//  common prefix and suffix removed.
+#//
+#//  Like git, it gives up looking after MAX_DIFF_COST differences from each
+#//  end and splits at the forward path that got furthest, so very different
+#//  regions cost no more than O( ( N + M ) MAX_DIFF_COST ) at the price of a
+#//  diff that may not be the shortest.
+#//
+#//  Returns the point ( i, j ) to split the region at (the end of the forward
+#//  path's last run of matching lines, which comes out as the common suffix of
+#//  the first half), or None if the two sides have nothing in common.
+#//
+#//******************************************************************************
+
+def bisectRegion( a, b, a0, a1, b0, b1 ):
+    n = a1 - a0
+    m = b1 - b0
+
+    maxD = ( n + m + 1 ) // 2
+    offset = maxD
+    forward = [ -1 ] * ( 2 * maxD + 2 )
+    backward = [ -1 ] * ( 2 * maxD + 2 )
+    forward[ offset + 1 ] = 0
+    backward[ offset + 1 ] = 0
+
+    delta = n - m
+    odd = delta % 2 != 0
+
+    # diagonals that have run off the edge of the grid are skipped from then on
+    forwardStart = forwardEnd = backwardStart = backwardEnd = 0
+
+    for d in range( maxD ):
+        for k in range( -d + forwardStart, d + 1 - forwardEnd, 2 ):
+            if k == -d or ( k != d and forward[ offset + k - 1 ] < forward[ offset + k + 1 ] ):
+                x = forward[ offset + k + 1 ]
+            else:
+                x = forward[ offset + k - 1 ] + 1
+
+            y = x - k
+
+            while x < n and y < m and a[ a0 + x ] == b[ b0 + y ]:
+                x += 1
+                y += 1
+
+            forward[ offset + k ] = x
+
+            if x > n:
+                forwardEnd += 2
+            elif y > m:
+                forwardStart += 2
+            elif odd:
+                other = offset + delta - k
+
+                if 0 <= other < len( backward ) and backward[ other ] != -1 and x >= n - backward[ other ]:
+                    return a0 + x, b0 + y
+
+        for k in range( -d + backwardStart, d + 1 - backwardEnd, 2 ):
+            if k == -d or ( k != d and backward[ offset + k - 1 ] < backward[ offset + k + 1 ] ):
+                x = backward[ offset + k + 1 ]
+            else:
+                x = backward[ offset + k - 1 ] + 1
+
+            y = x - k
+
+            while x < n and y < m and a[ a1 - x - 1 ] == b[ b1 - y - 1 ]:
+                x += 1
+                y += 1
+
+            backward[ offset + k ] = x
+
+            if x > n:
+                backwardEnd += 2
+            elif y > m:
+                backwardStart += 2
+            elif not odd:
+                other = offset + delta - k
+
+                if 0 <= other < len( forward ) and forward[ other ] != -1:
+                    forwardX = forward[ other ]
+                    forwardY = forwardX - ( other - offset )
+
+                    if forwardX >= n - x:
+                        return a0 + forwardX, b0 + forwardY
+
+        if d >= MAX_DIFF_COST:
+            best = None
+
+            for k in range( -d + forwardStart, d + 1 - forwardEnd, 2 ):
+                x = forward[ offset + k ]
+
+                if 0 <= x <= n and 0 <= x - k <= m and 0 < 2 * x - k < n + m and \
+                   ( best is None or 2 * x - k > best[ 0 ] + best[ 1 ] ):
+                    best = ( x, x - k )
+
+            return None if best is None else ( a0 + best[ 0 ], b0 + best[ 1 ] )
+
+    return None
+
+
+#//******************************************************************************
+#//
+#//  findMatches
+#//
+#//  This is the heart of the built-in diff, a histogram diff like git's:
+#//  common prefixes and suffixes are matched directly, and then the region in
+#//  between is split around the longest run of matching lines that starts with
+#//  the least common line in 'a', and each side is handled the same way.
+#//  A region where every common line occurs more than MAX_DIFF_CHAIN times
+#//  is split in two by bisectRegion instead, and so are its halves, all the
+#//  way down (anchoring on lines that only look rare in a small part of it
+#//  would line up the wrong copies).
+#//
+#//  a and b are lists of interned lines (ints).  Returns a sorted list of
+#//  matching blocks ( i, j, length ).
+#//
+#//******************************************************************************
+
+def findMatches( a, b ):
+    matches = [ ]
+    regions = [ ( 0, len( a ), 0, len( b ), False ) ]
+
+    while regions:
+        a0, a1, b0, b1, bisected = regions.pop( )
+
+        # strip the common prefix and suffix
+        start = 0
+
+        while a0 + start < a1 and b0 + start < b1 and a[ a0 + start ] == b[ b0 + start ]:
+            start += 1
+
+        if start:
+            matches.append( ( a0, b0, start ) )
+            a0 += start
+            b0 += start
+
+        end = 0
+
+        while a1 - end > a0 and b1 - end > b0 and a[ a1 - end - 1 ] == b[ b1 - end - 1 ]:
+            end += 1
+
+        if end:
+            matches.append( ( a1 - end, b1 - end, end ) )
+            a1 -= end
+            b1 -= end
+
+        if a0 == a1 or b0 == b1:
+            continue
+
+        # lines that were too common to anchor on are still too common in a part of the region, even if they
+        # occur less often there, so once a region has been bisected its parts are too
+        if bisected:
+            split = bisectRegion( a, b, a0, a1, b0, b1 )
+
+            if split is not None:
+                regions.append( ( a0, split[ 0 ], b0, split[ 1 ], True ) )
+                regions.append( ( split[ 0 ], a1, split[ 1 ], b1, True ) )
+
+            continue
+
+        # build the histogram of 'a'
+        positions = { }
+
+        for i in range( a0, a1 ):
+            positions.setdefault( a[ i ], [ ] ).append( i )
+
+        # find the longest match starting at the least common line
+        bestCount = MAX_DIFF_CHAIN + 1
+        bestLength = 0
+        bestI = bestJ = 0
+
+        j = b0
+
+        while j < b1:
+            candidates = positions.get( b[ j ] )
+
+            if candidates is None or len( candidates ) > bestCount:
+                j += 1
+                continue
+
+            nextJ = j + 1
+
+            for i in candidates:
+                before = 0
+
+                while i - before > a0 and j - before > b0 and a[ i - before - 1 ] == b[ j - before - 1 ]:
+                    before += 1
+
+                after = 1
+
+                while i + after < a1 and j + after < b1 and a[ i + after ] == b[ j + after ]:
+                    after += 1
+
+                length = before + after
+
+                if len( candidates ) < bestCount or length > bestLength:
+                    bestCount = len( candidates )
+                    bestLength = length
+                    bestI = i - before
+                    bestJ = j - before
+
+                nextJ = max( nextJ, j + after )
+
+            j = nextJ
+
+        if bestLength == 0:
+            # every line in common is too common to anchor on, so like git, fall back to Myers' diff for
+            # this region (if there's nothing in common at all, it's all one change)
+            if any( b[ j ] in positions for j in range( b0, b1 ) ):
+                split = bisectRegion( a, b, a0, a1, b0, b1 )
+
+                if split is not None:
+                    regions.append( ( a0, split[ 0 ], b0, split[ 1 ], True ) )
+                    regions.append( ( split[ 0 ], a1, split[ 1 ], b1, True ) )
+
+            continue
+
+        matches.append( ( bestI, bestJ, bestLength ) )
+
+        regions.append( ( a0, bestI, b0, bestJ, False ) )
+        regions.append( ( bestI + bestLength, a1, bestJ + bestLength, b1, False ) )
+
+    matches.sort( )
+
+    return matches
+
+
+#//******************************************************************************
+#//
+#//  diffLines
+#//
+#//  compares two lists of lines and returns opcodes in the same form as
+#//  difflib.SequenceMatcher.get_opcodes( ):  ( tag, i1, i2, j1, j2 ), where
+#//  tag is 'equal', 'replace', 'delete' or 'insert'
+#//
+#//  Lines are interned to ints first so that all the comparisons are cheap.
+#//
+#//******************************************************************************
+
+def diffLines( a, b ):
+    table = { }
+
+    a = [ table.setdefault( line, len( table ) ) for line in a ]
+    b = [ table.setdefault( line, len( table ) ) for line in b ]
+
+    opcodes = [ ]
+
+    i = j = 0
+
+    for matchI, matchJ, length in findMatches( a, b ) + [ ( len( a ), len( b ), 0 ) ]:
+        if i < matchI and j < matchJ:
+            opcodes.append( ( 'replace', i, matchI, j, matchJ ) )
+        elif i < matchI:
+            opcodes.append( ( 'delete', i, matchI, j, j ) )
+        elif j < matchJ:
+            opcodes.append( ( 'insert', i, i, j, matchJ ) )
+
+        if length:
+            if opcodes and opcodes[ -1 ][ 0 ] == 'equal':
+                opcodes[ -1 ] = ( 'equal', opcodes[ -1 ][ 1 ], matchI + length, opcodes[ -1 ][ 3 ], matchJ + length )
+            else:
+                opcodes.append( ( 'equal', matchI, matchI + length, matchJ, matchJ + length ) )
+
+        i = matchI + length
+        j = matchJ + length
+
+    return opcodes
+
+
+#//******************************************************************************
+#//
+#//  groupOpcodes
+#//
+#//  splits opcodes into hunks with 'context' lines of context around each
+#//  change, the same way difflib.SequenceMatcher.get_grouped_opcodes( ) does
+#//
+#//******************************************************************************
+
+def groupOpcodes( opcodes, context ):
+    if not opcodes:
+        return
+
+    opcodes = list( opcodes )
+
+    tag, i1, i2, j1, j2 = opcodes[ 0 ]
+
+    if tag == 'equal':
+        opcodes[ 0 ] = ( tag, max( i1, i2 - context ), i2, max( j1, j2 - context ), j2 )
+
+    tag, i1, i2, j1, j2 = opcodes[ -1 ]
+
+    if tag == 'equal':
+        opcodes[ -1 ] = ( tag, i1, min( i2, i1 + context ), j1, min( j2, j1 + context ) )
+
+    group = [ ]
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > context * 2:
+            group.append( ( tag, i1, min( i2, i1 + context ), j1, min( j2, j1 + context ) ) )
+            yield group
+            group = [ ]
+            i1 = max( i1, i2 - context )
+            j1 = max( j1, j2 - context )
+
+        group.append( ( tag, i1, i2, j1, j2 ) )
+
+    if group and not ( len( group ) == 1 and group[ 0 ][ 0 ] == 'equal' ):
+        yield group
+
+
+#//******************************************************************************
+#//
+#//  readLines
+#//
+#//  reads a file as a list of lines without their line endings
+#//
+#//******************************************************************************
+
+def readLines( fileName ):
+    with open( fileName, 'rb' ) as inputFile:
+        return inputFile.read( ).decode( 'utf-8', 'replace' ).splitlines( )
+
+
+#//******************************************************************************
+#//
+#//  formatRange
+#//
+#//  formats a range of lines for a unified diff hunk header, following the
+#//  same conventions as GNU diff (and difflib)
+#//
+#//******************************************************************************
+
+def formatRange( start, stop ):
+    length = stop - start
+
+    if length == 1:
+        return str( start + 1 )
+    elif length == 0:
+        return str( start ) + ',0'
+    else:
+        return str( start + 1 ) + ',' + str( length )
+
+
+#//******************************************************************************
+#//
+#//  formatUnifiedDiff
+#//
+#//******************************************************************************
+
+def formatUnifiedDiff( a, b, opcodes, labelA, labelB, context ):
+    groups = groupOpcodes( opcodes, context )
+
+    # identical files produce no output at all, like diff
+    group = next( groups, None )
+
+    if group is None:
+        return
+
+    yield '--- ' + labelA
+    yield '+++ ' + labelB
+
+    for group in itertools.chain( [ group ], groups ):
+        first, last = group[ 0 ], group[ -1 ]
+
+        yield '@@ -' + formatRange( first[ 1 ], last[ 2 ] ) + ' +' + formatRange( first[ 3 ], last[ 4 ] ) + ' @@'
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[ i1 : i2 ]:
+                    yield ' ' + line
+            else:
+                for line in a[ i1 : i2 ]:
+                    yield '-' + line
+
+                for line in b[ j1 : j2 ]:
+                    yield '+' + line
+
+
+#//******************************************************************************
+#//
+#//  formatSideBySide
+#//
+#//******************************************************************************
+
+def formatSideBySide( a, b, opcodes, labelA, labelB, context, width ):
+    column = max( ( width - 3 ) // 2, 10 )
+
+    def row( left, marker, right ):
+        return left[ : column ].expandtabs( 4 )[ : column ].ljust( column ) + ' ' + marker + ' ' + \
+               right[ : column ].expandtabs( 4 )[ : column ]
+
+    yield row( labelA, ' ', labelB )
+    yield '=' * ( column * 2 + 3 )
+
+    for group in groupOpcodes( opcodes, context ):
+        yield '-' * ( column * 2 + 3 )
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for offset in range( i2 - i1 ):
+                    yield row( a[ i1 + offset ], ' ', b[ j1 + offset ] )
+            else:
+                marker = { 'replace' : '|', 'delete' : '<', 'insert' : '>' }[ tag ]
+
+                for offset in range( max( i2 - i1, j2 - j1 ) ):
+                    left = a[ i1 + offset ] if i1 + offset < i2 else ''
+                    right = b[ j1 + offset ] if j1 + offset < j2 else ''
+
+                    yield row( left, marker, right )
+
+
+#//******************************************************************************
+#//
+#//  getDiffStats
+#//
+#//  summarizes the hunks in opcodes for --diff_format json
+#//
+#//******************************************************************************
+
+def getDiffStats( opcodes, labelA, labelB ):
+    hunks = [ ]
+    added = removed = 0
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            continue
+
+        hunks.append( { 'type' : tag, 'oldStart' : i1 + 1, 'oldLines' : i2 - i1,
+                        'newStart' : j1 + 1, 'newLines' : j2 - j1 } )
+
+        removed += i2 - i1
+        added += j2 - j1
+
+    return { 'old' : labelA, 'new' : labelB, 'identical' : not hunks, 'hunks' : hunks,
+             'linesAdded' : added, 'linesRemoved' : removed }
+
+
+#//******************************************************************************
+#//
+#//  isLargeFile
+#//
+#//  returns True if fileName is bigger than --large_file megabytes, which is
+#//  too big to compare line by line in memory (or to hand to Meld)
+#//
+#//******************************************************************************
+
+def isLargeFile( fileName, args ):
+    try:
+        return os.path.getsize( fileName ) > args.large_file << 20
+    except OSError:
+        return False
+
+
+#//******************************************************************************
+#//
+#//  mapFiles
+#//
+#//  memory-maps each of fileNames read-only for the duration of a with block,
+#//  so large files can be compared without reading them into memory (an empty
+#//  file, which can't be mapped, is b'')
+#//
+#//******************************************************************************
+
+@contextlib.contextmanager
+def mapFiles( *fileNames ):
+    with contextlib.ExitStack( ) as stack:
+        maps = [ ]
+
+        for fileName in fileNames:
+            inputFile = stack.enter_context( open( fileName, 'rb' ) )
+
+            if os.fstat( inputFile.fileno( ) ).st_size == 0:
+                maps.append( b'' )
+            else:
+                maps.append( stack.enter_context( mmap.mmap( inputFile.fileno( ), 0, access=mmap.ACCESS_READ ) ) )
+
+        yield maps
+
+
+#//******************************************************************************
+#//
+#//  normalizedFiles
+#//
+#//  gives the names of copies of fileNames with their line endings normalized
+#//  (see normalizeLineEndings) for the duration of a with block, so large files
+#//  can be compared the way filesIdentical( normalize=True ) compares them
+#//
+#//  A file that normalizing wouldn't change (like a checkout, which
+#//  retrieveFile has already normalized) is used as it is; the others are
+#//  copied into $TEMP a chunk at a time and deleted afterwards.
+#//
+#//******************************************************************************
+
+@contextlib.contextmanager
+def normalizedFiles( *fileNames ):
+    copies = [ ]
+
+    try:
+        names = [ ]
+
+        for fileName in fileNames:
+            with open( fileName, 'rb' ) as inputFile1, open( fileName, 'rb' ) as inputFile2:
+                if chunksEqual( readChunks( inputFile1 ), normalizeLineEndings( readChunks( inputFile2 ) ) ):
+                    names.append( fileName )
+                    continue
+
+            with tempfile.NamedTemporaryFile( dir=os.environ.get( 'TEMP' ), delete=False ) as outputFile:
+                copies.append( outputFile.name )
+
+            with open( fileName, 'rb' ) as inputFile:
+                writeChunks( readChunks( inputFile ), outputFile.name, True )
+
+            names.append( outputFile.name )
+
+        yield names
+    finally:
+        for copy in copies:
+            try:
+                os.remove( copy )
+            except OSError:
+                pass
+
+
+#//******************************************************************************
+#//
+#//  releasePages
+#//
+#//  tells the OS that data[ start : end ] (an mmap) won't be needed again
+#//  soon, so the pages that have been read don't stay in the process's
+#//  resident set and its memory use stays flat however big the file is
+#//  (they stay in the file cache, so reading them again is still cheap)
+#//
+#//  A chunk either side goes too, because Linux maps in the pages around the
+#//  ones that are read as well (fault-around), and a scan that doesn't start
+#//  on a page boundary would otherwise leave a trail of them behind it.
+#//
+#//  This needs madvise( ), which Windows doesn't have, but there the OS trims
+#//  the working set of mapped files by itself.
+#//
+#//******************************************************************************
+
+def releasePages( data, start, end ):
+    if isinstance( data, mmap.mmap ) and hasattr( mmap, 'MADV_DONTNEED' ) and end > start:
+        start = max( 0, start - CHUNK_SIZE )
+        start -= start % mmap.PAGESIZE
+        end = min( len( data ), end + CHUNK_SIZE )
+
+        data.madvise( mmap.MADV_DONTNEED, start, end - start )
+
+
+#//******************************************************************************
+#//
+#//  findCommonPrefix
+#//
+#//  returns the number of bytes at the start of a and b (bytes or mmaps) that
+#//  are the same, comparing a chunk at a time
+#//
+#//******************************************************************************
+
+def findCommonPrefix( a, b ):
+    length = min( len( a ), len( b ) )
+    start = 0
+
+    while start < length:
+        end = min( start + CHUNK_SIZE, length )
+        chunkA, chunkB = a[ start : end ], b[ start : end ]
+
+        releasePages( a, start, end )
+        releasePages( b, start, end )
+
+        if chunkA != chunkB:
+            return start + next( offset for offset in range( end - start ) if chunkA[ offset ] != chunkB[ offset ] )
+
+        start = end
+
+    return length
+
+
+#//******************************************************************************
+#//
+#//  findCommonSuffix
+#//
+#//  returns the number of bytes at the end of a and b that are the same, but
+#//  no more than limit
+#//
+#//******************************************************************************
+
+def findCommonSuffix( a, b, limit ):
+    length = 0
+
+    while length < limit:
+        size = min( CHUNK_SIZE, limit - length )
+        startA, startB = len( a ) - length - size, len( b ) - length - size
+        chunkA, chunkB = a[ startA : startA + size ], b[ startB : startB + size ]
+
+        releasePages( a, startA, startA + size )
+        releasePages( b, startB, startB + size )
+
+        if chunkA != chunkB:
+            return length + next( offset for offset in range( size ) if chunkA[ -1 - offset ] != chunkB[ -1 - offset ] )
+
+        length += size
+
+    return length
+
+
+#//******************************************************************************
+#//
+#//  countLines
+#//
+#//  counts the lines in data[ start : end ] a chunk at a time (a last line
+#//  without a line ending counts too)
+#//
+#//******************************************************************************
+
+def countLines( data, start, end ):
+    count = 0
+
+    for offset in range( start, end, CHUNK_SIZE ):
+        count += data[ offset : min( offset + CHUNK_SIZE, end ) ].count( b'\n' )
+
+        releasePages( data, offset, min( offset + CHUNK_SIZE, end ) )
+
+    if end > start and data[ end - 1 : end ] != b'\n':
+        count += 1
+
+    return count
+
+
+#//******************************************************************************
+#//
+#//  summarizeLargeDiff
+#//
+#//  the large file alternative to diffLines and getDiffStats:  the files are
+#//  memory-mapped and only the common lines at the start and the end are
+#//  found, so everything in between is reported as a single hunk
+#//
+#//  That takes no more memory however big the files are, and still says where
+#//  the changes are, which for generated files is usually what matters.
+#//
+#//  Both files are compared with their line endings normalized, as a checkout
+#//  has them and a local file in a POSIX sandbox doesn't (readLines, for the
+#//  smaller files, ignores line endings).
+#//
+#//  Returns the same dictionary as getDiffStats, with 'summary' set and the
+#//  files' sizes.
+#//
+#//******************************************************************************
+
+def summarizeLargeDiff( fileNameA, fileNameB, labelA, labelB ):
+    sizeA, sizeB = os.path.getsize( fileNameA ), os.path.getsize( fileNameB )
+
+    with normalizedFiles( fileNameA, fileNameB ) as names, mapFiles( *names ) as ( a, b ):
+        prefix = findCommonPrefix( a, b )
+
+        if prefix == len( a ) == len( b ):
+            endA = endB = prefix
+        else:
+            # only whole lines are the same, so the common parts have to start and end on line boundaries
+            prefix = a.rfind( b'\n', 0, prefix ) + 1
+            suffix = findCommonSuffix( a, b, min( len( a ), len( b ) ) - prefix )
+            endA, endB = len( a ) - suffix, len( b ) - suffix
+
+            if a[ endA - 1 : endA ] not in ( b'', b'\n' ) or b[ endB - 1 : endB ] not in ( b'', b'\n' ):
+                newline = a.find( b'\n', endA )
+                endA = len( a ) if newline < 0 else newline + 1
+                endB = len( b ) - ( len( a ) - endA )
+
+        start = countLines( a, 0, prefix ) + 1
+        oldLines = countLines( a, prefix, endA )
+        newLines = countLines( b, prefix, endB )
+
+        hunks = [ ]
+
+        if oldLines or newLines:
+            tag = 'replace' if oldLines and newLines else 'delete' if oldLines else 'insert'
+
+            hunks.append( { 'type' : tag, 'oldStart' : start, 'oldLines' : oldLines, 'newStart' : start,
+                            'newLines' : newLines } )
+
+        return { 'old' : labelA, 'new' : labelB, 'identical' : not hunks, 'hunks' : hunks, 'linesAdded' : newLines,
+                 'linesRemoved' : oldLines, 'summary' : True, 'oldSize' : sizeA, 'newSize' : sizeB }
+
+
+#//******************************************************************************
+#//
+#//  formatLargeDiffSummary
+#//
+#//  formats summarizeLargeDiff's result like the header of a unified diff
+#//  (which, as with formatUnifiedDiff, is nothing for identical files)
+#//
+#//******************************************************************************
+
+def formatLargeDiffSummary( stats ):
+    if stats[ 'identical' ]:
+        return
+
+    yield '--- {0} ({1:,} bytes)'.format( stats[ 'old' ], stats[ 'oldSize' ] )
+    yield '+++ {0} ({1:,} bytes)'.format( stats[ 'new' ], stats[ 'newSize' ] )
+
+    for hunk in stats[ 'hunks' ]:
+        yield '@@ -{0} +{1} @@ too large to compare line by line, so this is everything that changed'.format(
+              formatRange( hunk[ 'oldStart' ] - 1, hunk[ 'oldStart' ] - 1 + hunk[ 'oldLines' ] ),
+              formatRange( hunk[ 'newStart' ] - 1, hunk[ 'newStart' ] - 1 + hunk[ 'newLines' ] ) )
+
+
+#//******************************************************************************
+#//
+#//  showLargeDiff
+#//
+#//  prints summarizeLargeDiff's result in args.diff_format (JSON is left to the
+#//  caller, which collects the results), and returns it
+#//
+#//******************************************************************************
+
+def showLargeDiff( fileNameA, fileNameB, labelA, labelB, args, output=None ):
+    with timePhase( 'large file summary', labelA + ' ' + labelB ):
+        stats = summarizeLargeDiff( fileNameA, fileNameB, labelA, labelB )
+
+    if args.diff_format != 'json':
+        for line in formatLargeDiffSummary( stats ):
+            print( line, file=output )
+
+    return stats
+
+
+#//******************************************************************************
+#//
+#//  showDiff
+#//
+#//  the headless alternative to launching Meld:  compares each adjacent pair of
+#//  files (so a three-way comparison shows first/second and second/third, like
+#//  Meld's panes) and prints the result in args.diff_format
+#//
+#//  files is a list of ( fileName, label ) in display order.  The differences
+#//  are written to output (stdout by default).
+#//
+#//******************************************************************************
+
+def showDiff( files, args, output=None ):
+    results = [ ]
+
+    b = None
+
+    for left in range( len( files ) - 1 ):
+        ( fileNameA, labelA ), ( fileNameB, labelB ) = files[ left ], files[ left + 1 ]
+
+        if isLargeFile( fileNameA, args ) or isLargeFile( fileNameB, args ):
+            results.append( showLargeDiff( fileNameA, fileNameB, labelA, labelB, args, output ) )
+            b = None
+            continue
+
+        a = readLines( fileNameA ) if b is None else b
+        b = readLines( fileNameB )
+
+        opcodes = diffLines( a, b )
+
+        if args.diff_format == 'json':
+            results.append( getDiffStats( opcodes, labelA, labelB ) )
+        elif args.diff_format == 'side':
+            for line in formatSideBySide( a, b, opcodes, labelA, labelB, args.context, args.width ):
+                print( line, file=output )
+        else:
+            for line in formatUnifiedDiff( a, b, opcodes, labelA, labelB, args.context ):
+                print( line, file=output )
+
+    if args.diff_format == 'json':
+        print( json.dumps( results, indent=2 ), file=output )
+
+
+#//******************************************************************************
 #//
-#//  targetFile - file whose version number we are incrementing
-#//  version - version string
-#//  increment - integer value of how much to increment the version
-#//              (positive or negative)
+#//  showRevisionChanges
 #//
-#//  If the increment goes higher then the current version, then it will call
-#//  incrementVersionSimple.  This may or may not be a valid version number.
+#//  the headless side of rangeCompare:  like showDiff, but each adjacent pair is
+#//  introduced by a summary of the newer revision (its author and date and the
+#//  lines added and removed), which --diff_format json adds to the stats
 #//
-#//  If the increment goes lower than 1.1, then it will return '1.1'
+#//  details is the list of getRevisionDetails dictionaries to go with files.
 #//
 #//******************************************************************************
 
-def incrementVersion( targetFile, version, increment ):
-    print( '\rParsing CVS log...\r', end='' )
+def showRevisionChanges( files, details, args, output=None ):
+    results = [ ]
 
-    process = subprocess.Popen( [ 'cvs', 'log', '-N', targetFile ], stdout=subprocess.PIPE,
-                                 shell=True, universal_newlines=True )
+    b = None
 
-    versions = [ ]
+    for left in range( len( files ) - 1 ):
+        ( fileNameA, labelA ), ( fileNameB, labelB ) = files[ left ], files[ left + 1 ]
+        detail = details[ left + 1 ]
 
-    index = -1
+        if isLargeFile( fileNameA, args ) or isLargeFile( fileNameB, args ):
+            with timePhase( 'large file summary', labelA + ' ' + labelB ):
+                stats = summarizeLargeDiff( fileNameA, fileNameB, labelA, labelB )
 
-    for line in process.stdout:
-        if str( line ).startswith( 'revision ' ):
-            newVersion = line[ 9 : -1 ]
+            lines = formatLargeDiffSummary( stats )
+            opcodes = None
+            b = None
+        else:
+            a = readLines( fileNameA ) if b is None else b
+            b = readLines( fileNameB )
 
-            versions.append( newVersion )
+            opcodes = diffLines( a, b )
+            stats = getDiffStats( opcodes, labelA, labelB )
 
-            if ( index == -1 ) and ( newVersion == version ):
-                index = len( versions ) - 1
+        if args.diff_format == 'json':
+            stats.update( author=detail.get( 'author', '' ), date=detail.get( 'date', '' ) )
+            results.append( stats )
+            continue
 
-    # remember versions in order from newest to oldest
-    newIndex = index - increment
+        print( '{0}  {1}  {2}  +{3} -{4}'.format( labelB, detail.get( 'date', '' ), detail.get( 'author', '' ),
+                                                 stats[ 'linesAdded' ], stats[ 'linesRemoved' ] ), file=output )
 
-    print( CLEAR_LINE, end='' )
+        if opcodes is None:
+            pass
+        elif args.diff_format == 'side':
+            lines = formatSideBySide( a, b, opcodes, labelA, labelB, args.context, args.width )
+        else:
+            lines = formatUnifiedDiff( a, b, opcodes, labelA, labelB, args.context )
 
-    if newIndex > len( versions ):
-        return '1.1'
-    elif newIndex < 0:
-        return incrementVersionSimple( version, increment )
-    else:
-        return versions[ newIndex ]
+        for line in lines:
+            print( line, file=output )
 
+        print( file=output )
 
-#//******************************************************************************
+    if args.diff_format == 'json':
+        print( json.dumps( results, indent=2 ), file=output )
+
+
+#//************************************************************************************************
 #//
-#//  getHeadVersion
+#//  compareFiles
 #//
-#//  get the head version number from the cvs log
+#//  does the work for main once the arguments have been parsed
 #//
-#//******************************************************************************
+#//  output is where --no_gui writes the differences.
+#//
+#//************************************************************************************************
 
-def getHeadVersion( targetFile ):
-    print( '\rParsing CVS log...\r', end='' )
+def compareFiles( args, fileName, firstVersion, secondVersion, thirdVersion, fileList, output ):
+    # the sandbox scanner only needs CVS/Entries
+    if args.status:
+        showSandboxStatus( fileList or [ '.' ], args.jobs, args.backend )
+        return
 
-    process = subprocess.Popen( [ 'cvs', 'log', '-N', targetFile ], stdout=subprocess.PIPE,
-                                  shell=True, universal_newlines=True )
+    if args.modified:
+        changes, scanned = args.backend.getLocalChanges( fileList or [ '.' ], args.jobs )
 
-    for line in process.stdout:
-        if str( line ).startswith( 'head: ' ):
-            return line[ 6 : -1 ]
+        fileList = [ changedFile for status, changedFile in changes if status == 'M' ]
 
-    return 'ERROR'
+        if not fileList:
+            print( PROGRAM_NAME + ':  no locally modified files' )
+            return
 
+        fileName = fileList[ 0 ]
+        args.batch_compare = True
 
-#//******************************************************************************
-#//
-#//  parseVersionFromEntries
-#//
-#//  parses the current version of the file from the CVS/Entries file
-#//
-#//******************************************************************************
+    # parse the arguments
+    linuxPath = args.backend.getRepositoryPath( fileName )
 
-def parseVersionFromEntries( targetFile ):
-    pathList = targetFile.split( os.sep )
+    sourceFileName = os.path.normpath( fileName ) if fileName else fileName
 
-    fileName = pathList.pop( )
+    if args.invalidate_index:
+        args.backend.invalidate( fileList if args.batch_compare else [ fileName ] )
 
-    pathList.append( 'CVS' )
-    pathList.append( 'Entries' )
+    devRoot = args.root
 
-    entriesFileName = os.sep.join( pathList )
+    with timePhase( 'list devRoot', devRoot ):
+        devDirs = listDevDirs( devRoot )
 
-    for line in codecs.open( entriesFileName, 'rU', 'ascii', 'replace' ):
-        fields = line[ : -1 ].split( '/' )
+    if args.three_way and ( firstVersion == '' or secondVersion == '' ):
+        print( PROGRAM_NAME + ":  Please specify at least two CVS versions for three-way comparison." )
+        return
 
-        if len( fields ) < 3:
-            break
+    base, ext = os.path.splitext( os.path.basename( sourceFileName ) )
 
-        if ( fields[ 1 ] == fileName ):
-            return fields[ 2 ]
+    # so is comparing whole trees
+    if args.tree:
+        treeCompare( fileName or '.', firstVersion, secondVersion, devRoot, devDirs, args, output )
+        return
 
-    raise Exception( "'" + targetFile + "' not found in CVS/Entries, not under version control?" )
+    # and reviewing changesets
+    if args.changeset:
+        changesetCompare( fileName or '.', firstVersion, args, output )
+        return
+
+    # as is a range of revisions
+    if args.range:
+        rangeCompare( sourceFileName, linuxPath, firstVersion, secondVersion, devRoot, args, output )
+        return
+
+    # batch comparison is a whole different thing (and much simpler)
+    if args.batch_compare:
+        batchCompare( fileList, devRoot, args, output )
+        return
+
+    # parse the first version argument and build the shell command
+    if firstVersion == '':
+        firstVersion = 'CURRENT'
+
+    first = resolveArgument( devRoot, 'first', sourceFileName, linuxPath, devDirs, firstVersion, args )
+
+    if first is None:
+        return
+
+    resolved = [ first ]
+
+    # parse the second version argument and build the shell command ('+n' only needs the first version number)
+    second = resolveArgument( devRoot, 'second', sourceFileName, linuxPath, devDirs, secondVersion, args, first[ 2 ] )
+
+    if second is None:
+        return
+
+    resolved.append( second )
+
+    # parse the third version argument and build the shell command (if we need one)
+    if thirdVersion != '' or args.three_way:
+        third = resolveArgument( devRoot, 'third', sourceFileName, linuxPath, devDirs, thirdVersion, args, first[ 2 ] )
+
+        if third is None:
+            return
+
+        resolved.append( third )
+
+    # now retrieve them all at once
+    if not retrieveFiles( sourceFileName, resolved, args ):
+        return
+
+
+    # we have everything, so let's put the files in the order they are to be shown
+    files = [ ( item[ 3 ], sourceFileName + ' (' + ( item[ 2 ] or 'local' ) + ')' ) for item in resolved ]
+
+    if len( files ) == 2:
+        if args.reverse or args.exchange12:
+            order = [ 1, 0 ]
+        else:
+            order = [ 0, 1 ]
+    else:
+        if args.reverse:
+            order = [ 2, 1, 0 ]
+        elif args.exchange12:
+            order = [ 1, 0, 2 ]
+        elif args.exchange23:
+            order = [ 0, 2, 1 ]
+        elif args.exchange13:
+            order = [ 2, 1, 0 ]
+        elif args.exchanger:
+            order = [ 2, 0, 1 ]
+        elif args.exchangel:
+            order = [ 1, 2, 0 ]
+        else:
+            order = [ 0, 1, 2 ]
+
+    files = [ files[ i ] for i in order ]
+
+    # get ready for the next comparison while this one is being looked at (which is done
+    # first, so it happens even if this one turns out to have nothing to show)
+    if args.prefetch and not args.test:
+        prefetchRevisions( sourceFileName, linuxPath, args )
+
+    # there's nothing to look at if they are all the same
+    with timePhase( 'identical check', sourceFileName ):
+        identical = not args.test and not args.show_identical and \
+                    all( filesIdentical( files[ i ][ 0 ], files[ i + 1 ][ 0 ], not args.skip_dos2unix )
+                         for i in range( len( files ) - 1 ) )
+
+    if identical:
+        print( 'The files are identical.' )
+        return
+
+    # compare them ourselves if we've been asked not to launch meld
+    if args.no_gui:
+        if not args.test:
+            with timePhase( 'diff', sourceFileName ):
+                showDiff( files, args, output )
+    else:
+        if not args.test:
+            print( CLEAR_LINE, end='' )
+            print( 'Launching the viewer...\r', end='' )
+
+        launchViewer( [ tuple( fileName for fileName, label in files ) ], args )
+
+        if not args.test:
+            print( CLEAR_LINE, end='' )
 
 
 #//******************************************************************************
 #//
-#//  buildDevFileName
+#//  listDevDirs
+#//
+#//  returns the sandboxes under devRoot, which are only listed again when
+#//  devRoot changes
 #//
 #//******************************************************************************
 
-def buildDevFileName( devRoot, sourceFileName, dirName ):
-    source = os.path.abspath( sourceFileName )
+def listDevDirs( devRoot ):
+    rootTime = os.path.getmtime( devRoot )
 
-    sourceList = os.path.relpath( source, devRoot ).split( os.sep )
-    sourceList.pop( 0 )
+    cached = devDirsCache.get( devRoot )
 
-    sourceList.insert( 0, dirName )
+    if cached is not None and cached[ 0 ] == rootTime:
+        return cached[ 1 ]
 
-    devRootList = devRoot.split( os.sep )
-    devRootList.reverse( )
+    devDirs = [ name for name in os.listdir( devRoot ) if os.path.isdir( os.path.join( devRoot, name ) ) ]
 
-    for i in devRootList:
-        sourceList.insert( 0, i )
+    devDirsCache[ devRoot ] = ( rootTime, devDirs )
 
-    return os.sep.join( sourceList )
+    return devDirs
 
 
 #//******************************************************************************
 #//
-#//  createFileCommand
+#//  getDaemonAddress
 #//
-#//  This function interprets the version argument in one of several ways.
+#//  returns the address and family of the daemon's socket for a cache
+#//  directory:  a Unix domain socket in the cache directory, or a named pipe
+#//  on Windows
 #//
-#//  First, if it's 'HEAD', rickDiff will check out the trunk version.
+#//******************************************************************************
+
+def getDaemonAddress( cacheDir ):
+    if os.name == 'nt':
+        key = hashlib.sha1( os.path.abspath( cacheDir ).encode( 'utf-8' ) ).hexdigest( )[ : 12 ]
+        return '\\\\.\\pipe\\' + PROGRAM_NAME + '-' + key, 'AF_PIPE'
+
+    return os.path.join( cacheDir, 'daemon.sock' ), 'AF_UNIX'
+
+
+#//******************************************************************************
 #//
-#//  If it's 'CURRENT', rickDiff will check out whatever version is checked out
-#//  in the source directory according to CVS/Entries.  'CURRENT' can also have
-#//  '+n' or '-n' appended to it and rickDiff will instead get n versions before
-#//  or after the version 'CURRENT' refers to, if it exists.
+#//  DaemonWriter
 #//
-#//  If the argument is of the form '+n' then rickDiff will get n versions newer
-#//  than the version of the previous argument.  '-n' is not supported as a
-#//  stand-alone argument because argParser tries to interpret it as a
-#//  non-existent option, and it's not really useful anyway.
+#//  a file-like object that sends whatever is written to it back to the client
+#//  as ( stream, text ), for the daemon's stdout and stderr
 #//
-#//  Next, if the argument corresponds to a directory name under devRoot, then
-#//  rickDiff will use the corresponding file in that directory tree.
+#//******************************************************************************
+
+class DaemonWriter( object ):
+    def __init__( self, connection, stream, lock ):
+        self.connection = connection
+        self.stream = stream
+        self.lock = lock
+
+    def write( self, text ):
+        with self.lock:
+            self.connection.send( ( self.stream, text ) )
+
+        return len( text )
+
+    def flush( self ):
+        pass
+
+
+#//******************************************************************************
 #//
-#//  And finally, if nothing else matches, rickDiff passes the argument unchanged
-#//  to CVS where it can be interpreted as a version number, branch name or tag
-#//  name.
+#//  serveRequest
 #//
-#//  On errors, the fileName returned will be empty.
+#//  runs one rickDiff command line for a client, in the client's directory and
+#//  with the client's environment (just the DAEMON_ENVIRONMENT variables it
+#//  sent, none of the daemon's own), sending the output back as it goes and
+#//  then ( 'exit', status )
+#//
+#//  Returns False if the client asked the daemon to stop.
 #//
 #//******************************************************************************
 
-def createFileCommand( devRoot, sourceFileName, versionArg, linuxPath, devDirs, localFlag, oldVersion='' ):
-    command = ''
-    fileName = ''
-    version = ''
+def serveRequest( connection ):
+    global timingEvents
 
-    tempDir = os.environ[ 'TEMP' ]
+    try:
+        request = connection.recv( )
+    except ( OSError, EOFError ):
+        return True
 
-    base, ext = os.path.splitext( os.path.basename( sourceFileName ) )
+    if request.get( 'stop' ):
+        connection.send( ( 'exit', 0 ) )
+        return False
 
-    if versionArg == '':
-        if localFlag:
-            fileName = os.path.join( os.getcwd( ), sourceFileName )
-        else:
-            command = 'copy ' + sourceFileName + ' ' + tempDir + TO_DEV_NULL
-            fileName = os.path.join( tempDir, base + ext )
-    elif versionArg == 'HEAD':
-        version = getHeadVersion( sourceFileName )
-        fileName = os.path.join( tempDir, base + '.' + version + ext )
-        command = 'cvs co -p -r ' + version + ' ' + linuxPath + ' > ' + fileName + ERR_DEV_NULL
-    elif versionArg.startswith( 'CURRENT' ):
-        increment = parseIncrement( versionArg[ 7: ] )
+    # whatever the last command's prefetch hasn't started on is no longer worth the wait
+    if prefetcher is not None:
+        prefetcher.cancel( )
 
-        version = parseVersionFromEntries( sourceFileName )
+    # each command is a run of its own, which looks at the cache and the sandbox afresh
+    with cacheSizeLock:
+        cacheSizes.clear( )
 
-        if increment != 0:
-            version = incrementVersion( sourceFileName, version, increment )
+    repositoryRoots.clear( )
 
-        fileName = os.path.join( tempDir, base + '.' + version + ext )
-        command = 'cvs co -p -r ' + version + ' ' + linuxPath + ' > ' + fileName + ERR_DEV_NULL
-    elif versionArg[ 0 ] == '+':
-        version = incrementVersion( sourceFileName, oldVersion, int( versionArg[ 1: ] ) )
+    savedDir = os.getcwd( )
+    savedEnviron = dict( os.environ )
 
-        fileName = os.path.join( tempDir, base + '.' + version + ext )
-        command = 'cvs co -p -r ' + version + ' ' + linuxPath + ' > ' + fileName + ERR_DEV_NULL
-    elif versionArg in devDirs:
-        source = buildDevFileName( devRoot, sourceFileName, versionArg )
+    lock = threading.Lock( )
+    status = 0
 
-        if not os.path.isfile( source ):
-            raise Exception( "File '" + source + "' does not appear to exist.\nAborting..." )
+    try:
+        os.chdir( request[ 'cwd' ] )
+        os.environ.clear( )
+        os.environ.update( request[ 'environment' ] )
 
-        version = versionArg
+        with contextlib.redirect_stdout( DaemonWriter( connection, 'stdout', lock ) ), \
+             contextlib.redirect_stderr( DaemonWriter( connection, 'stderr', lock ) ):
+            try:
+                main( request[ 'arguments' ] )
+            except SystemExit as exit:
+                status = exit.code if isinstance( exit.code, int ) else 1
+            except Exception as error:
+                print( PROGRAM_NAME + ": {0}".format( error ) )
+                status = 1
 
-        fileName = os.path.join( tempDir, base + '.' + version + ext )
-        command = 'copy ' + source + ' ' + fileName + TO_DEV_NULL
+        connection.send( ( 'exit', status ) )
+    except ( OSError, EOFError ):
+        pass    # the client has gone away
+    finally:
+        os.chdir( savedDir )
+        os.environ.clear( )
+        os.environ.update( savedEnviron )
 
-        if localFlag:
-            fileName = buildDevFileName( devRoot, sourceFileName, version )
-        else:
-            fileName = os.path.join( tempDir, base + '.' + version + ext )
-            command = 'copy ' + source + ' ' + fileName + TO_DEV_NULL
-    else:
-        version = versionArg
-        fileName = os.path.join( tempDir, base + '.' + version + ext )
-        command = 'cvs co -p -r ' + version + ' ' + linuxPath + ' > ' + fileName + ERR_DEV_NULL
+        timingEvents = None
 
-    return command, fileName, version
+    return True
 
 
 #//******************************************************************************
 #//
-#//  retrieveFile
+#//  runDaemon
+#//
+#//  serves rickDiff command lines forwarded by forwardToDaemon until it is
+#//  stopped (with --stop_daemon or Ctrl-C)
+#//
+#//  Everything rickDiff normally has to work out again on every run stays in
+#//  memory between requests:  revision indexes, CVS/Entries, the devRoot
+#//  listing, formatter versions and recently used revisions.  The indexes
+#//  are still checked against CVS/Entries every time, so they are as up to date
+#//  as usual.  Requests are served one at a time.
+#//
+#//  Only processes that can read the key file in the cache directory can
+#//  connect.
 #//
 #//******************************************************************************
 
-def retrieveFile( command, ordinal, version, fileName, sourceFileName, astyle, uncrustify, skip_dos2unix ):
-    print( '\rRetrieving ' + ordinal + ' file...\r', end='' )
+def runDaemon( cacheDir ):
+    global daemonRunning, memoryBlobs
 
-    os.system( command )
+    address, family = getDaemonAddress( cacheDir )
+    keyFileName = os.path.join( cacheDir, DAEMON_KEY_FILE )
 
-    if os.stat( fileName ).st_size == 0:
-        raise Exception( "Version '" + version + "' not found for file '" + sourceFileName + "'\nAborting..." )
+    os.makedirs( cacheDir, exist_ok=True )
 
-    print( '\rFormatting ' + ordinal + ' file...\r', end='' )
+    key = os.urandom( 32 )
 
-    if astyle:
-        os.system( 'astyle ' + fileName + TO_DEV_NULL )
-    elif uncrustify:
-        os.system( 'uncrustify ' + fileName + TO_DEV_NULL )
-        os.system( 'move /y ' + fileName + '.uncrustify ' + fileName + TO_DEV_NULL )
-    elif not skip_dos2unix:
-        os.system( 'dos2unix ' + fileName + TO_DEV_NULL )
-        os.system( 'unix2dos ' + fileName + TO_DEV_NULL )
+    # the key file is only readable by its owner
+    try:
+        os.remove( keyFileName )
+    except OSError:
+        pass
 
-    print( CLEAR_LINE, end='' )
+    with os.fdopen( os.open( keyFileName, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600 ), 'wb' ) as keyFile:
+        keyFile.write( key )
 
-    print( ordinal + " file version:  ", end='' )
+    if family == 'AF_UNIX' and os.path.exists( address ):
+        os.remove( address )
 
-    if version == '':
-        print( 'local file (in $TEMP)' )
-    else:
-        print( version )
+    listener = multiprocessing.connection.Listener( address, family, authkey=key )
+
+    daemonRunning = True
+    memoryBlobs = collections.OrderedDict( )
+
+    print( PROGRAM_NAME + ':  daemon listening on ' + address )
+
+    try:
+        while True:
+            try:
+                connection = listener.accept( )
+            except ( OSError, multiprocessing.AuthenticationError ):
+                continue
+
+            with connection:
+                if not serveRequest( connection ):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close( )
+
+        if prefetcher is not None:
+            prefetcher.cancel( )
+            prefetcher.close( )
+
+        try:
+            os.remove( keyFileName )
+        except OSError:
+            pass
+
+        daemonRunning = False
+
+    print( PROGRAM_NAME + ':  daemon stopped' )
 
 
 #//******************************************************************************
 #//
-#//  handleArgument
+#//  forwardToDaemon
 #//
-#//  On errors, the fileName returned will be empty.
+#//  sends a rickDiff command line (or a request to stop, if arguments is None)
+#//  to the daemon for cacheDir and copies its output to stdout and stderr
+#//
+#//  Returns the exit status, or None if there is no daemon to talk to, in
+#//  which case rickDiff just runs the command itself.
 #//
 #//******************************************************************************
 
-def handleArgument( devRoot, ordinal, sourceFileName, linuxPath, devDirs, versionArg, args, oldVersion='' ):
+def forwardToDaemon( arguments, cacheDir ):
     try:
-        command, fileName, version = \
-               createFileCommand( devRoot, sourceFileName, versionArg, linuxPath, devDirs, not args.non_local, oldVersion )
-    except Exception as error:
-        print( PROGRAM_NAME + ": {0}".format( error ) )
-        return '', ''
+        with open( os.path.join( cacheDir, DAEMON_KEY_FILE ), 'rb' ) as keyFile:
+            key = keyFile.read( )
 
-    # execute the command (if we need to)
-    if command != '':
-        if args.test:
-            print( command )
+        address, family = getDaemonAddress( cacheDir )
+
+        connection = multiprocessing.connection.Client( address, family, authkey=key )
+    except ( OSError, EOFError, multiprocessing.AuthenticationError ):
+        return None
+
+    with connection:
+        if arguments is None:
+            connection.send( { 'stop' : True } )
         else:
-            try:
-                retrieveFile( command, ordinal, version, fileName, sourceFileName, args.astyle,
-                              args.uncrustify, args.skip_dos2unix )
-            except Exception as error:
-                print( PROGRAM_NAME + ": {0}".format( error ) )
-                return '', ''
+            connection.send( { 'arguments' : arguments, 'cwd' : os.getcwd( ),
+                               'environment' : dict( ( name, os.environ[ name ] ) for name in DAEMON_ENVIRONMENT
+                                                     if name in os.environ ) } )
 
-    return version, fileName
+        while True:
+            try:
+                stream, data = connection.recv( )
+            except ( OSError, EOFError ):
+                print( PROGRAM_NAME + ':  lost the connection to the daemon', file=sys.stderr )
+                return 1
+
+            if stream == 'stdout':
+                sys.stdout.write( data )
+                sys.stdout.flush( )
+            elif stream == 'stderr':
+                sys.stderr.write( data )
+                sys.stderr.flush( )
+            else:
+                return data
 
 
 #//************************************************************************************************
@@ -356,8 +5169,9 @@ def handleArgument( devRoot, ordinal, sourceFileName, linuxPath, devDirs, versio
 #//
 #//************************************************************************************************
 
-def main( ):
-    print( )
+def main( arguments=None ):
+    if arguments is None:
+        arguments = sys.argv[ 1: ]
 
     parser = argparse.ArgumentParser( description=PROGRAM_NAME + ' ' + VERSION + ' - ' + DESCRIPTION,
                                       formatter_class=RawTextHelpFormatter,
@@ -381,16 +5195,129 @@ somewhat unpredictable when branches are involved.
 In addition, a version name after the first of the form '+n' will be translated
 into the previously specified version incremented by n versions.
 
-Any other name is passed on to CVS, so branch names and tag names can be used.
+Any other name can be a revision number, a tag or a branch (which means the
+newest revision on the branch), and these are checked against 'cvs log' before
+anything is checked out.  '@yyyy-mm-dd' (or '@yyyy-mm-ddThh:mm') is the newest
+revision on the trunk as of that date (in UTC, like 'cvs co -D'), and
+'branch@yyyy-mm-dd' the same on a branch.
+
+rickDiff also works in git working trees.  There, versions are commit ids:
+'CURRENT' is the checked out commit, 'HEAD' is the newest commit that changed
+the file, '-n' and '+n' step through the commits that changed the file, and
+any other name is handed to git as a revision.
+
+With '--no_gui', rickDiff compares the files itself and prints a unified diff,
+a side-by-side listing or JSON hunk statistics instead of launching Meld.  A
+three-way comparison shows the first file against the second, and the second
+against the third.
+
+Files bigger than '--large_file' megabytes (generated sources, data files)
+aren't handed to Meld or compared line by line:  rickDiff maps them into
+memory and prints a summary instead, giving the sizes and the single range of
+lines between the first and last differences.
+
+'--viewer' runs something other than Meld to show the comparisons (it is given
+the file names to compare).  A batch comparison or a range opens its
+comparisons as tabs in a single Meld, '--tabs' at a time, and the next lot
+opens when that Meld is closed.  Viewers other than Meld get one window per
+comparison.
 
 rickDiff does leave files in the %TEMP directory when it is done.
+
+Checked out revisions are kept in a revision cache under the cache directory,
+so comparing the same revisions again doesn't go back to the server.  The
+least recently used revisions are dropped when the cache grows beyond
+'--cache_size' megabytes.  The output of astyle and uncrustify is cached the
+same way, keyed by the contents, the formatter's version and its options file.
+
+The revisions, head version and symbolic names from 'cvs log' are kept in a
+revision index under the cache directory, so 'cvs log' only needs to be run
+again (incrementally) when 'CVS/Entries' changes.  '--invalidate_index' throws
+the index away and rebuilds it.
+
+With '--tree', 'fileName' is a directory, and rickDiff compares everything under
+it with the same directory in another sandbox under devRoot, in two other
+sandboxes, or with a version (e.g. a tag) from version control.  It lists the
+files that differ and then shows each one like a batch comparison.  Sandboxes
+are compared by hashing their files, and the sizes, modification times and
+hashes are kept in a tree index under the cache directory, so only files that
+have changed since the last time are hashed again.
+
+With '--changeset', rickDiff pieces CVS commits back together from 'cvs log'
+(revisions by the same author with the same log message, a few minutes apart
+at most) and lists them for the directory 'fileName' (or the current
+directory).  Given a changeset id as the first version, it shows every file in
+that commit against the revision before it, like a batch comparison.  The
+changesets are kept in an index under the cache directory, and only new
+revisions are read from 'cvs log' each time.
+
+With '--range', rickDiff walks through the history of 'fileName' from the first
+version (e.g. 'CURRENT-5') to the second ('HEAD' if it isn't given), showing
+each revision against the one before it, in order.  All of the revisions are
+retrieved up front, in parallel.  With '--no_gui', each change is printed with
+its author, date and the number of lines added and removed.
+
+'--timings' shows how long each phase of the run (cvs log, checkouts,
+formatting, launching Meld and so on) took, and '--trace' writes every timed
+phase to a file that can be loaded into chrome://tracing or Perfetto, or with
+'--trace_format json', collected and compared with other people's runs.
+
+'rickDiff --daemon' starts a daemon that keeps running with everything it has
+learned (revision indexes, 'CVS/Entries', the devRoot listing and recently
+used revisions) in memory.  While it is running, rickDiff just hands its
+command line to the daemon, so back-to-back comparisons don't start from
+scratch.  '--stop_daemon' stops it, and '--no_daemon' runs a command without
+it.  The daemon serves one command at a time.
+
+With '--pserver', rickDiff doesn't run cvs at all, but talks to the pserver
+named in 'CVS/Root' itself, logging in once (with the password saved by 'cvs
+login') and reusing up to '--jobs' connections for the whole run.
+
+With '--prefetch', once the comparison is up, rickDiff fetches 'CURRENT-1',
+'CURRENT-2' and 'HEAD' into the revision cache (a couple at a time), so the
+comparison that usually comes next doesn't have to wait for the server.  The
+daemon does this in the background; otherwise rickDiff finishes the prefetch
+before it exits.
 ''' )
 
     parser.add_argument( '-d', '--skip_dos2unix', action='store_true',
                          help='skips dos2unix-unix2dos step, which is intended to fix line endings' )
 
+    # read afresh, as a command run by the daemon has the client's $RICKDIFF_CACHE
+    parser.add_argument( '-c', '--cache_dir', action='store',
+                         default=os.environ.get( 'RICKDIFF_CACHE',
+                                                 os.path.join( os.path.expanduser( '~' ), '.rickDiff' ) ),
+                         help='directory for rickDiff\'s caches (default: $RICKDIFF_CACHE or ~/.rickDiff)' )
+    parser.add_argument( '-C', '--cache_size', action='store', type=int, default=DEFAULT_CACHE_SIZE,
+                         help='maximum size of the revision cache in megabytes (default: %(default)s)' )
+    parser.add_argument( '-I', '--invalidate_index', action='store_true',
+                         help='discard the cached revision index and rebuild it from cvs log' )
+    parser.add_argument( '-j', '--jobs', action='store', type=int, default=DEFAULT_JOBS,
+                         help='number of files to retrieve at the same time (default: %(default)s)' )
+    parser.add_argument( '-v', '--vcs', action='store', choices=[ 'auto', 'cvs', 'git' ], default='auto',
+                         help='version control system (default: cvs if there is a CVS/Repository, otherwise git)' )
+    parser.add_argument( '--prefetch', action='store_true',
+                         help='fetch CURRENT-1, CURRENT-2 and HEAD into the revision cache in the background' )
+    parser.add_argument( '-P', '--pserver', action='store_true',
+                         help='talk to a :pserver: CVSROOT directly over pooled connections instead of running cvs' )
+    parser.add_argument( '-z', '--timings', action='store_true',
+                         help='show how long each phase of the run took' )
+    parser.add_argument( '-Z', '--trace', action='store', default='',
+                         help='write the timings of every phase to this file' )
+    parser.add_argument( '--trace_format', action='store', choices=[ 'chrome', 'json' ], default='chrome',
+                         help='format for --trace:  Chrome trace events or plain JSON (default: %(default)s)' )
+    parser.add_argument( '--daemon', action='store_true',
+                         help='keep running and serve other rickDiff commands with warm caches' )
+    parser.add_argument( '--stop_daemon', action='store_true', help='stop the running daemon' )
+    parser.add_argument( '--no_daemon', action='store_true', help='don\'t hand this command to the daemon' )
     parser.add_argument( '-o', '--root', action='store', default=DEFAULT_DEV_ROOT, help='development tree root directory' )
     parser.add_argument( '-t', '--test', action='store_true', help='print commands, don\'t execute them' )
+    parser.add_argument( '-w', '--viewer', action='store', default=DEFAULT_VIEWER,
+                         help='program to show the comparisons with (default: %(default)s)' )
+    parser.add_argument( '--tabs', action='store', type=int, default=DEFAULT_TABS,
+                         help='number of comparisons to show in one viewer in a batch or range (default: %(default)s)' )
+    parser.add_argument( '--large_file', action='store', type=int, default=DEFAULT_LARGE_FILE_SIZE,
+                         help='size in megabytes above which files are summarized instead of compared (default: %(default)s)' )
 
     group = parser.add_mutually_exclusive_group( )
     parser.add_argument( '-n', '--non_local', action='store_true', help='don\'t use the local file, copy to the temp directory' )
@@ -410,7 +5337,34 @@ rickDiff does leave files in the %TEMP directory when it is done.
 
     group = parser.add_mutually_exclusive_group( )
     parser.add_argument( '-3', '--three_way', action='store_true', help='three-way comparison' )
-    parser.add_argument( '-b', '--batch_compare', action='store_true', help='batch compare (launch multiple instances of Meld)' )
+    parser.add_argument( '-G', '--no_gui', action='store_true',
+                         help='don\'t launch Meld, print the differences instead' )
+    parser.add_argument( '-F', '--diff_format', action='store', choices=[ 'unified', 'side', 'json' ], default='unified',
+                         help='output format for --no_gui:  unified diff, side-by-side or JSON hunk statistics\n'
+                              '(default: %(default)s)' )
+    parser.add_argument( '-U', '--context', action='store', type=int, default=3,
+                         help='lines of context for --no_gui (default: %(default)s)' )
+    parser.add_argument( '-W', '--width', action='store', type=int, default=160,
+                         help='line width for --diff_format side (default: %(default)s)' )
+    parser.add_argument( '-S', '--show_identical', action='store_true',
+                         help='compare files even if they are identical' )
+    parser.add_argument( '-T', '--tree', action='store_true',
+                         help='compare the whole tree under fileName (a directory) with another sandbox or a version' )
+    parser.add_argument( '-K', '--changeset', action='store_true',
+                         help='list the CVS commits under fileName (a directory), or with firstVersion (a changeset\n'
+                              'id), compare every file in that commit with the revision before' )
+    parser.add_argument( '-R', '--range', action='store_true',
+                         help='show every revision of fileName from firstVersion (default: CURRENT) to secondVersion\n'
+                              '(default: HEAD), one change at a time' )
+    parser.add_argument( '-b', '--batch_compare', action='store_true', help='batch compare (in tabs, --tabs at a time)' )
+    parser.add_argument( '-m', '--modified', action='store_true',
+                         help='batch compare every locally modified file under the directories given\n'
+                              '(default: the current directory)' )
+    parser.add_argument( '-s', '--status', action='store_true',
+                         help='list locally modified, added and removed files under the directories given\n'
+                              '(default: the current directory) without contacting the server' )
+    parser.add_argument( '-V', '--batch_version', action='store', default='CURRENT',
+                         help='version to compare each local file with in a batch compare (default: CURRENT)' )
 
     # let's do a little preprocessing of the argument list because argparse is missing a few pieces of functionality
     new_argv = list( )
@@ -424,8 +5378,17 @@ rickDiff does leave files in the %TEMP directory when it is done.
 
     fileList = [ ]
 
-    for arg in sys.argv[ 1: ]:
-        if arg[ 0 ] not in prefixList:
+    # options that take a value, which can be the next argument (e.g. '-F json') as well as after an '='
+    valueOptions = set( option for action in parser._actions if action.nargs is None
+                        for option in action.option_strings )
+
+    optionValue = False
+
+    for arg in arguments:
+        if optionValue:
+            new_argv.append( arg )
+            optionValue = False
+        elif arg[ 0 ] not in prefixList:
             fileList.append( arg )  # used for -b
 
             if fileName == '':
@@ -438,119 +5401,75 @@ rickDiff does leave files in the %TEMP directory when it is done.
                 thirdVersion = arg
         else:
             new_argv.append( arg )
+            optionValue = arg in valueOptions
 
     # let argparse handle the rest
     args = parser.parse_args( new_argv )
 
-    if fileName == '':
-        parser.print_help( )
+    # if there's a daemon running, it does the work
+    if args.daemon:
+        runDaemon( args.cache_dir )
         return
 
-    # determine the CVS information
-    try:
-        with open( 'CVS/Repository' ) as inputFile:
-            linuxRoot = inputFile.read( )[ : -1 ]
-    except:
-        print( PROGRAM_NAME + ':  cannot find CVS/Repository (not in the sandbox?)' )
-        return
-
-    # parse the arguments
-    linuxPath = linuxRoot + '/' + fileName.replace( '\\', '/' )
-
-    sourceFileName = fileName.replace( '/', '\\' )
-
-    devRoot = args.root
-
-    devDirs = [ name for name in os.listdir( devRoot ) if os.path.isdir( os.path.join( devRoot, name ) ) ]
+    if args.stop_daemon:
+        if forwardToDaemon( None, args.cache_dir ) is None:
+            print( PROGRAM_NAME + ':  there is no daemon running' )
 
-    if args.three_way and ( firstVersion == '' or secondVersion == '' ):
-        print( PROGRAM_NAME + ":  Please specify at least two CVS versions for three-way comparison." )
         return
 
-    base, ext = os.path.splitext( os.path.basename( sourceFileName ) )
-
-    # batch comparison is a whole different thing (and much simpler)
-    if args.batch_compare:
-        for fileName in fileList:
-            # parse the arguments
-            linuxPath = linuxRoot + '/' + fileName
-            linuxPath.replace( '\\', '/' )
-
-            sourceFileName = fileName.replace( '/', '\\' )
-
-            firstVersion, firstFileName = \
-                handleArgument( devRoot, 'first', sourceFileName, linuxPath, [ ], 'CURRENT', args )
+    if not ( daemonRunning or args.no_daemon ):
+        status = forwardToDaemon( arguments, args.cache_dir )
 
-            secondVersion, secondFileName = \
-                handleArgument( devRoot, 'second', sourceFileName, linuxPath, [ ], '', args )
+        if status is not None:
+            if status != 0:
+                sys.exit( status )
 
-            command = 'meld ' + firstFileName + ' ' + secondFileName
+            return
 
-            if args.test:
-                print( command )
-            else:
-                print( CLEAR_LINE, end='' )
-                print( 'Launching Meld...\r', end='' )
-                os.system( command )
-                print( CLEAR_LINE )
-                time.sleep( 1 )
+    # with --no_gui, stdout is reserved for the differences and everything else goes to stderr
+    output = sys.stdout
 
-        return
+    with contextlib.redirect_stdout( sys.stderr if args.no_gui else sys.stdout ):
+        print( )
 
-    # parse the first version argument and build the shell command
-    if firstVersion == '':
-        firstVersion = 'CURRENT'
+        if fileName == '' and not ( args.status or args.modified or args.tree or args.changeset ):
+            parser.print_help( )
+            return
 
-    firstVersion, firstFileName = \
-            handleArgument( devRoot, 'first', sourceFileName, linuxPath, devDirs, firstVersion, args )
+        if args.timings or args.trace:
+            startTiming( )
 
-    if firstFileName == '':
-        return
+        # the version control backend goes along with the rest of the options
+        try:
+            args.backend = openBackend( args.vcs, args.cache_dir, args.pserver, args.jobs )
+        except Exception as error:
+            print( PROGRAM_NAME + ':  {0}'.format( error ) )
+            return
 
-    # parse the second version argument and build the shell command
-    secondVersion, secondFileName = \
-            handleArgument( devRoot, 'second', sourceFileName, linuxPath, devDirs, secondVersion, args, firstVersion )
+        try:
+            with timePhase( 'total' ):
+                compareFiles( args, fileName, firstVersion, secondVersion, thirdVersion, fileList, output )
 
-    if secondFileName == '':
-        return
+            # the daemon lets a prefetch carry on in the background, but otherwise it has to finish now
+            if prefetcher is not None and prefetcher.isBusy( ) and not daemonRunning:
+                print( 'Prefetching...\r', end='' )
 
-    # parse the third version argument and build the shell command (if we need one)
-    if thirdVersion != '' or args.three_way:
-        thirdVersion, thirdFileName = \
-                handleArgument( devRoot, 'third', sourceFileName, linuxPath, devDirs, thirdVersion, args, firstVersion )
-    else:
-        thirdFileName = ''
+                try:
+                    with timePhase( 'prefetch wait' ):
+                        prefetcher.finish( )
+                except KeyboardInterrupt:
+                    prefetcher.cancel( )
+                    raise
 
-    # we have everything, so let's launch meld
-    if thirdFileName == '':
-        if args.reverse or args.exchange12:
-            command = 'meld ' + secondFileName + ' ' + firstFileName
-        else:
-            command = 'meld ' + firstFileName + ' ' + secondFileName
-    else:
-        if args.reverse:
-            command = 'meld ' + thirdFileName + ' ' + secondFileName + ' ' + firstFileName
-        elif args.exchange12:
-            command = 'meld ' + secondFileName + ' ' + firstFileName + ' ' + thirdFileName
-        elif args.exchange23:
-            command = 'meld ' + firstFileName + ' ' + thirdFileName + ' ' + secondFileName
-        elif args.exchange13:
-            command = 'meld ' + thirdFileName + ' ' + secondFileName + ' ' + firstFileName
-        elif args.exchanger:
-            command = 'meld ' + thirdFileName + ' ' + firstFileName + ' ' + secondFileName
-        elif args.exchangel:
-            command = 'meld ' + secondFileName + ' ' + thirdFileName + ' ' + firstFileName
-        else:
-            command = 'meld ' + firstFileName + ' ' + secondFileName + ' ' + thirdFileName
+                print( CLEAR_LINE, end='' )
+        finally:
+            args.backend.close( )
 
-    if args.test:
-        print( command )
-    else:
-        print( CLEAR_LINE, end='' )
-        print( 'Launching Meld...\r', end='' )
-        subprocess.Popen( command + ">& NUL", shell=True )
+        if args.timings:
+            showTimings( )
 
-        print( CLEAR_LINE, end='' )
+        if args.trace:
+            writeTrace( args.trace, args.trace_format )
 
 
 #//**********************************************************************